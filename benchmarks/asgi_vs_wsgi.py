@@ -0,0 +1,117 @@
+"""
+Side-by-side throughput and latency of the hot endpoints under the current
+WSGI deployment (gunicorn sync workers on game.wsgi) and the ASGI one
+(gunicorn with uvicorn workers on game.asgi, which serves the async views).
+
+    python -m benchmarks.asgi_vs_wsgi --players 200 --requests 2000 --concurrency 50
+
+Both deployments get the same number of workers and the same request mix,
+and the seeded players get their lives back before each run.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from .common import (
+    LOGIN_MESSAGE, AppServer, auth_headers, drive_endpoint, reset_daily_attempts, seed_players, setup_django)
+
+DEPLOYMENTS = {
+    'wsgi': [sys.executable, '-m', 'gunicorn', 'game.wsgi:application'],
+    'asgi': [sys.executable, '-m', 'gunicorn', 'game.asgi:application', '-k', 'uvicorn.workers.UvicornWorker'],
+}
+
+
+def build_endpoints(season_pk: int, players: list) -> dict:
+    def player_for(index):
+        return players[index % len(players)]
+
+    def login(index):
+        player = player_for(index)
+        return '/users/login', {
+            'address': player['address'],
+            'signature': player['signature'],
+            'message': LOGIN_MESSAGE,
+        }, {}
+
+    def add_score(index):
+        return '/whack-a-blob/add-score', {'season': season_pk, 'score': 10}, auth_headers(player_for(index))
+
+    def scoreboard(index):
+        return '/whack-a-blob/scoreboard', {'season': season_pk}, auth_headers(player_for(index))
+
+    def player_lives(index):
+        return '/whack-a-blob/player-lives', {'season': season_pk}, auth_headers(player_for(index))
+
+    def view_profile(index):
+        player = player_for(index)
+        return '/users/view-profile', {'address': player['address']}, auth_headers(player)
+
+    return {
+        'login': login,
+        'add-score': add_score,
+        'scoreboard': scoreboard,
+        'player-lives': player_lives,
+        'view-profile': view_profile,
+    }
+
+
+def run_deployment(name: str, args, season_pk: int, players: list) -> dict:
+    from whack_blob.services import MAX_DAILY_ATTEMPTS
+
+    reset_daily_attempts(players)
+    env = dict(os.environ)
+    env.pop('ROOT_URLCONF', None)
+    command = DEPLOYMENTS[name] + ['-w', str(args.workers), '-b', f'127.0.0.1:{args.port}']
+
+    results = {}
+    with AppServer(command, args.port, env) as server:
+        for endpoint, make_request in build_endpoints(season_pk, players).items():
+            total = args.requests
+            if endpoint == 'add-score':
+                # Every request past a player's last life is rejected early,
+                # which would flatter both deployments
+                total = min(total, len(players) * MAX_DAILY_ATTEMPTS)
+            result = asyncio.run(drive_endpoint(
+                server.base_url, endpoint, make_request, total, args.concurrency))
+            results[endpoint] = result.summary()
+
+    return results
+
+
+def print_comparison(results: dict):
+    header = f"{'endpoint':<14}{'server':<6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}"
+    print(header)
+    print('-' * len(header))
+    for endpoint in results['wsgi']:
+        for deployment in DEPLOYMENTS:
+            summary = results[deployment][endpoint]
+            print(
+                f"{endpoint:<14}{deployment:<6}{summary['throughput']:>10}{summary['p50_ms']:>10}"
+                f"{summary['p95_ms']:>10}{summary['p99_ms']:>10}{summary['errors']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--players', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    args = parser.parse_args()
+
+    setup_django()
+    season_pk, players = seed_players(args.players)
+
+    results = {name: run_deployment(name, args, season_pk, players) for name in DEPLOYMENTS}
+
+    print_comparison(results)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
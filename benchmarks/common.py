@@ -0,0 +1,214 @@
+"""
+Shared pieces of the load benchmarks: Django setup, seeded players with
+wallet keys, app servers, an aiohttp load driver and latency statistics.
+
+The servers and the benchmark process read the same environment, so point
+DB_* at the database the servers should use. Use PostgreSQL or MySQL;
+SQLite serialises writes and will time out under concurrent load. The
+stored query counts assume cached user snapshots, so leave
+USER_SNAPSHOT_TTL on and the CACHE_BACKEND shared between the workers.
+"""
+import asyncio
+import math
+import os
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+
+import aiohttp
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOGIN_MESSAGE = 'Sign in to Whack a blob'
+
+
+def setup_django():
+    if BASE_DIR not in sys.path:
+        sys.path.insert(0, BASE_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'game.settings')
+
+    import django
+    django.setup()
+
+
+def player_private_key(index: int) -> bytes:
+    from eth_utils import keccak
+
+    return keccak(text=f'redfox-benchmark-{index}')
+
+
+def seed_players(count: int, season_name: str = 'benchmark season') -> tuple:
+    """
+    Create (or reuse) a season and ``count`` active players with
+    deterministic wallet keys, and return the season pk and one dict per
+    player with its address, a signed login and an access token.
+    """
+    from eth_account import Account
+    from eth_account.messages import encode_defunct
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    from users.models import User
+    from whack_blob.models import Season
+
+    season, _ = Season.objects.get_or_create(season=season_name)
+    accounts = [Account.from_key(player_private_key(index)) for index in range(count)]
+    User.objects.bulk_create([
+        User(address=account.address, referral_username=f'redfox-benchmark{index}', is_active=True)
+        for index, account in enumerate(accounts)], ignore_conflicts=True)
+    users = User.objects.in_bulk([account.address for account in accounts], field_name='address')
+
+    signable_message = encode_defunct(text=LOGIN_MESSAGE)
+    players = []
+    for account in accounts:
+        players.append({
+            'address': account.address,
+            'signature': account.sign_message(signable_message).signature.hex(),
+            'access_token': str(RefreshToken.for_user(users[account.address]).access_token),
+        })
+
+    return season.pk, players
+
+
+def seed_games(season_pk: int, players: list, games: int, seed: int = 0):
+    """
+    Replace the season's games with ``games`` seeded ones spread over the
+    players, and set each player's standing to the sum of their games, so
+    every run starts from the same scoreboard.
+    """
+    import random
+
+    from users.models import User
+    from whack_blob.models import GameScore, PlayerSeasonStanding
+
+    rng = random.Random(seed)
+    users = User.objects.in_bulk([player['address'] for player in players], field_name='address')
+    player_pks = [users[player['address']].pk for player in players]
+
+    GameScore.objects.filter(season_id=season_pk).delete()
+    PlayerSeasonStanding.objects.filter(season_id=season_pk).delete()
+
+    totals = dict.fromkeys(player_pks, 0)
+    game_scores = []
+    for _ in range(games):
+        player_pk = rng.choice(player_pks)
+        totals[player_pk] += rng.randint(1, 100)
+        game_scores.append(GameScore(season_id=season_pk, player_id=player_pk, score=totals[player_pk]))
+
+    GameScore.objects.bulk_create(game_scores, batch_size=1000)
+    PlayerSeasonStanding.objects.bulk_create([
+        PlayerSeasonStanding(season_id=season_pk, player_id=player_pk, score=score)
+        for player_pk, score in totals.items()], batch_size=1000)
+
+
+def reset_daily_attempts(players: list):
+    """Give the seeded players their lives back and age their accounts
+    so every run starts from MAX_DAILY_ATTEMPTS lives."""
+    from users.models import User
+    from whack_blob.models import PlayerDailyAttempts
+
+    addresses = [player['address'] for player in players]
+    PlayerDailyAttempts.objects.filter(player__address__in=addresses).delete()
+    User.objects.filter(address__in=addresses).update(created_at='2023-01-01T00:00:00Z')
+
+
+class AppServer:
+    """Run an app server for the duration of a ``with`` block."""
+
+    def __init__(self, command: list, port: int, env: dict = None, startup_timeout: float = 30):
+        self.command = command
+        self.base_url = f'http://127.0.0.1:{port}'
+        self.env = env
+        self.startup_timeout = startup_timeout
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            self.command, cwd=BASE_DIR, env=self.env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        asyncio.run(self._wait_until_healthy())
+        return self
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.wait(timeout=self.startup_timeout)
+
+    async def _wait_until_healthy(self):
+        deadline = time.monotonic() + self.startup_timeout
+        async with aiohttp.ClientSession() as session:
+            while time.monotonic() < deadline:
+                if self.process.poll() is not None:
+                    raise RuntimeError(f'{self.command[0]} exited with code {self.process.returncode}')
+                try:
+                    async with session.get(f'{self.base_url}/healthcheck') as response:
+                        if response.status == 200:
+                            return
+                except aiohttp.ClientError:
+                    pass
+                await asyncio.sleep(0.2)
+
+        self.process.terminate()
+        raise RuntimeError(f'{self.base_url} did not become healthy')
+
+
+@dataclass
+class EndpointResult:
+    name: str
+    requests: int = 0
+    errors: int = 0
+    elapsed: float = 0
+    latencies: list = field(default_factory=list)
+
+    @property
+    def throughput(self) -> float:
+        return self.requests / self.elapsed if self.elapsed else 0
+
+    def percentile(self, percent: float) -> float:
+        if not self.latencies:
+            return 0
+        ordered = sorted(self.latencies)
+        return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+    def summary(self) -> dict:
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'throughput': round(self.throughput, 1),
+            'p50_ms': round(self.percentile(50) * 1000, 2),
+            'p95_ms': round(self.percentile(95) * 1000, 2),
+            'p99_ms': round(self.percentile(99) * 1000, 2),
+        }
+
+
+async def drive_endpoint(base_url: str, name: str, make_request, total: int, concurrency: int) -> EndpointResult:
+    """
+    POST ``total`` requests with ``concurrency`` requests in flight.
+    ``make_request(index)`` returns the (path, payload, headers) to send.
+    """
+    result = EndpointResult(name)
+    indexes = iter(range(total))
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(base_url, connector=connector) as session:
+        async def worker():
+            for index in indexes:
+                path, payload, headers = make_request(index)
+                started = time.perf_counter()
+                try:
+                    async with session.post(path, json=payload, headers=headers) as response:
+                        await response.read()
+                        failed = response.status >= 400
+                except aiohttp.ClientError:
+                    failed = True
+                result.latencies.append(time.perf_counter() - started)
+                result.requests += 1
+                result.errors += failed
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        result.elapsed = time.perf_counter() - started
+
+    return result
+
+
+def auth_headers(player: dict) -> dict:
+    return {'Authorization': f"Bearer {player['access_token']}"}
@@ -0,0 +1,100 @@
+"""
+Write throughput of save-referral for a single popular referrer, with the
+referral counters spread over different numbers of shard rows.
+
+    python -m benchmarks.referral_contention --referrals 2000 --threads 32 --shards 1 4 16
+
+Every run signs up fresh referral users under one referrer from
+``--threads`` concurrent database sessions, then folds the counters,
+flushes the staged rewards and checks that no increment or reward was
+lost. One shard is the old single hot row.
+"""
+import argparse
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .common import EndpointResult, setup_django
+
+
+def run(shards: int, args) -> dict:
+    from django.conf import settings
+    from django.db import connection
+
+    from users.models import User
+    from users.referral_counters import fold_all_referral_counters
+    from users.services import REFERRAL_REWARD_POINTS, get_referral_reward_season, save_referral_details
+    from whack_blob.models import PlayerSeasonStanding, Season
+    from whack_blob.services import flush_pending_scores
+
+    season = get_referral_reward_season() or Season.objects.create(season='referral benchmark')
+    run_id = uuid.uuid4().hex[:8]
+    referrer = User.objects.create(
+        address=f'0xinfluencer-{run_id}', referral_username=f'redfox-influencer{run_id}', is_active=True)
+    referrals = User.objects.bulk_create([
+        User(address=f'0xfan-{run_id}-{index}', referral_username=f'redfox-fan{run_id}x{index}')
+        for index in range(args.referrals)])
+    addresses = [referral.address for referral in referrals]
+
+    settings.REFERRAL_COUNT_SHARDS = shards
+    result = EndpointResult(f'{shards} shards')
+
+    def sign_up(worker: int) -> tuple:
+        latencies, errors = [], 0
+        try:
+            for address in addresses[worker::args.threads]:
+                started = time.perf_counter()
+                try:
+                    save_referral_details(address, referrer.referral_username)
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+        finally:
+            connection.close()
+
+        return latencies, errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        for latencies, errors in executor.map(sign_up, range(args.threads)):
+            result.latencies.extend(latencies)
+            result.errors += errors
+    result.elapsed = time.perf_counter() - started
+    result.requests = len(result.latencies)
+
+    fold_all_referral_counters()
+    flush_pending_scores()
+    referrer.refresh_from_db()
+    standing = PlayerSeasonStanding.objects.filter(player=referrer, season=season).first()
+
+    return dict(
+        result.summary(), shards=shards, counted=referrer.referral_count,
+        credited=(standing.score if standing else 0) // REFERRAL_REWARD_POINTS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--referrals', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    args = parser.parse_args()
+
+    setup_django()
+
+    results = [run(shards, args) for shards in args.shards]
+
+    print(f"{'shards':>6}{'saves/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}{'counted':>10}{'credited':>10}")
+    for summary in results:
+        print(
+            f"{summary['shards']:>6}{summary['throughput']:>10}{summary['p50_ms']:>10}"
+            f"{summary['p99_ms']:>10}{summary['errors']:>8}{summary['counted']:>10}{summary['credited']:>10}")
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""
+Load test of the game API against stored baselines.
+
+    python -m benchmarks.suite --players 500 --games 20000 --concurrency 10 50
+
+Seeds the players (with locally signed wallet logins) and their games,
+then for every concurrency level starts a fresh server and drives login,
+add-score, player-lives, scoreboard and player-scoreboard. Reports
+throughput, p50/p95/p99 latency and the SQL queries per request the server
+recorded at /metrics, and exits non-zero when a result is worse than its
+baseline by more than the tolerance.
+
+Baselines are keyed by endpoint, or by endpoint@concurrency for numbers
+that depend on the load, and only the keys present are checked. The query
+counts in baselines.json hold on any machine; record timings for a given
+machine with --save-baselines.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+
+import aiohttp
+
+from .common import (
+    BASE_DIR, LOGIN_MESSAGE, AppServer, auth_headers, drive_endpoint, reset_daily_attempts, seed_games,
+    seed_players, setup_django)
+
+BASELINES_PATH = os.path.join(BASE_DIR, 'benchmarks', 'baselines.json')
+
+URL_NAMES = {
+    'login': 'users:login',
+    'add-score': 'whack_blob:add-score',
+    'player-lives': 'whack_blob:player-lives',
+    'scoreboard': 'whack_blob:scoreboard',
+    'player-scoreboard': 'whack_blob:player-scoreboard',
+}
+
+HIGHER_IS_BETTER = {'throughput'}
+CHECKED_METRICS = ('throughput', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request')
+
+# Query counts average over the run, so cache hits move them a little
+QUERY_SLACK = 0.5
+
+QUERY_SAMPLE = re.compile(
+    r'^http_request_db_queries_(sum|count)\{view="([^"]+)",method="POST",pid="(\d+)"\} (\S+)$', re.MULTILINE)
+
+
+def build_endpoints(season_pk: int, players: list) -> dict:
+    def player_for(index):
+        return players[index % len(players)]
+
+    def login(index):
+        player = player_for(index)
+        return '/users/login', {
+            'address': player['address'],
+            'signature': player['signature'],
+            'message': LOGIN_MESSAGE,
+        }, {}
+
+    def add_score(index):
+        return '/whack-a-blob/add-score', {'season': season_pk, 'score': 10}, auth_headers(player_for(index))
+
+    def player_lives(index):
+        return '/whack-a-blob/player-lives', {'season': season_pk}, auth_headers(player_for(index))
+
+    def scoreboard(index):
+        return '/whack-a-blob/scoreboard', {'season': season_pk}, auth_headers(player_for(index))
+
+    def player_scoreboard(index):
+        return '/whack-a-blob/player-scoreboard', {'season': season_pk}, auth_headers(player_for(index))
+
+    return {
+        'login': login,
+        'add-score': add_score,
+        'player-lives': player_lives,
+        'scoreboard': scoreboard,
+        'player-scoreboard': player_scoreboard,
+    }
+
+
+async def scrape_queries_per_request(base_url: str, scrapes: int) -> dict:
+    """
+    Average SQL queries per request for each URL name. Every scrape is
+    answered by one worker, so scrape a few times per worker and add up
+    the latest counters seen from each one.
+    """
+    from django.conf import settings
+
+    headers = {'Authorization': f'Bearer {settings.METRICS_TOKEN}'} if settings.METRICS_TOKEN else {}
+    latest = {}
+    async with aiohttp.ClientSession(base_url) as session:
+        for _ in range(scrapes):
+            async with session.get('/metrics', headers=headers) as response:
+                response.raise_for_status()
+                for kind, view, pid, value in QUERY_SAMPLE.findall(await response.text()):
+                    latest[(view, pid, kind)] = float(value)
+
+    totals = {}
+    for (view, _, kind), value in latest.items():
+        totals.setdefault(view, {'sum': 0.0, 'count': 0.0})[kind] += value
+
+    return {view: round(total['sum'] / total['count'], 2) for view, total in totals.items() if total['count']}
+
+
+def run_level(concurrency: int, args, season_pk: int, players: list) -> dict:
+    from whack_blob.services import MAX_DAILY_ATTEMPTS
+
+    reset_daily_attempts(players)
+    command = [
+        sys.executable, '-m', 'gunicorn', 'game.wsgi:application',
+        '-w', str(args.workers), '-b', f'127.0.0.1:{args.port}']
+
+    results = {}
+    with AppServer(command, args.port, dict(os.environ)) as server:
+        for endpoint, make_request in build_endpoints(season_pk, players).items():
+            total = args.requests
+            if endpoint == 'add-score':
+                # Requests past a player's last life are rejected before
+                # any write, which would flatter the numbers
+                total = min(total, len(players) * MAX_DAILY_ATTEMPTS)
+            result = asyncio.run(drive_endpoint(server.base_url, endpoint, make_request, total, concurrency))
+            results[f'{endpoint}@{concurrency}'] = result.summary()
+
+        queries = asyncio.run(scrape_queries_per_request(server.base_url, args.workers * 5))
+
+    for endpoint, url_name in URL_NAMES.items():
+        results[f'{endpoint}@{concurrency}']['queries_per_request'] = queries.get(url_name)
+
+    return results
+
+
+def baseline_for(baselines: dict, key: str) -> dict:
+    endpoint = key.split('@')[0]
+    return {**baselines.get(endpoint, {}), **baselines.get(key, {})}
+
+
+def find_regressions(results: dict, baselines: dict, tolerance: float) -> list:
+    regressions = []
+    for key, summary in results.items():
+        baseline = baseline_for(baselines, key)
+        for metric in CHECKED_METRICS:
+            expected, actual = baseline.get(metric), summary.get(metric)
+            if expected is None or actual is None:
+                continue
+
+            if metric in HIGHER_IS_BETTER:
+                regressed = actual < expected * (1 - tolerance)
+            elif metric == 'queries_per_request':
+                regressed = actual > max(expected * (1 + tolerance), expected + QUERY_SLACK)
+            else:
+                regressed = actual > expected * (1 + tolerance)
+
+            if regressed:
+                regressions.append(f'{key} {metric}: {actual} against a baseline of {expected}')
+
+        if baseline and summary['errors']:
+            regressions.append(f"{key}: {summary['errors']} failed requests")
+
+    return regressions
+
+
+def save_baselines(results: dict, path: str):
+    baselines = load_baselines(path)
+    for key, summary in results.items():
+        baselines[key] = {metric: summary[metric] for metric in CHECKED_METRICS if summary.get(metric) is not None}
+
+    with open(path, 'w') as output:
+        json.dump(baselines, output, indent=2, sort_keys=True)
+        output.write('\n')
+
+
+def load_baselines(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as baselines:
+        return json.load(baselines)
+
+
+def print_results(results: dict):
+    header = f"{'endpoint':<24}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'errors':>8}"
+    print(header)
+    print('-' * len(header))
+    for key, summary in results.items():
+        queries = summary['queries_per_request']
+        print(
+            f"{key:<24}{summary['throughput']:>10}{summary['p50_ms']:>10}{summary['p95_ms']:>10}"
+            f"{summary['p99_ms']:>10}{'-' if queries is None else queries:>9}{summary['errors']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--players', type=int, default=500)
+    parser.add_argument('--games', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the generated games')
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint and level')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 50])
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--baselines', default=BASELINES_PATH)
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown, as a fraction')
+    parser.add_argument('--save-baselines', action='store_true', help='Store these results as the baselines')
+    args = parser.parse_args()
+
+    setup_django()
+    season_pk, players = seed_players(args.players, season_name='benchmark suite season')
+    seed_games(season_pk, players, args.games, seed=args.seed)
+
+    results = {}
+    for concurrency in args.concurrency:
+        results.update(run_level(concurrency, args, season_pk, players))
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+    if args.save_baselines:
+        save_baselines(results, args.baselines)
+        return
+
+    regressions = find_regressions(results, load_baselines(args.baselines), args.tolerance)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+"""
+URL configuration served over ASGI.
+
+Same routes as game.urls, with the hot endpoints swapped for their async
+views. game/asgi.py selects it through the ROOT_URLCONF setting.
+"""
+from django.urls import include, path
+
+from .urls import urlpatterns as sync_urlpatterns
+
+async_includes = {
+    'whack-a-blob/': 'whack_blob.async_urls',
+    'users/': 'users.async_urls',
+}
+
+urlpatterns = [
+    path(route, include(urlconf)) for route, urlconf in async_includes.items()
+] + [
+    pattern for pattern in sync_urlpatterns if str(pattern.pattern) not in async_includes]
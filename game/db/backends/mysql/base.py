@@ -0,0 +1,21 @@
+from django.db.backends.mysql import base
+
+from game.db.pool import PooledDatabaseWrapperMixin
+
+from .creation import DatabaseCreation
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def pool_health_check(self, connection):
+        connection.ping()
+
+    def pool_reset(self, connection):
+        # Changing to the same user starts a new session, like
+        # COM_RESET_CONNECTION: it rolls back and drops temporary tables,
+        # user variables and session settings. The next checkout applies
+        # Django's session settings again
+        params = self.get_connection_params()
+        connection.change_user(
+            params.get('user', ''), params.get('password', ''), params.get('database', ''))
@@ -0,0 +1,7 @@
+from django.db.backends.mysql import creation
+
+from game.db.pool import PooledDatabaseCreationMixin
+
+
+class DatabaseCreation(PooledDatabaseCreationMixin, creation.DatabaseCreation):
+    pass
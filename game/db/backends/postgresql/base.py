@@ -0,0 +1,28 @@
+from django.db.backends.postgresql import base
+
+from game.db.pool import PooledDatabaseWrapperMixin
+
+from .creation import DatabaseCreation
+
+# Closes cursors, stops listening, releases advisory locks and drops cached
+# plans, sequence state and temporary tables, in one round trip
+POOL_RESET_SQL = (
+    'CLOSE ALL; UNLISTEN *; SELECT pg_advisory_unlock_all(); DISCARD PLANS; DISCARD SEQUENCES; DISCARD TEMP')
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def pool_reset(self, connection):
+        # Everything DISCARD ALL drops except session settings: DISCARD
+        # ALL would also reset the time zone Django set, and every checkout
+        # would then spend a round trip setting it again. Code changing a
+        # setting for one request must use SET LOCAL
+        connection.rollback()
+        autocommit = connection.autocommit
+        connection.autocommit = True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(POOL_RESET_SQL)
+        finally:
+            connection.autocommit = autocommit
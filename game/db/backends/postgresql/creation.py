@@ -0,0 +1,7 @@
+from django.db.backends.postgresql import creation
+
+from game.db.pool import PooledDatabaseCreationMixin
+
+
+class DatabaseCreation(PooledDatabaseCreationMixin, creation.DatabaseCreation):
+    pass
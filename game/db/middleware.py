@@ -0,0 +1,46 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from game.db.pool import request_pool_usage
+
+
+class PoolTimingMiddleware:
+    """
+    Report how long the request waited for pooled database connections in
+    a Server-Timing header, e.g. ``db-pool;dur=0.4;desc="2 checkouts"``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        usage = {'checkouts': 0, 'wait_seconds': 0.0}
+        token = request_pool_usage.set(usage)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_pool_usage.reset(token)
+        return self.add_timing(request, response, usage)
+
+    async def __acall__(self, request):
+        # Views run through sync_to_async copy the context, so their
+        # checkouts still add to this usage dict
+        usage = {'checkouts': 0, 'wait_seconds': 0.0}
+        token = request_pool_usage.set(usage)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_pool_usage.reset(token)
+        return self.add_timing(request, response, usage)
+
+    def add_timing(self, request, response, usage: dict):
+        request.db_pool_usage = usage
+        response['Server-Timing'] = (
+            f"db-pool;dur={usage['wait_seconds'] * 1000:.2f};desc=\"{usage['checkouts']} checkouts\"")
+        return response
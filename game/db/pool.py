@@ -0,0 +1,329 @@
+import abc
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from django.db import OperationalError
+
+logger = logging.getLogger(__name__)
+
+POOL_DEFAULTS = {
+    # Open connections per process, in use or idle
+    'MAX_SIZE': 10,
+    # Seconds a checkout waits for a free connection before giving up
+    'TIMEOUT': 10.0,
+    # Seconds an idle connection is kept before it is closed
+    'MAX_IDLE': 300.0,
+    # Seconds after which a connection is closed when it is returned
+    'MAX_LIFETIME': 1800.0,
+    # Connections idle for longer than this many seconds are checked
+    # before they are handed out; 0 checks every checkout
+    'CHECK_AFTER': 30.0,
+}
+
+# Set per request by PoolTimingMiddleware; checkouts made while handling
+# the request add to it
+request_pool_usage: ContextVar[Optional[dict]] = ContextVar('request_pool_usage', default=None)
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class _PooledConnection:
+    __slots__ = ('connection', 'created_at', 'returned_at')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = self.returned_at = time.monotonic()
+
+
+def _close_quietly(pooled: _PooledConnection):
+    try:
+        pooled.connection.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """
+    Process-wide pool of DB-API connections for one database.
+
+    Idle connections are handed out most recently used first, so when
+    traffic drops the extra ones stay idle and are reaped after MAX_IDLE.
+    Connections idle for over CHECK_AFTER are health-checked on checkout
+    and replaced if the check fails.
+    """
+
+    def __init__(self, health_check: Callable, reset: Callable, **options):
+        self._health_check = health_check
+        self._reset = reset
+        self.options = {**POOL_DEFAULTS, **options}
+
+        self._idle = deque()
+        self._in_use = {}
+        self._size = 0
+        self._condition = threading.Condition()
+        self._reaper = None
+        self.stats = {
+            'checkouts': 0,
+            'connects': 0,
+            'waits': 0,
+            'wait_seconds': 0.0,
+            'max_wait_seconds': 0.0,
+            'timeouts': 0,
+            'failed_checks': 0,
+            'reaped': 0,
+            'recycled': 0,
+        }
+
+    def acquire(self, connect: Callable):
+        started = time.monotonic()
+        deadline = started + self.options['TIMEOUT']
+        waited = False
+
+        with self._condition:
+            while True:
+                self._reap_idle()
+                if self._idle:
+                    pooled = self._idle.pop()
+                    break
+                if self._size < self.options['MAX_SIZE']:
+                    self._size += 1
+                    pooled = None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f"No database connection free after {self.options['TIMEOUT']}s "
+                        f"({self.options['MAX_SIZE']} in use)")
+                waited = True
+                self._condition.wait(remaining)
+
+        if pooled is not None and not self._is_healthy(pooled):
+            # The replacement takes over the broken connection's slot
+            _close_quietly(pooled)
+            pooled = None
+
+        if pooled is None:
+            pooled = self._open(connect)
+
+        wait = time.monotonic() - started
+        with self._condition:
+            self._in_use[id(pooled.connection)] = pooled
+            self.stats['checkouts'] += 1
+            if waited:
+                self.stats['waits'] += 1
+            self.stats['wait_seconds'] += wait
+            self.stats['max_wait_seconds'] = max(self.stats['max_wait_seconds'], wait)
+            self._start_reaper()
+
+        usage = request_pool_usage.get()
+        if usage is not None:
+            usage['checkouts'] += 1
+            usage['wait_seconds'] += wait
+
+        return pooled.connection
+
+    def release(self, connection):
+        with self._condition:
+            pooled = self._in_use.pop(id(connection), None)
+        if pooled is None:
+            connection.close()
+            return
+
+        now = time.monotonic()
+        if now - pooled.created_at >= self.options['MAX_LIFETIME']:
+            self._discard(pooled, 'recycled')
+            return
+
+        try:
+            self._reset(connection)
+        except Exception:
+            logger.warning('Closing a database connection that could not be reset', exc_info=True)
+            self._discard(pooled)
+            return
+
+        pooled.returned_at = now
+        with self._condition:
+            self._idle.append(pooled)
+            self._condition.notify()
+
+    def _open(self, connect: Callable) -> _PooledConnection:
+        try:
+            connection = connect()
+        except BaseException:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+        with self._condition:
+            self.stats['connects'] += 1
+        return _PooledConnection(connection)
+
+    def _is_healthy(self, pooled: _PooledConnection) -> bool:
+        if time.monotonic() - pooled.returned_at < self.options['CHECK_AFTER']:
+            return True
+        try:
+            self._health_check(pooled.connection)
+        except Exception:
+            with self._condition:
+                self.stats['failed_checks'] += 1
+            return False
+        return True
+
+    def _discard(self, pooled: _PooledConnection, reason: str = None):
+        _close_quietly(pooled)
+        with self._condition:
+            self._size -= 1
+            if reason:
+                self.stats[reason] += 1
+            self._condition.notify()
+
+    def _reap_idle(self) -> list:
+        # Called holding the condition. The least recently used connections
+        # sit at the left of the deque
+        cutoff = time.monotonic() - self.options['MAX_IDLE']
+        reaped = []
+        while self._idle and self._idle[0].returned_at < cutoff:
+            reaped.append(self._idle.popleft())
+        self._size -= len(reaped)
+        self.stats['reaped'] += len(reaped)
+        for pooled in reaped:
+            _close_quietly(pooled)
+        return reaped
+
+    def _start_reaper(self):
+        # Called holding the condition. Reaping also happens on checkout,
+        # the thread only matters for workers that stop getting requests
+        if self._reaper is not None:
+            return
+        self._reaper = threading.Thread(target=self._reap_forever, name='db-pool-reaper', daemon=True)
+        self._reaper.start()
+
+    def _reap_forever(self):
+        while True:
+            time.sleep(max(1.0, self.options['MAX_IDLE'] / 2))
+            with self._condition:
+                self._reap_idle()
+
+    def close_idle(self):
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+        for pooled in idle:
+            _close_quietly(pooled)
+
+    def get_stats(self) -> dict:
+        with self._condition:
+            return dict(
+                self.stats,
+                size=self._size,
+                idle=len(self._idle),
+                in_use=len(self._in_use),
+                max_size=self.options['MAX_SIZE'],
+            )
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, create: Callable[[], ConnectionPool]) -> ConnectionPool:
+    """
+    Return the pool for ``key`` in this process. Pools inherited through a
+    fork are dropped without closing their connections, which belong to
+    the parent.
+    """
+    pid = os.getpid()
+    with _pools_lock:
+        entry = _pools.get(key)
+        if entry is None or entry[0] != pid:
+            entry = _pools[key] = (pid, create())
+        return entry[1]
+
+
+def get_pool_stats() -> dict:
+    pid = os.getpid()
+    with _pools_lock:
+        pools = [(key, pool) for key, (owner, pool) in _pools.items() if owner == pid]
+    return {f'{alias}:{name}': pool.get_stats() for (alias, name), pool in pools}
+
+
+def close_idle_pools(alias: str, name=None):
+    """
+    Close the idle connections this process pools for ``alias``, or only
+    for its database ``name``. Closing a Django connection returns it to
+    the pool, so call this before dropping or recreating the database.
+    """
+    pid = os.getpid()
+    with _pools_lock:
+        pools = [
+            pool for (pool_alias, pool_name), (owner, pool) in _pools.items()
+            if owner == pid and pool_alias == alias and (name is None or pool_name == name)]
+    for pool in pools:
+        pool.close_idle()
+
+
+class PooledDatabaseWrapperMixin(abc.ABC):
+    """
+    Check connections out of a process-wide ConnectionPool instead of
+    opening them, and hand them back on close. Run with CONN_MAX_AGE = 0,
+    so Django returns the connection at the end of every request.
+
+    Backends may override pool_health_check(connection) and must
+    implement pool_reset(connection) for the raw DB-API connection, so a
+    returned session carries no state over to the next checkout.
+    """
+
+    def _get_pool(self) -> ConnectionPool:
+        def create():
+            return ConnectionPool(
+                health_check=self.pool_health_check,
+                reset=self.pool_reset,
+                **self.settings_dict.get('POOL', {}),
+            )
+
+        return get_pool((self.alias, self.settings_dict['NAME']), create)
+
+    def get_new_connection(self, conn_params):
+        connect = super().get_new_connection
+        return self._get_pool().acquire(lambda: connect(conn_params))
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            self._get_pool().release(self.connection)
+
+    def pool_health_check(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        connection.rollback()
+
+    @abc.abstractmethod
+    def pool_reset(self, connection):
+        """Clear what a request left on the session of a returned connection."""
+
+
+class PooledDatabaseCreationMixin:
+    """
+    Drain the pool before the test database is dropped or cloned: the
+    connection the tests used is idle in it, and PostgreSQL will not drop
+    or copy a database with open sessions.
+    """
+
+    def _clone_test_db(self, suffix, verbosity, keepdb=False):
+        close_idle_pools(self.connection.alias, self.connection.settings_dict['NAME'])
+        super()._clone_test_db(suffix, verbosity, keepdb)
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_idle_pools(self.connection.alias, test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
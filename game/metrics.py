@@ -0,0 +1,336 @@
+"""
+Per-endpoint request metrics in the Prometheus text format.
+
+MetricsMiddleware records, for every request, its latency, the SQL
+queries it ran and how long they took, and the time spent in DRF
+serializers, labelled by URL name (``users:login``). metrics_view serves
+them at /metrics together with the login signature and connection pool
+stats.
+
+Counters live in the worker process: every gunicorn worker reports its
+own, so scrape each worker or sum the series over the ``pid`` label.
+"""
+import bisect
+import functools
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+HTTP_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+_request_metrics: ContextVar[Optional[dict]] = ContextVar('request_metrics', default=None)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        running = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            running += count
+            yield bound, running
+
+
+class _EndpointMetrics:
+    __slots__ = ('latency', 'queries', 'db_seconds', 'serializer_seconds')
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._responses = {}
+
+    def record(self, view: str, method: str, status: int, seconds: float, usage: dict):
+        with self._lock:
+            endpoint = self._endpoints.get((view, method))
+            if endpoint is None:
+                endpoint = self._endpoints[(view, method)] = _EndpointMetrics()
+            endpoint.latency.observe(seconds)
+            endpoint.queries.observe(usage['queries'])
+            endpoint.db_seconds += usage['db_seconds']
+            endpoint.serializer_seconds += usage['serializer_seconds']
+
+            key = (view, method, str(status))
+            self._responses[key] = self._responses.get(key, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self._responses.clear()
+
+    def render(self) -> list:
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            responses = sorted(self._responses.items())
+
+        pid = str(os.getpid())
+        lines = []
+
+        def labels(view, method, **extra):
+            return {'view': view, 'method': method, 'pid': pid, **extra}
+
+        _family(lines, 'http_request_duration_seconds', 'histogram', 'Request latency by URL name')
+        for (view, method), endpoint in endpoints:
+            _histogram(lines, 'http_request_duration_seconds', endpoint.latency, labels(view, method))
+
+        _family(lines, 'http_responses_total', 'counter', 'Responses by URL name and status code')
+        for (view, method, status), count in responses:
+            _sample(lines, 'http_responses_total', labels(view, method, status=status), count)
+
+        _family(lines, 'http_request_db_queries', 'histogram', 'SQL queries run per request')
+        for (view, method), endpoint in endpoints:
+            _histogram(lines, 'http_request_db_queries', endpoint.queries, labels(view, method))
+
+        _family(lines, 'http_request_db_seconds_total', 'counter', 'Time spent running SQL queries')
+        for (view, method), endpoint in endpoints:
+            _sample(lines, 'http_request_db_seconds_total', labels(view, method), endpoint.db_seconds)
+
+        _family(
+            lines, 'http_request_serializer_seconds_total', 'counter',
+            'Time spent validating and rendering DRF serializers, including the SQL they run')
+        for (view, method), endpoint in endpoints:
+            _sample(
+                lines, 'http_request_serializer_seconds_total', labels(view, method), endpoint.serializer_seconds)
+
+        return lines
+
+
+registry = MetricsRegistry()
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _family(lines: list, name: str, kind: str, description: str):
+    lines.append(f'# HELP {name} {description}')
+    lines.append(f'# TYPE {name} {kind}')
+
+
+def _sample(lines: list, name: str, labels: dict, value):
+    rendered = ','.join(f'{key}="{_escape(str(label))}"' for key, label in labels.items())
+    lines.append(f'{name}{{{rendered}}} {value}')
+
+
+def _histogram(lines: list, name: str, histogram: Histogram, labels: dict):
+    for bound, count in histogram.cumulative():
+        _sample(lines, f'{name}_bucket', dict(labels, le=bound), count)
+    _sample(lines, f'{name}_sum', labels, histogram.sum)
+    _sample(lines, f'{name}_count', labels, histogram.count)
+
+
+def _count_query(execute, sql, params, many, context):
+    # Async views run their queries through sync_to_async, in another thread
+    # but a copy of the request's context, so the usage is found either way
+    usage = _request_metrics.get()
+    if usage is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        usage['queries'] += 1
+        usage['db_seconds'] += time.perf_counter() - started
+
+
+def instrument_connection(connection, **kwargs):
+    """
+    Count the connection's queries into the metrics of the request running
+    them. Connected to connection_created; safe to call more than once.
+    """
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def _timed_serializer_call(method):
+    @functools.wraps(method)
+    def timed(*args, **kwargs):
+        usage = _request_metrics.get()
+        # Nested and list serializers call back into the outer one's
+        # methods; only the outermost call is timed
+        if usage is None or usage['serializing']:
+            return method(*args, **kwargs)
+
+        usage['serializing'] = True
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            usage['serializer_seconds'] += time.perf_counter() - started
+            usage['serializing'] = False
+
+    return timed
+
+
+def instrument_serializers():
+    """
+    Time BaseSerializer.is_valid and BaseSerializer.data, which every
+    serializer in the views goes through. Safe to call more than once.
+    """
+    from rest_framework.serializers import BaseSerializer
+
+    if getattr(BaseSerializer, '_metrics_instrumented', False):
+        return
+
+    BaseSerializer.is_valid = _timed_serializer_call(BaseSerializer.is_valid)
+    BaseSerializer.data = property(_timed_serializer_call(BaseSerializer.data.fget))
+    BaseSerializer._metrics_instrumented = True
+
+
+def _view_name(request) -> str:
+    # URL names only, never paths, so scanners hitting random URLs do not
+    # grow the label set
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unmatched'
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instrument_serializers()
+        connection_created.connect(instrument_connection, dispatch_uid='game.metrics.instrument_connection')
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        usage = {'queries': 0, 'db_seconds': 0.0, 'serializer_seconds': 0.0, 'serializing': False}
+        token = _request_metrics.set(usage)
+        started = time.perf_counter()
+        try:
+            # This thread's connection may predate the middleware
+            instrument_connection(connection)
+            response = self.get_response(request)
+        finally:
+            _request_metrics.reset(token)
+
+        self.record(request, response, usage, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        usage = {'queries': 0, 'db_seconds': 0.0, 'serializer_seconds': 0.0, 'serializing': False}
+        token = _request_metrics.set(usage)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_metrics.reset(token)
+
+        self.record(request, response, usage, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, usage: dict, seconds: float):
+        method = request.method if request.method in HTTP_METHODS else 'OTHER'
+        registry.record(_view_name(request), method, response.status_code, seconds, usage)
+
+
+def _signature_lines() -> list:
+    from users.signatures import get_verification_stats
+
+    stats = get_verification_stats()
+    pid = {'pid': str(os.getpid())}
+    lines = []
+    for key, kind, description in (
+        ('verifications', 'counter', 'Login signatures checked'),
+        ('cache_hits', 'counter', 'Login signatures answered from the recovered signer cache'),
+        ('recoveries', 'counter', 'Login signatures recovered'),
+        ('invalid_signatures', 'counter', 'Login signatures that could not be recovered'),
+        ('recovery_seconds_total', 'counter', 'Time spent recovering login signatures'),
+        ('recovery_seconds_max', 'gauge', 'Slowest login signature recovery'),
+        ('cached_signatures', 'gauge', 'Recovered signers held in the cache'),
+    ):
+        name = f'login_signature_{key}'
+        if kind == 'counter' and not name.endswith('_total'):
+            name += '_total'
+        _family(lines, name, kind, description)
+        _sample(lines, name, pid, stats[key])
+
+    return lines
+
+
+def _pool_lines() -> list:
+    from game.db.pool import get_pool_stats
+
+    pools = get_pool_stats()
+    if not pools:
+        return []
+
+    pid = str(os.getpid())
+    lines = []
+    for key, kind, description in (
+        ('checkouts', 'counter', 'Connections checked out of the pool'),
+        ('connects', 'counter', 'Connections opened by the pool'),
+        ('waits', 'counter', 'Checkouts that had to wait for a free connection'),
+        ('wait_seconds', 'counter', 'Time spent checking out connections'),
+        ('timeouts', 'counter', 'Checkouts that gave up waiting'),
+        ('failed_checks', 'counter', 'Idle connections that failed their health check'),
+        ('reaped', 'counter', 'Idle connections closed'),
+        ('recycled', 'counter', 'Connections closed for reaching their maximum lifetime'),
+        ('max_wait_seconds', 'gauge', 'Longest checkout wait'),
+        ('size', 'gauge', 'Open connections'),
+        ('idle', 'gauge', 'Idle connections'),
+        ('in_use', 'gauge', 'Connections checked out'),
+        ('max_size', 'gauge', 'Pool size limit'),
+    ):
+        name = f'db_pool_{key}_total' if kind == 'counter' else f'db_pool_{key}'
+        _family(lines, name, kind, description)
+        for pool, stats in sorted(pools.items()):
+            _sample(lines, name, {'pool': pool, 'pid': pid}, stats[key])
+
+    return lines
+
+
+def render_metrics() -> str:
+    return '\n'.join(registry.render() + _signature_lines() + _pool_lines()) + '\n'
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. Scrapers send METRICS_TOKEN as
+    ``Authorization: Bearer <token>``; without a token configured the
+    metrics are only served with DEBUG on.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponse(status=403)
+    elif not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,8 +1,10 @@
 
 from pathlib import Path
 import os
+import tempfile
 import django_heroku
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 
 from datetime import timedelta
 
@@ -17,7 +19,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = config('DJANGO_SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = config('DEBUG', default=True, cast=bool)
 
 ALLOWED_HOSTS = []
 
@@ -40,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'game.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -50,7 +53,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'game.urls'
+ROOT_URLCONF = config('ROOT_URLCONF', default='game.urls')
 
 TEMPLATES = [
     {
@@ -75,7 +78,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny'
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.SnapshotJWTAuthentication',
     )
 }
 
@@ -132,6 +135,23 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Files in one directory, so every worker on the host shares cached pages,
+# user snapshots and invalidations. Workers on several hosts need a cache
+# server here instead; local memory is only safe with a single worker.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_LOCATION', default=os.path.join(tempfile.gettempdir(), 'redfox-cache')),
+    }
+}
+
+LEADERBOARD_CACHE_TIMEOUT = config('LEADERBOARD_CACHE_TIMEOUT', default=30, cast=int)
+LEADERBOARD_CACHE_COALESCE_WINDOW = config('LEADERBOARD_CACHE_COALESCE_WINDOW', default=2, cast=float)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -171,6 +191,30 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 django_heroku.settings(locals())
 
+# Check PostgreSQL and MySQL connections out of a per-process pool instead
+# of connecting on every request. Django hands the connection back at the
+# end of each request, the pool decides how long it stays open; sizes are
+# per gunicorn worker
+DB_POOL_ENABLED = config('DB_POOL_ENABLED', default=False, cast=bool)
+
+POOLED_DB_ENGINES = {
+    'django.db.backends.postgresql': 'game.db.backends.postgresql',
+    'django.db.backends.postgresql_psycopg2': 'game.db.backends.postgresql',
+    'django.db.backends.mysql': 'game.db.backends.mysql',
+}
+
+if DB_POOL_ENABLED and DATABASES['default']['ENGINE'] in POOLED_DB_ENGINES:
+    DATABASES['default']['ENGINE'] = POOLED_DB_ENGINES[DATABASES['default']['ENGINE']]
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['POOL'] = {
+        'MAX_SIZE': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+        'TIMEOUT': config('DB_POOL_TIMEOUT', default=10.0, cast=float),
+        'MAX_IDLE': config('DB_POOL_MAX_IDLE', default=300.0, cast=float),
+        'MAX_LIFETIME': config('DB_POOL_MAX_LIFETIME', default=1800.0, cast=float),
+        'CHECK_AFTER': config('DB_POOL_CHECK_AFTER', default=30.0, cast=float),
+    }
+    MIDDLEWARE = ['game.db.middleware.PoolTimingMiddleware', *MIDDLEWARE]
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -178,6 +222,52 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
 
+# Seconds an in-process scoreboard rank index is trusted before it is rebuilt,
+# so that scores written through other workers show up
+RANK_INDEX_MAX_AGE = config('RANK_INDEX_MAX_AGE', default=30, cast=int)
+
+# Stage add-score submissions in the pending score table and return straight
+# away; `manage.py flush_pending_scores --loop` applies them in batches
+SCORE_WRITE_BEHIND = config('SCORE_WRITE_BEHIND', default=False, cast=bool)
+
+# Processes each web worker uses to recover login signatures (defaults to
+# the number of cores; 0 recovers on the request thread), and how many
+# recovered (message, signature) pairs each worker remembers
+SIGNATURE_RECOVERY_WORKERS = config('SIGNATURE_RECOVERY_WORKERS', default=os.cpu_count() or 1, cast=int)
+SIGNATURE_CACHE_SIZE = config('SIGNATURE_CACHE_SIZE', default=10000, cast=int)
+
+# Counter rows each referrer's referral counts are spread over, so signups
+# through one popular link do not queue on a single row;
+# `manage.py fold_referral_counters --loop` folds them into the user
+REFERRAL_COUNT_SHARDS = config('REFERRAL_COUNT_SHARDS', default=16, cast=int)
+
+# Seconds the top referrers ranking is cached; counting it groups the whole
+# referral closure table. 0 counts on every request
+TOP_REFERRERS_CACHE_TIMEOUT = config('TOP_REFERRERS_CACHE_TIMEOUT', default=60, cast=int)
+
+# Season referral rewards are credited to; 0 credits the newest season that
+# is not finalized. Referrals saved while it is finalized are recorded
+# without points
+REFERRAL_REWARD_SEASON = config('REFERRAL_REWARD_SEASON', default=0, cast=int)
+
+# Seconds an authenticated user's cached snapshot is trusted; saving the
+# user drops it straight away. Needs a CACHE_BACKEND shared between workers,
+# or a worker could keep a deactivated user signed in; 0 loads the user on
+# every request
+USER_SNAPSHOT_TTL = config('USER_SNAPSHOT_TTL', default=60, cast=int)
+
+# Revoked refresh tokens each process keeps in its Bloom filter before
+# rebuilding it, and how often it picks up tokens revoked elsewhere;
+# `manage.py prune_revoked_tokens --loop` drops the expired ones
+REVOKED_TOKEN_FILTER_CAPACITY = config('REVOKED_TOKEN_FILTER_CAPACITY', default=1000000, cast=int)
+REVOKED_TOKEN_SYNC_INTERVAL = config('REVOKED_TOKEN_SYNC_INTERVAL', default=1.0, cast=float)
+
+# Bearer token Prometheus must send to read /metrics. Required with DEBUG
+# off; with DEBUG on, leaving it empty serves /metrics to anyone
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+if not DEBUG and not METRICS_TOKEN:
+    raise ImproperlyConfigured('Set METRICS_TOKEN to serve /metrics with DEBUG off')
+
 CORS_ALLOWED_ORIGINS = [
     'http://whackablob.vercel.app',
     'https://whackablob.vercel.app',
@@ -10,6 +10,8 @@ from rest_framework import permissions
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 
+from .metrics import metrics_view
+
 
 schema_view = get_schema_view(
    openapi.Info(
@@ -36,6 +38,8 @@ urlpatterns = [
 
     path('healthcheck', health_check),
 
+    path('metrics', metrics_view, name='metrics'),
+
     path('whack-a-blob/', include('whack_blob.urls')),
 
     path('users/', include('users.urls'))
@@ -0,0 +1,72 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views import View
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated, ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+
+class AsyncAPIView(View):
+    """
+    Async counterpart of the DRF APIViews, for endpoints served over ASGI.
+
+    DRF views are sync only, so this keeps their contract by hand: the
+    request is authenticated with the configured DRF authentication
+    classes, bodies are parsed from JSON or form data, and APIExceptions
+    are rendered the same way DRF renders them.
+    """
+    authentication_required = True
+    http_method_names = ['post']
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # Token authenticated like the DRF views, so not subject to CSRF
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if self.authentication_required:
+                request.user = await self.authenticate(request)
+            request.data = self.parse_body(request)
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            return self.handle_exception(exc)
+
+    def get_authenticators(self):
+        return [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+
+    async def authenticate(self, request):
+        for authenticator in self.get_authenticators():
+            user_auth_tuple = await sync_to_async(authenticator.authenticate)(request)
+            if user_auth_tuple is not None:
+                return user_auth_tuple[0]
+
+        raise NotAuthenticated()
+
+    def parse_body(self, request):
+        if request.content_type != 'application/json':
+            return request.POST
+
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            raise ParseError('JSON parse error')
+
+    def handle_exception(self, exc: APIException) -> HttpResponse:
+        data = exc.detail
+        if not isinstance(data, (list, dict)):
+            data = {'detail': data}
+
+        response = self.respond(data, status=exc.status_code)
+        if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+            response['WWW-Authenticate'] = self.get_authenticators()[0].authenticate_header(self.request)
+
+        return response
+
+    def respond(self, data, status: int = 200) -> HttpResponse:
+        return HttpResponse(
+            JSONRenderer().render(data), status=status, content_type='application/json')
@@ -1,6 +1,12 @@
 from django.contrib import admin
 
-from .models import User
+from .models import (
+    ReferralCountShard, ReferralNameSequence, ReferralPath, ReferralReward, RevokedRefreshToken, User)
 
 
-admin.site.register(User)
\ No newline at end of file
+admin.site.register(User)
+admin.site.register(ReferralNameSequence)
+admin.site.register(ReferralReward)
+admin.site.register(ReferralPath)
+admin.site.register(ReferralCountShard)
+admin.site.register(RevokedRefreshToken)
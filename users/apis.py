@@ -2,11 +2,17 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import permissions, status, serializers
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.views import TokenRefreshView
 from drf_yasg.utils import swagger_auto_schema
 
 from .models import User
+from .referral_tree import TOP_REFERRERS_LIMIT, TOP_REFERRERS_MAX_DEPTH
+from .token_revocation import rotate_refresh_token
 
-from .services import get_player_profile, save_referral_details, update_user_task, user_login
+from .services import (
+    get_player_profile, save_referral_details, update_user_task, user_login, view_referral_downline,
+    view_top_referrers)
 
 
 class LoginAPI(APIView):
@@ -45,6 +51,24 @@ class LoginAPI(APIView):
         return Response(result, status=status.HTTP_200_OK)
     
 
+class TokenRefreshAPI(TokenRefreshView):
+    """
+    Refresh Token
+
+    Endpoint for swapping a refresh token for a new access and refresh
+    token; each refresh token can be used once
+    """
+
+    class InputSerializer(TokenRefreshSerializer):
+        class Meta:
+            ref_name = 'token refresh input'
+
+        def validate(self, attrs):
+            return rotate_refresh_token(self.token_class(attrs['refresh']))
+
+    serializer_class = InputSerializer
+
+
 class SaveReferralDetails(APIView):
     """
     Save a user's referrer
@@ -86,6 +110,8 @@ class ViewProfile(APIView):
             ref_name = 'view profile'
 
     class OutputSerializer(serializers.ModelSerializer):
+        referral_count = serializers.IntegerField(source='total_referral_count')
+
         class Meta:
             model = User
             fields = [
@@ -114,6 +140,90 @@ class ViewProfile(APIView):
         return Response(output_serializer.data)
 
 
+class ReferralDownlineAPI(APIView):
+    """
+    View a user's referral downline
+
+    Endpoint for counting a user's referrals, and their referrals, down to
+    an optional depth
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    class InputSerializer(serializers.Serializer):
+        address = serializers.CharField()
+        depth = serializers.IntegerField(min_value=1, required=False)
+
+        class Meta:
+            ref_name = 'referral downline input'
+
+    class OutputSerializer(serializers.Serializer):
+        class LevelSerializer(serializers.Serializer):
+            depth = serializers.IntegerField()
+            referrals = serializers.IntegerField()
+
+            class Meta:
+                ref_name = 'referral downline level'
+
+        address = serializers.CharField()
+        total = serializers.IntegerField()
+        levels = LevelSerializer(many=True)
+
+        class Meta:
+            ref_name = 'referral downline output'
+
+    @swagger_auto_schema(
+        request_body=InputSerializer,
+        responses={200: OutputSerializer}
+        )
+    def post(self, request):
+        input_serializer = self.InputSerializer(data=request.data)
+        input_serializer.is_valid(raise_exception=True)
+
+        downline = view_referral_downline(**input_serializer.validated_data)
+
+        output_serializer = self.OutputSerializer(downline)
+
+        return Response(output_serializer.data)
+
+
+class TopReferrersAPI(APIView):
+    """
+    View top referrers
+
+    Endpoint for listing the users with the largest referral downlines
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    class InputSerializer(serializers.Serializer):
+        depth = serializers.IntegerField(min_value=1, max_value=TOP_REFERRERS_MAX_DEPTH, required=False)
+        limit = serializers.IntegerField(min_value=1, max_value=TOP_REFERRERS_LIMIT, default=10)
+
+        class Meta:
+            ref_name = 'top referrers input'
+
+    class OutputSerializer(serializers.Serializer):
+        address = serializers.CharField(source='ancestor__address')
+        referral_username = serializers.CharField(source='ancestor__referral_username', allow_null=True)
+        downline = serializers.IntegerField()
+
+        class Meta:
+            ref_name = 'top referrers output'
+
+    @swagger_auto_schema(
+        request_body=InputSerializer,
+        responses={200: OutputSerializer(many=True)}
+        )
+    def post(self, request):
+        input_serializer = self.InputSerializer(data=request.data)
+        input_serializer.is_valid(raise_exception=True)
+
+        referrers = view_top_referrers(**input_serializer.validated_data)
+
+        output_serializer = self.OutputSerializer(referrers, many=True)
+
+        return Response(output_serializer.data)
+
+
 class AddTaskAPI(APIView):
     """
     Specify if user has performed a task
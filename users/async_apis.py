@@ -0,0 +1,45 @@
+from rest_framework import status
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from helpers.async_views import AsyncAPIView
+
+from . import apis
+from .services import aget_player_profile, auser_login
+
+
+class LoginAPI(AsyncAPIView):
+    """
+    Metamask Login
+
+    Async endpoint for handling wallet login
+    """
+    authentication_required = False
+
+    async def post(self, request):
+        input_serializer = apis.LoginAPI.InputSerializer(data=request.data)
+        input_serializer.is_valid(raise_exception=True)
+
+        try:
+            result = await auser_login(**input_serializer.validated_data)
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
+
+        return self.respond(result, status=status.HTTP_200_OK)
+
+
+class ViewProfile(AsyncAPIView):
+    """
+    View a user profile
+
+    Async endpoint for viewing user profile
+    """
+
+    async def post(self, request):
+        input_serializer = apis.ViewProfile.InputSerializer(data=request.data)
+        input_serializer.is_valid(raise_exception=True)
+
+        player_profile = await aget_player_profile(**input_serializer.validated_data)
+
+        output_serializer = apis.ViewProfile.OutputSerializer(player_profile)
+
+        return self.respond(output_serializer.data)
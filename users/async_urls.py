@@ -0,0 +1,14 @@
+from django.urls import path
+
+from . import async_apis
+from .urls import app_name, urlpatterns as sync_urlpatterns
+
+async_urlpatterns = [
+    path('login', async_apis.LoginAPI.as_view(), name='login'),
+    path('view-profile', async_apis.ViewProfile.as_view(), name='view-profile'),
+]
+
+async_names = {pattern.name for pattern in async_urlpatterns}
+
+urlpatterns = async_urlpatterns + [
+    pattern for pattern in sync_urlpatterns if pattern.name not in async_names]
@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+
+# What authenticated views read off request.user. Anything else is deferred
+# and loaded on first access, like a .only() queryset
+SNAPSHOT_FIELD_NAMES = {
+    'id',
+    'created_at',
+    'address',
+    'referral_username',
+    'twitter_task',
+    'telegram_task',
+    'whitelist_task',
+    'is_staff',
+    'is_superuser',
+    'is_active',
+}
+
+# Model.from_db takes the values in the model's field order
+SNAPSHOT_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields if field.attname in SNAPSHOT_FIELD_NAMES)
+
+
+def _snapshot_cache_key(user_pk) -> str:
+    return f'user-snapshot:{user_pk}'
+
+
+def check_snapshot_cache():
+    """
+    Refuse to cache snapshots in a per-process cache. Saving a user only
+    drops the snapshot in the process that saved it, so other workers
+    would keep authenticating a deactivated user for USER_SNAPSHOT_TTL.
+    """
+    if settings.USER_SNAPSHOT_TTL and isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache):
+        raise ImproperlyConfigured(
+            'USER_SNAPSHOT_TTL needs a CACHE_BACKEND shared between worker processes; '
+            'set USER_SNAPSHOT_TTL=0 to load the user on every request instead')
+
+
+def get_user_snapshot(user_pk):
+    """
+    Return the user as a model instance built from a cached snapshot of
+    SNAPSHOT_FIELDS, loading and caching it on a miss. Returns None if the
+    user does not exist. With USER_SNAPSHOT_TTL at 0 nothing is cached.
+    """
+    cache_key = _snapshot_cache_key(user_pk)
+    values = cache.get(cache_key) if settings.USER_SNAPSHOT_TTL else None
+
+    if values is None:
+        values = User.objects.filter(pk=user_pk).values_list(*SNAPSHOT_FIELDS).first()
+        if values is None:
+            return None
+        if settings.USER_SNAPSHOT_TTL:
+            cache.set(cache_key, values, settings.USER_SNAPSHOT_TTL)
+
+    return User.from_db('default', SNAPSHOT_FIELDS, values)
+
+
+def invalidate_user_snapshot(user_pk):
+    # Called from post_save and post_delete. Queryset update() and delete()
+    # send no signals, so code changing users in bulk must drop their
+    # snapshots itself, as users.services.deactivate_users does
+    cache.delete(_snapshot_cache_key(user_pk))
+
+
+class SnapshotJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that reads the user from a cached snapshot instead of
+    loading the row on every request. Snapshots live for USER_SNAPSHOT_TTL
+    seconds and are dropped whenever the user is saved.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        user = get_user_snapshot(user_id)
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        return user
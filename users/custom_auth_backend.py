@@ -1,10 +1,15 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
-from web3.auto import w3
-from eth_account.messages import defunct_hash_message
+
+from .services import create_wallet_user
+from .signatures import recover_signer
 
 
 class CustomAuthBackend(ModelBackend):
+    # Wallets that sign in for the first time get an account, the way
+    # RemoteUserBackend creates unknown users
+    create_unknown_user = True
+
     def authenticate(self, request=None, username=None,
                      password=None, **kwargs):
         user_model = get_user_model()
@@ -13,28 +18,24 @@ class CustomAuthBackend(ModelBackend):
             username = kwargs.get('address')
 
         if username == 'redfox_admin1990':
-            users = user_model._default_manager.filter(address=username)
-
-            if users.exists():
-                user =  users[0]
+            user = user_model._default_manager.filter(address=username).first()
 
-            if user.check_password(password):
+            if user is not None and user.check_password(password):
                 return user
 
             else:
                 return None
 
-        else:
-            signature = kwargs.get('signature')
-            message = kwargs.get('message')
-            message_hash = defunct_hash_message(text=message)
-            address = w3.eth.account.recoverHash(
-                message_hash, signature=signature)
+        signature = kwargs.get('signature')
+        message = kwargs.get('message')
+        address = recover_signer(message, signature)
 
-            if address.lower() != username.lower():
-                return None
+        if address is None or address.lower() != username.lower():
+            return None
+
+        user = user_model._default_manager.filter(address=username).first()
 
-        users = user_model._default_manager.filter(address=username)
+        if user is None and self.create_unknown_user:
+            user = create_wallet_user(username)
 
-        if users.exists():
-            return users[0]
+        return user
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.referral_counters import fold_referral_counters
+
+
+class Command(BaseCommand):
+    help = 'Fold sharded referral counters into the users they belong to'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', action='store_true', help='Keep folding until interrupted')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep when idle')
+
+    def handle(self, *args, **options):
+        while True:
+            folded = fold_referral_counters(batch_size=options['batch_size'])
+            while folded:
+                self.stdout.write(f'Folded {folded} referral counter rows')
+                folded = fold_referral_counters(batch_size=options['batch_size'])
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.token_revocation import prune_revoked_tokens
+
+
+class Command(BaseCommand):
+    help = 'Delete revoked refresh tokens that have expired'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', action='store_true', help='Keep pruning until interrupted')
+        parser.add_argument('--interval', type=float, default=3600.0, help='Seconds to sleep when idle')
+
+    def handle(self, *args, **options):
+        while True:
+            pruned = total = prune_revoked_tokens(batch_size=options['batch_size'])
+            while pruned:
+                pruned = prune_revoked_tokens(batch_size=options['batch_size'])
+                total += pruned
+
+            self.stdout.write(self.style.SUCCESS(f'Pruned {total} revoked refresh tokens'))
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
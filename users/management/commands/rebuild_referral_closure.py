@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from users.referral_tree import rebuild_referral_closure
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the referral closure table from the referrer foreign keys'
+
+    def handle(self, *args, **options):
+        paths = rebuild_referral_closure()
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {paths} referral paths'))
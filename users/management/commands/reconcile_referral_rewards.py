@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from users.services import reconcile_referral_rewards
+
+
+class Command(BaseCommand):
+    help = 'Link referrals to their referrers and settle referral rewards recorded before the ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        totals = reconcile_referral_rewards(batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Linked {totals['linked']} referrals, recorded {totals['recorded']} rewards, "
+            f"credited {totals['credited']} unpaid referrals and fixed counts for {totals['fixed']} users"))
@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-18 16:28
+
+from django.db import migrations, models
+
+
+def seed_referral_username_sequence(apps, schema_editor):
+    ReferralNameSequence = apps.get_model('users', 'ReferralNameSequence')
+    ReferralNameSequence.objects.get_or_create(name='referral_username')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_whitelist_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferralNameSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('next_value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ('-created_at',),
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(seed_referral_username_sequence, migrations.RunPython.noop),
+    ]
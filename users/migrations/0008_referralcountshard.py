@@ -0,0 +1,31 @@
+# Generated by Django 4.2 on 2026-10-18 16:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_referralpath'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferralCountShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('referrals', models.IntegerField(default=0)),
+                ('rewarded_referrals', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='referral_count_shards', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='referralcountshard',
+            constraint=models.UniqueConstraint(fields=('user', 'shard'), name='unique_referral_count_shard'),
+        ),
+    ]
@@ -41,6 +41,8 @@ class User(BaseModel, AbstractBaseUser, PermissionsMixin):
     address = models.CharField(max_length=150, unique=True, db_index=True)
     referral_username = models.CharField(max_length=100, unique=True, blank=True, null=True)
     referrer_username = models.CharField(max_length=100, blank=True, null=True)
+    referrer = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, blank=True, null=True, related_name='referrals')
     referral_count = models.IntegerField(default=0)
     last_rewarded_referral_count = models.IntegerField(default=0)
     twitter_task = models.IntegerField(default=0)
@@ -54,4 +56,66 @@ class User(BaseModel, AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'address'
     
     def __str__(self):
-        return self.address
\ No newline at end of file
+        return self.address
+
+
+class ReferralReward(BaseModel):
+    referral = models.OneToOneField(User, on_delete=models.CASCADE, related_name='referral_reward')
+    referrer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='referral_rewards')
+    points = models.IntegerField()
+
+    def __str__(self):
+        return f'{self.referrer} rewarded {self.points} for {self.referral}'
+
+
+class ReferralPath(BaseModel):
+    ancestor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='descendant_paths')
+    descendant = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ancestor_paths')
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['ancestor', 'descendant'], name='unique_referral_path'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['ancestor', 'depth'], name='referral_path_ancestor_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.ancestor_id} -> {self.descendant_id} ({self.depth})'
+
+
+class ReferralCountShard(BaseModel):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='referral_count_shards')
+    shard = models.PositiveSmallIntegerField()
+    referrals = models.IntegerField(default=0)
+    rewarded_referrals = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'shard'], name='unique_referral_count_shard'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} [{self.shard}]: {self.referrals}'
+
+
+class ReferralNameSequence(BaseModel):
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name}: {self.next_value}'
+
+
+class RevokedRefreshToken(models.Model):
+    # Kept to the JTI and its expiry day so the table stays small: one row
+    # per rotated refresh token, dropped once its day bucket has passed
+    jti = models.UUIDField(unique=True)
+    expires_on = models.DateField(db_index=True)
+
+    def __str__(self):
+        return f'{self.jti} (expires {self.expires_on})'
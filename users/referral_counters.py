@@ -0,0 +1,106 @@
+import random
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import ReferralCountShard, User
+
+
+def increment_referral_counters(referrer: User, rewarded: bool):
+    """
+    Count a referral on one of the referrer's counter rows, picked at
+    random, instead of on the user row every signup would queue behind.
+    """
+    _count_on_shard(referrer.pk, 1, int(rewarded))
+
+
+def decrement_referral_counters(referrer_pk: int):
+    """
+    Take back the count of a referral that moved to another referrer. Its
+    reward stays with the referrer that earned it, as in the ledger. A
+    counter row can go below zero until it is folded.
+    """
+    _count_on_shard(referrer_pk, -1, 0)
+
+
+def _count_on_shard(user_pk: int, referrals: int, rewarded_referrals: int):
+    shard = random.randrange(settings.REFERRAL_COUNT_SHARDS)
+    counter = ReferralCountShard.objects.filter(user_id=user_pk, shard=shard)
+    increments = {
+        'referrals': F('referrals') + referrals,
+        'rewarded_referrals': F('rewarded_referrals') + rewarded_referrals,
+    }
+
+    if counter.update(**increments):
+        return
+
+    try:
+        with transaction.atomic():
+            ReferralCountShard.objects.create(
+                user_id=user_pk, shard=shard, referrals=referrals, rewarded_referrals=rewarded_referrals)
+    except IntegrityError:
+        counter.update(**increments)
+
+
+def with_referral_counts(users):
+    """
+    Annotate users with total_referral_count and
+    total_rewarded_referral_count: the folded counts on the user row plus
+    what the counter rows still hold.
+    """
+    unfolded = ReferralCountShard.objects.filter(
+        user=OuterRef('pk')).order_by().values('user')
+
+    return users.annotate(
+        total_referral_count=F('referral_count') + Coalesce(
+            Subquery(unfolded.annotate(total=Sum('referrals')).values('total')), 0),
+        total_rewarded_referral_count=F('last_rewarded_referral_count') + Coalesce(
+            Subquery(unfolded.annotate(total=Sum('rewarded_referrals')).values('total')), 0),
+    )
+
+
+def fold_referral_counters(batch_size: int = 1000) -> int:
+    """
+    Move up to ``batch_size`` counter rows into User.referral_count and
+    User.last_rewarded_referral_count. Returns the number of rows folded.
+
+    Rows being incremented right now are skipped and picked up by the next
+    fold.
+    """
+    with transaction.atomic():
+        shards = ReferralCountShard.objects.order_by('pk')
+        if connection.features.has_select_for_update_skip_locked:
+            shards = shards.select_for_update(skip_locked=True)
+        shards = list(shards.values_list('pk', 'user_id', 'referrals', 'rewarded_referrals')[:batch_size])
+        if not shards:
+            return 0
+
+        totals = {}
+        for _, user_pk, referrals, rewarded_referrals in shards:
+            folded_referrals, folded_rewarded = totals.get(user_pk, (0, 0))
+            totals[user_pk] = (folded_referrals + referrals, folded_rewarded + rewarded_referrals)
+
+        User.objects.filter(pk__in=totals).update(
+            referral_count=F('referral_count') + _per_user(totals, 0),
+            last_rewarded_referral_count=F('last_rewarded_referral_count') + _per_user(totals, 1),
+        )
+        ReferralCountShard.objects.filter(pk__in=[shard[0] for shard in shards]).delete()
+
+    return len(shards)
+
+
+def _per_user(totals: dict, index: int) -> Case:
+    return Case(
+        *[When(pk=user_pk, then=Value(counts[index])) for user_pk, counts in totals.items()],
+        default=Value(0), output_field=IntegerField())
+
+
+def fold_all_referral_counters(batch_size: int = 1000) -> int:
+    folded = 0
+    while True:
+        batch = fold_referral_counters(batch_size)
+        if not batch:
+            return folded
+        folded += batch
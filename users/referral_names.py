@@ -0,0 +1,80 @@
+import threading
+from math import gcd
+
+from django.db import transaction
+from django.db.models import F
+from faker.providers.person.en_US import Provider as PersonProvider
+
+from .models import ReferralNameSequence
+
+REFERRAL_USERNAME_SEQUENCE = 'referral_username'
+BLOCK_SIZE = 100
+
+# Loaded once per process. Faker is pinned in requirements.txt: changing
+# the pool changes which name a sequence number maps to, so an upgrade that
+# alters first_names_nonbinary needs the sequence moved past the names
+# already handed out
+NAME_POOL = sorted(set(PersonProvider.first_names_nonbinary))
+
+
+def _name_stride(pool_size: int) -> int:
+    # Step through the pool by a stride coprime to its size, so consecutive
+    # sequence numbers visit every name once per round without signups
+    # getting alphabetically adjacent names
+    stride = int(pool_size * 0.618) or 1
+    while gcd(stride, pool_size) != 1:
+        stride += 1
+    return stride
+
+
+NAME_STRIDE = _name_stride(len(NAME_POOL))
+
+_block = {'next': 0, 'end': 0}
+_block_lock = threading.Lock()
+
+
+def referral_username_for(number: int) -> str:
+    """
+    Map a sequence number to its username: round n // P of the pool gives
+    the numeric suffix, so numbers never map to the same name, and none of
+    them can collide with the digit-free names handed out before.
+    """
+    pool_size = len(NAME_POOL)
+    name = NAME_POOL[(number * NAME_STRIDE) % pool_size]
+    return f'redfox-{name}{number // pool_size + 1}'
+
+
+def allocate_referral_usernames(count: int) -> list:
+    """
+    Hand out ``count`` unique referral usernames.
+
+    Numbers come from a block reserved from the ReferralNameSequence row
+    (hi/lo), so most calls do not touch the database and a bulk signup
+    reserves everything it needs in one update. Call it outside any
+    transaction that may roll back, or the reserved block could be handed
+    out again.
+    """
+    numbers = []
+    with _block_lock:
+        while len(numbers) < count:
+            if _block['next'] == _block['end']:
+                _block['next'], _block['end'] = _reserve_block(max(BLOCK_SIZE, count - len(numbers)))
+            take = min(count - len(numbers), _block['end'] - _block['next'])
+            numbers.extend(range(_block['next'], _block['next'] + take))
+            _block['next'] += take
+
+    return [referral_username_for(number) for number in numbers]
+
+
+def _reserve_block(size: int) -> tuple:
+    sequence = ReferralNameSequence.objects.filter(name=REFERRAL_USERNAME_SEQUENCE)
+    with transaction.atomic():
+        sequence.update(next_value=F('next_value') + size)
+        end = sequence.values_list('next_value', flat=True).get()
+
+    return end - size, end
+
+
+def reset_referral_username_block():
+    with _block_lock:
+        _block['next'] = _block['end'] = 0
@@ -0,0 +1,186 @@
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import ReferralPath, User
+
+DELETE_CHUNK_SIZE = 1000
+
+# Most referrers top_referrers returns, and how deep it counts; the cached
+# rankings are keyed by depth, so it must stay bounded
+TOP_REFERRERS_LIMIT = 100
+TOP_REFERRERS_MAX_DEPTH = 100
+
+SHARE_LOCK_CLAUSES = {
+    'postgresql': 'FOR SHARE',
+    'mysql': 'LOCK IN SHARE MODE',
+}
+
+
+def move_referral(referral: User, referrer: Optional[User]):
+    """
+    Keep the referral closure table in line with a referral's new referrer.
+
+    Every (ancestor, descendant) pair in the tree has one row holding its
+    depth, so downline queries are a single indexed scan. Moving a referral
+    drops the paths from its old ancestors into its subtree and joins its
+    subtree under the new referrer's ancestors in one INSERT ... SELECT.
+    """
+    _lock_for_move(referral.pk, referrer.pk if referrer is not None else None)
+
+    if referrer is not None:
+        if referrer.pk == referral.pk:
+            raise ValidationError('Players cannot refer themselves')
+        if ReferralPath.objects.filter(ancestor=referral, descendant=referrer).exists():
+            raise ValidationError('Referrer is in this referral\'s downline')
+
+    _detach_subtree(referral.pk)
+    if referrer is not None:
+        _attach_subtree(referral.pk, referrer.pk)
+
+
+def _lock_for_move(referral_pk: int, referrer_pk: Optional[int]):
+    # The referral is locked for update and the referrer for share: two
+    # players referring each other at the same time cannot both pass the
+    # loop check, while signups through one popular link do not queue
+    User.objects.select_for_update().filter(pk=referral_pk).values_list('pk').first()
+
+    share_lock = SHARE_LOCK_CLAUSES.get(connection.vendor)
+    if referrer_pk is None or share_lock is None:
+        return
+
+    user_table = connection.ops.quote_name(User._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT id FROM {user_table} WHERE id = %s {share_lock}', [referrer_pk])
+
+
+def _detach_subtree(referral_pk: int) -> int:
+    ancestor_pks = list(ReferralPath.objects.filter(
+        descendant_id=referral_pk).values_list('ancestor_id', flat=True))
+    if not ancestor_pks:
+        return 0
+
+    subtree_pks = [referral_pk] + list(ReferralPath.objects.filter(
+        ancestor_id=referral_pk).values_list('descendant_id', flat=True))
+
+    deleted = 0
+    for start in range(0, len(subtree_pks), DELETE_CHUNK_SIZE):
+        deleted += ReferralPath.objects.filter(
+            ancestor_id__in=ancestor_pks,
+            descendant_id__in=subtree_pks[start:start + DELETE_CHUNK_SIZE]).delete()[0]
+
+    return deleted
+
+
+def _attach_subtree(referral_pk: int, referrer_pk: int) -> int:
+    path_table = connection.ops.quote_name(ReferralPath._meta.db_table)
+    now = timezone.now()
+
+    sql = f"""
+        INSERT INTO {path_table} (created_at, modified_at, ancestor_id, descendant_id, depth)
+        SELECT %s, %s, ancestors.ancestor_id, descendants.descendant_id,
+            ancestors.depth + descendants.depth + 1
+        FROM (
+            SELECT ancestor_id, depth FROM {path_table} WHERE descendant_id = %s
+            UNION ALL SELECT %s, 0
+        ) ancestors
+        CROSS JOIN (
+            SELECT descendant_id, depth FROM {path_table} WHERE ancestor_id = %s
+            UNION ALL SELECT %s, 0
+        ) descendants
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [now, now, referrer_pk, referrer_pk, referral_pk, referral_pk])
+        return cursor.rowcount
+
+
+def referral_downline(user: User, max_depth: int = None) -> dict:
+    paths = ReferralPath.objects.filter(ancestor=user)
+    if max_depth is not None:
+        paths = paths.filter(depth__lte=max_depth)
+
+    levels = list(paths.order_by('depth').values('depth').annotate(referrals=Count('id')))
+
+    return {
+        'address': user.address,
+        'total': sum(level['referrals'] for level in levels),
+        'levels': levels,
+    }
+
+
+def top_referrers(max_depth: int = None, limit: int = 10) -> list:
+    """
+    Rank referrers by how many players are in their downline, counting
+    ``max_depth`` levels down.
+
+    Counting groups the whole closure table, so each depth's top
+    TOP_REFERRERS_LIMIT are cached for TOP_REFERRERS_CACHE_TIMEOUT seconds
+    and new referrals show up once the cached ranking expires.
+    """
+    cache_key = f'top-referrers:{max_depth}'
+    ranking = cache.get(cache_key)
+    if ranking is None:
+        ranking = _rank_referrers(max_depth)
+        cache.set(cache_key, ranking, settings.TOP_REFERRERS_CACHE_TIMEOUT)
+
+    return ranking[:limit]
+
+
+def _rank_referrers(max_depth: Optional[int]) -> list:
+    paths = ReferralPath.objects.all()
+    if max_depth is not None:
+        paths = paths.filter(depth__lte=max_depth)
+
+    return list(paths.order_by().values(
+        'ancestor__address', 'ancestor__referral_username').annotate(
+            downline=Count('id')).order_by('-downline', 'ancestor__address')[:TOP_REFERRERS_LIMIT])
+
+
+@transaction.atomic
+def rebuild_referral_closure() -> int:
+    """
+    Rebuild the closure table from the referrer foreign keys, one INSERT
+    ... SELECT per tree level. Pairs already present are skipped, so
+    referral loops in old data end instead of growing forever.
+    """
+    path_table = connection.ops.quote_name(ReferralPath._meta.db_table)
+    user_table = connection.ops.quote_name(User._meta.db_table)
+    now = timezone.now()
+
+    ReferralPath.objects.all().delete()
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {path_table} (created_at, modified_at, ancestor_id, descendant_id, depth)
+            SELECT %s, %s, referrer_id, id, 1
+            FROM {user_table}
+            WHERE referrer_id IS NOT NULL AND referrer_id <> id
+        """, [now, now])
+        inserted = total = cursor.rowcount
+
+        depth = 1
+        while inserted:
+            cursor.execute(f"""
+                INSERT INTO {path_table} (created_at, modified_at, ancestor_id, descendant_id, depth)
+                SELECT %s, %s, paths.ancestor_id, referrals.id, paths.depth + 1
+                FROM {path_table} paths
+                INNER JOIN {user_table} referrals ON referrals.referrer_id = paths.descendant_id
+                WHERE paths.depth = %s
+                    AND referrals.id <> paths.ancestor_id
+                    AND NOT EXISTS (
+                        SELECT 1 FROM {path_table} existing
+                        WHERE existing.ancestor_id = paths.ancestor_id
+                            AND existing.descendant_id = referrals.id
+                    )
+            """, [now, now, depth])
+            inserted = cursor.rowcount
+            total += inserted
+            depth += 1
+
+    return total
@@ -1,134 +1,300 @@
+from collections import defaultdict
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import authenticate
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.db.models import F
 from rest_framework.exceptions import ValidationError
 from rest_framework_simplejwt.tokens import RefreshToken
 from web3.auto import w3
-from faker import Faker
-
-from whack_blob.services import update_user_score
 
-from .models import User
+from whack_blob.models import Season
+from whack_blob.services import enqueue_user_score, update_user_score
 
+from .authentication import invalidate_user_snapshot
+from .models import ReferralReward, User
+from .referral_counters import (
+    decrement_referral_counters, fold_all_referral_counters, increment_referral_counters, with_referral_counts)
+from .referral_names import allocate_referral_usernames
+from .referral_tree import move_referral, referral_downline, top_referrers
+from .signatures import arecover_signer
 
-def user_login(address: str, signature: str, message: str):
-    check_user = check_if_user_exists(address)
+REFERRAL_REWARD_POINTS = 500
 
-    if not check_user:
-        new_user = create_user(address)
-        address = new_user.address
-        new_user.is_active = True
-        new_user.save()
 
+def user_login(address: str, signature: str, message: str):
     authenticate_kwargs = {
         'address': address,
         'message': message,
         'signature': signature
     }
 
+    # The backend verifies the signature before touching the database and
+    # only opens a transaction to create a new user
     user = authenticate(**authenticate_kwargs)
 
     if not user:
         raise ValidationError(
             'Incorrect login credentials'
         )
-    tokens = RefreshToken.for_user(user)
 
-    credit_referral_points(user)
+    return login_tokens(user)
 
-    return {
-        'access_token': str(tokens.access_token),
-        'refresh_token': str(tokens),
-    }
 
+async def auser_login(address: str, signature: str, message: str):
+    """
+    user_login for async views. The signature is recovered without holding
+    a thread, and only creating a first-time user goes through
+    sync_to_async.
+    """
+    signer = await arecover_signer(message, signature)
+    if signer is None or signer.lower() != address.lower():
+        raise ValidationError(
+            'Incorrect login credentials'
+        )
 
-def check_if_user_exists(address: str):
-    try:
-        User.objects.get(address=address)
-    except User.DoesNotExist:
-        return False
-    
-    return True
+    user = await User.objects.filter(address=address).afirst()
+    if user is None:
+        user = await sync_to_async(create_wallet_user)(address)
 
+    return login_tokens(user)
 
-def create_user(address: str):
-    referral_username = create_referral_username()
-    user = User.objects.create(
-        address=address,
-        referral_username=referral_username
-    )
-    
-    return user
 
+def login_tokens(user: User) -> dict:
+    tokens = RefreshToken.for_user(user)
 
-def credit_referral_points(user: User):
-    old_referral_count = user.last_rewarded_referral_count
-    new_referral_count = User.objects.filter(referrer_username=user.referral_username).count()
-    extra_referrals = new_referral_count - old_referral_count
-    referral_points = extra_referrals * 500
+    return {
+        'access_token': str(tokens.access_token),
+        'refresh_token': str(tokens),
+    }
 
-    if referral_points > 0:
-        data = {
-            'season': 1,
-            'score': referral_points}
 
-        update_user_score(user, data, ref_score=True)
-        user.last_rewarded_referral_count += extra_referrals
-        user.save(update_fields=['last_rewarded_referral_count'])
+def create_wallet_user(address: str) -> User:
+    # The username is allocated before the insert's transaction opens:
+    # a block of names reserved inside a transaction that then rolls
+    # back could be reserved again by another worker
+    referral_username = create_referral_username()
 
-    else:
-        pass
+    try:
+        with transaction.atomic():
+            return User.objects.create(
+                address=address,
+                referral_username=referral_username,
+                is_active=True)
+    except IntegrityError:
+        return User.objects.get(address=address)
 
 
-def create_referral_username():
-    gen_name = Faker().first_name_nonbinary()
-    referral_username = 'redfox-{}'.format(gen_name)
+def create_referral_username() -> str:
+    return allocate_referral_usernames(1)[0]
 
-    if not validate_ref_username(referral_username):
-        create_referral_username()
 
-    return referral_username
+@transaction.atomic
+def save_referral_details(referral_address: str, referrer_username: str):
+    referral = get_referral(referral_address)
+    referrer = get_referrer(referrer_username)
+    previous_referrer_pk = referral.referrer_id
+    referrer_pk = referrer.pk if referrer is not None else None
 
+    if referrer_pk != previous_referrer_pk:
+        move_referral(referral, referrer)
 
-def validate_ref_username(re_username):
-    try:
-        User.objects.get(referral_username=re_username)
-        return False
-    except User.DoesNotExist:
-        return True
+    update_referral(referral, referrer_username, referrer)
 
-@transaction.atomic
-def save_referral_details(referral_address: str, referrer_username: str):
-    update_referral(referral_address, referrer_username)
-    update_referrer(referrer_username)
+    if previous_referrer_pk is not None and referrer_pk != previous_referrer_pk:
+        decrement_referral_counters(previous_referrer_pk)
+    if referrer is not None and referrer_pk != previous_referrer_pk:
+        rewarded = reward_referral(referral, referrer)
+        increment_referral_counters(referrer, rewarded)
 
 
-def update_referral(referral_address: str, referrer_username: str):
+def get_referral(referral_address: str) -> User:
     try:
-        referral = User.objects.get(address=referral_address)
-        referral.referrer_username = referrer_username
-        referral.save(update_fields=['referrer_username'])
+        return User.objects.get(address=referral_address)
     except User.DoesNotExist:
         raise ValidationError(
             'Referral does not exist'
         )
 
 
-def update_referrer(referrer_username: str):
+def get_referrer(referrer_username: str) -> Optional[User]:
     try:
-        referrer = User.objects.get(referral_username=referrer_username)
-        referrer.referral_count += 1
-        referrer.save(update_fields=['referral_count'])
+        return User.objects.get(referral_username=referrer_username)
     except User.DoesNotExist:
         if referrer_username == 'no-referrer':
-            pass
+            return None
         else:
             raise ValidationError(
                 'Referrer does not exist')
 
 
+def update_referral(referral: User, referrer_username: str, referrer: Optional[User]):
+    referral.referrer_username = referrer_username
+    referral.referrer = referrer
+    referral.save(update_fields=['referrer_username', 'referrer'])
+
+
+def get_referral_reward_season() -> Optional[Season]:
+    """
+    The season referral rewards are credited to: REFERRAL_REWARD_SEASON,
+    or the newest open season when that is 0. None if it is finalized.
+    """
+    seasons = Season.objects.filter(finalized_at__isnull=True)
+    if settings.REFERRAL_REWARD_SEASON:
+        seasons = seasons.filter(pk=settings.REFERRAL_REWARD_SEASON)
+
+    return seasons.order_by('-pk').first()
+
+
+def reward_referral(referral: User, referrer: User) -> bool:
+    """
+    Credit the referrer once per referral. The ledger row is the claim, so
+    a referral saved again, or moved to another referrer, is not paid twice.
+
+    With SCORE_WRITE_BEHIND the points are staged for
+    flush_pending_scores, so signups under a popular referrer do not queue
+    on the referrer's standing row; otherwise they are applied straight
+    away. While the reward season is finalized the referral is recorded
+    with no points, and saving it still succeeds.
+    """
+    season = get_referral_reward_season()
+    points = REFERRAL_REWARD_POINTS if season else 0
+    try:
+        with transaction.atomic():
+            ReferralReward.objects.create(
+                referral=referral, referrer=referrer, points=points)
+    except IntegrityError:
+        return False
+
+    if not points:
+        return True
+
+    data = {
+        'season': season.pk,
+        'score': points}
+
+    try:
+        with transaction.atomic():
+            if settings.SCORE_WRITE_BEHIND:
+                enqueue_user_score(referrer, data, ref_score=True)
+            else:
+                update_user_score(referrer, data, ref_score=True)
+    except ValidationError:
+        # The season was finalized since it was looked up
+        ReferralReward.objects.filter(referral=referral).update(points=0)
+
+    return True
+
+
+def reconcile_referral_rewards(batch_size: int = 1000) -> dict:
+    """
+    Bring referrals recorded before the ledger in line with it: link
+    referrer foreign keys from referrer_username, record a ledger row for
+    every referral, credit the ones the old login-time count had not paid
+    yet, and reset referral_count and last_rewarded_referral_count from
+    the ledger.
+    """
+    fold_all_referral_counters(batch_size)
+    season = get_referral_reward_season()
+    totals = {'linked': _link_referrers(batch_size), 'recorded': 0, 'credited': 0, 'fixed': 0}
+
+    last_pk = 0
+    while True:
+        users = list(User.objects.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+        if not users:
+            break
+
+        last_pk = users[-1].pk
+        for key, value in _reconcile_referrers(users, season).items():
+            totals[key] += value
+
+    return totals
+
+
+def _link_referrers(batch_size: int) -> int:
+    linked = 0
+    last_pk = 0
+    while True:
+        referrals = list(User.objects.filter(
+            pk__gt=last_pk, referrer__isnull=True, referrer_username__isnull=False).order_by(
+                'pk').only('pk', 'referrer_username')[:batch_size])
+        if not referrals:
+            break
+
+        last_pk = referrals[-1].pk
+        referrer_pks = dict(User.objects.filter(
+            referral_username__in={referral.referrer_username for referral in referrals}).values_list(
+                'referral_username', 'pk'))
+
+        linked_referrals = []
+        for referral in referrals:
+            referral.referrer_id = referrer_pks.get(referral.referrer_username)
+            if referral.referrer_id is not None and referral.referrer_id != referral.pk:
+                linked_referrals.append(referral)
+
+        User.objects.bulk_update(linked_referrals, ['referrer'])
+        linked += len(linked_referrals)
+
+    return linked
+
+
+@transaction.atomic
+def _reconcile_referrers(referrers: list, season: Optional[Season]) -> dict:
+    referrals = defaultdict(list)
+    for referral_pk, referrer_pk in User.objects.filter(
+            referrer__in=referrers).order_by('pk').values_list('pk', 'referrer_id'):
+        referrals[referrer_pk].append(referral_pk)
+
+    ledger = defaultdict(set)
+    for referral_pk, referrer_pk in ReferralReward.objects.filter(
+            referrer__in=referrers).values_list('referral_id', 'referrer_id'):
+        ledger[referrer_pk].add(referral_pk)
+    rewarded_elsewhere = set(ReferralReward.objects.filter(
+        referral__referrer__in=referrers).exclude(
+            referrer=F('referral__referrer')).values_list('referral_id', flat=True))
+
+    new_rewards = []
+    fixed_referrers = []
+    credited = 0
+    for referrer in referrers:
+        unrewarded = [
+            referral_pk for referral_pk in referrals[referrer.pk]
+            if referral_pk not in ledger[referrer.pk] and referral_pk not in rewarded_elsewhere]
+        # The old login-time count paid last_rewarded_referral_count
+        # referrals without saying which, so the oldest are taken as paid
+        already_paid = max(referrer.last_rewarded_referral_count - len(ledger[referrer.pk]), 0)
+        # Without an open reward season the owed referrals are recorded unpaid
+        owed = unrewarded[already_paid:] if season else []
+
+        new_rewards.extend(
+            ReferralReward(
+                referral_id=referral_pk, referrer=referrer,
+                points=REFERRAL_REWARD_POINTS if index < already_paid or season else 0)
+            for index, referral_pk in enumerate(unrewarded))
+        if owed:
+            update_user_score(
+                referrer, {'season': season.pk, 'score': len(owed) * REFERRAL_REWARD_POINTS},
+                ref_score=True)
+            credited += len(owed)
+
+        rewarded_count = len(ledger[referrer.pk]) + len(unrewarded)
+        referral_count = len(referrals[referrer.pk])
+        if (referrer.last_rewarded_referral_count, referrer.referral_count) != (rewarded_count, referral_count):
+            referrer.last_rewarded_referral_count = rewarded_count
+            referrer.referral_count = referral_count
+            fixed_referrers.append(referrer)
+
+    ReferralReward.objects.bulk_create(new_rewards)
+    User.objects.bulk_update(fixed_referrers, ['last_rewarded_referral_count', 'referral_count'])
+
+    return {'recorded': len(new_rewards), 'credited': credited, 'fixed': len(fixed_referrers)}
+
+
 def get_player_profile(address: str) -> User:
     try:
-        player = User.objects.get(address=address)
+        player = with_referral_counts(User.objects).get(address=address)
     except User.DoesNotExist:
         raise ValidationError(
             'User Does not exist'
@@ -136,6 +302,24 @@ def get_player_profile(address: str) -> User:
     return player
 
 
+async def aget_player_profile(address: str) -> User:
+    try:
+        player = await with_referral_counts(User.objects).aget(address=address)
+    except User.DoesNotExist:
+        raise ValidationError(
+            'User Does not exist'
+        )
+    return player
+
+
+def view_referral_downline(address: str, depth: int = None) -> dict:
+    return referral_downline(get_player_profile(address), max_depth=depth)
+
+
+def view_top_referrers(depth: int = None, limit: int = 10) -> list:
+    return top_referrers(max_depth=depth, limit=limit)
+
+
 def update_user_task(
         user: User,
         twitter_task: int = 0,
@@ -149,3 +333,23 @@ def update_user_task(
         'twitter_task',
         'telegram_task',
         'whitelist_task'])
+
+
+def deactivate_users(users) -> int:
+    """
+    Deactivate the users in a queryset and drop their cached snapshots, which
+    a bare update() leaves signing them in for up to USER_SNAPSHOT_TTL.
+    Returns how many were deactivated.
+    """
+    with transaction.atomic():
+        user_pks = list(users.filter(is_active=True).values_list('pk', flat=True))
+        User.objects.filter(pk__in=user_pks).update(is_active=False)
+
+        def drop_snapshots():
+            for user_pk in user_pks:
+                invalidate_user_snapshot(user_pk)
+
+        # Dropped again on commit, in case a request cached the old row
+        drop_snapshots()
+        transaction.on_commit(drop_snapshots)
+    return len(user_pks)
@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_user_snapshot
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def drop_user_snapshot(sender, instance: User, **kwargs):
+    # Dropped again on commit, in case a request cached the old row while
+    # the transaction was still open
+    invalidate_user_snapshot(instance.pk)
+    transaction.on_commit(lambda: invalidate_user_snapshot(instance.pk))
@@ -0,0 +1,178 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from django.conf import settings
+from eth_account import Account
+from eth_account.messages import defunct_hash_message
+from eth_keys.exceptions import BadSignature
+from eth_utils.exceptions import ValidationError as SignatureValidationError
+
+_pool = None
+_pool_lock = threading.Lock()
+
+_recovered_signers = OrderedDict()
+_recovered_signers_lock = threading.Lock()
+
+_stats = {
+    'verifications': 0,
+    'cache_hits': 0,
+    'recoveries': 0,
+    'invalid_signatures': 0,
+    'recovery_seconds_total': 0.0,
+    'recovery_seconds_max': 0.0,
+}
+_stats_lock = threading.Lock()
+
+
+def recover_signer(message: str, signature: str) -> Optional[str]:
+    """
+    Return the address that signed ``message``, or None if the signature
+    is malformed.
+
+    Recovery runs in a process pool, so concurrent logins use other cores
+    instead of taking turns on the GIL; the request thread still waits for
+    its own result. Recently recovered pairs are answered from an
+    in-process LRU, which makes client retries free.
+    """
+    message_hash = bytes(defunct_hash_message(text=message))
+    cache_key = (message_hash, signature.lower())
+    cached, signer = _cached_signer(cache_key)
+    if cached:
+        return signer
+
+    started = time.perf_counter()
+    if settings.SIGNATURE_RECOVERY_WORKERS > 0:
+        signer = _recover_in_pool(message_hash, signature)
+    else:
+        signer = _recover_address(message_hash, signature)
+
+    return _remember_signer(cache_key, signer, started)
+
+
+async def arecover_signer(message: str, signature: str) -> Optional[str]:
+    """
+    recover_signer for async views: the pool's future is awaited, so the
+    event loop and Django's sync thread stay free while the signature is
+    recovered.
+    """
+    message_hash = bytes(defunct_hash_message(text=message))
+    cache_key = (message_hash, signature.lower())
+    cached, signer = _cached_signer(cache_key)
+    if cached:
+        return signer
+
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    signer = None
+    recovered = False
+    if settings.SIGNATURE_RECOVERY_WORKERS > 0:
+        pool = _get_pool()
+        try:
+            signer = await asyncio.wrap_future(pool.submit(_recover_address, message_hash, signature))
+            recovered = True
+        except BrokenProcessPool:
+            _discard_pool(pool)
+    if not recovered:
+        signer = await loop.run_in_executor(None, _recover_address, message_hash, signature)
+
+    return _remember_signer(cache_key, signer, started)
+
+
+def _cached_signer(cache_key: tuple) -> tuple:
+    # (True, signer) on a hit; a cached None is a known bad signature
+    with _recovered_signers_lock:
+        if cache_key not in _recovered_signers:
+            return False, None
+        _recovered_signers.move_to_end(cache_key)
+        signer = _recovered_signers[cache_key]
+    _record_verification(cache_hit=True)
+
+    return True, signer
+
+
+def _remember_signer(cache_key: tuple, signer: Optional[str], started: float) -> Optional[str]:
+    _record_verification(
+        recovery_seconds=time.perf_counter() - started, invalid=signer is None)
+
+    with _recovered_signers_lock:
+        _recovered_signers[cache_key] = signer
+        while len(_recovered_signers) > settings.SIGNATURE_CACHE_SIZE:
+            _recovered_signers.popitem(last=False)
+
+    return signer
+
+
+def _recover_address(message_hash: bytes, signature: str) -> Optional[str]:
+    try:
+        return Account.recoverHash(message_hash, signature=signature)
+    except (BadSignature, SignatureValidationError, ValueError):
+        return None
+
+
+def _recover_in_pool(message_hash: bytes, signature: str) -> Optional[str]:
+    pool = _get_pool()
+    try:
+        return pool.submit(_recover_address, message_hash, signature).result()
+    except BrokenProcessPool:
+        # A recovery process died and the pool will not take more work:
+        # replace it for the next login and recover this one here
+        _discard_pool(pool)
+        return _recover_address(message_hash, signature)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            # Spawned rather than forked: web workers run threads and hold
+            # database connections that a fork would copy
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.SIGNATURE_RECOVERY_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'))
+
+    return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    global _pool
+
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def _record_verification(cache_hit: bool = False, recovery_seconds: float = 0.0, invalid: bool = False):
+    with _stats_lock:
+        _stats['verifications'] += 1
+        if cache_hit:
+            _stats['cache_hits'] += 1
+            return
+
+        _stats['recoveries'] += 1
+        _stats['invalid_signatures'] += invalid
+        _stats['recovery_seconds_total'] += recovery_seconds
+        _stats['recovery_seconds_max'] = max(_stats['recovery_seconds_max'], recovery_seconds)
+
+
+def get_verification_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+
+    stats['recovery_seconds_avg'] = (
+        stats['recovery_seconds_total'] / stats['recoveries'] if stats['recoveries'] else 0.0)
+    stats['cached_signatures'] = len(_recovered_signers)
+
+    return stats
+
+
+def reset_signature_cache():
+    with _recovered_signers_lock:
+        _recovered_signers.clear()
@@ -1,3 +1,516 @@
-from django.test import TestCase
+import multiprocessing
+import os
+import re
+import tempfile
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from eth_account import Account
+from eth_account.messages import encode_defunct
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from game.db.middleware import PoolTimingMiddleware
+from game.db.pool import request_pool_usage
+from game.metrics import MetricsMiddleware, instrument_connection, registry, render_metrics
+from whack_blob.models import PlayerSeasonStanding, Season
+from whack_blob.services import finalize_season, flush_pending_scores
+
+from .authentication import SnapshotJWTAuthentication, check_snapshot_cache, invalidate_user_snapshot
+from .models import ReferralCountShard, ReferralPath, ReferralReward, RevokedRefreshToken, User
+from .referral_counters import fold_all_referral_counters, with_referral_counts
+from .referral_names import (
+    BLOCK_SIZE, NAME_POOL, allocate_referral_usernames, referral_username_for, reset_referral_username_block)
+from .referral_tree import rebuild_referral_closure, referral_downline, top_referrers
+from .services import (
+    REFERRAL_REWARD_POINTS, auser_login, deactivate_users, reconcile_referral_rewards, save_referral_details,
+    update_user_task, user_login)
+from .signatures import _get_pool, arecover_signer, get_verification_stats, recover_signer, reset_signature_cache
+from .token_revocation import prune_revoked_tokens, reset_revoked_filter
+
+LOGIN_MESSAGE = 'Sign in to Whack a blob'
+
+
+def sign_login(account, message: str = LOGIN_MESSAGE) -> str:
+    return account.sign_message(encode_defunct(text=message)).signature.hex()
+
+
+class RecoverSignerTests(SimpleTestCase):
+
+    def setUp(self):
+        reset_signature_cache()
+        self.account = Account.create()
+
+    @override_settings(SIGNATURE_RECOVERY_WORKERS=1)
+    def test_signer_is_recovered_in_the_pool(self):
+        signer = recover_signer(LOGIN_MESSAGE, sign_login(self.account))
+
+        self.assertEqual(signer, self.account.address)
+
+    @override_settings(SIGNATURE_RECOVERY_WORKERS=1)
+    async def test_async_recovery_awaits_the_pool(self):
+        signer = await arecover_signer(LOGIN_MESSAGE, sign_login(self.account))
+
+        self.assertEqual(signer, self.account.address)
+
+    @override_settings(SIGNATURE_RECOVERY_WORKERS=1)
+    def test_a_broken_pool_is_replaced(self):
+        broken_pool = _get_pool()
+        with self.assertRaises(BrokenProcessPool):
+            broken_pool.submit(os._exit, 1).result()
+
+        signer = recover_signer(LOGIN_MESSAGE, sign_login(self.account))
+
+        self.assertEqual(signer, self.account.address)
+        self.assertIsNot(_get_pool(), broken_pool)
+
+    @override_settings(SIGNATURE_RECOVERY_WORKERS=0)
+    def test_retries_are_answered_from_the_cache(self):
+        signature = sign_login(self.account)
+        recover_signer(LOGIN_MESSAGE, signature)
+        stats_before = get_verification_stats()
+
+        signer = recover_signer(LOGIN_MESSAGE, signature.upper().replace('0X', '0x'))
+
+        stats_after = get_verification_stats()
+        self.assertEqual(signer, self.account.address)
+        self.assertEqual(stats_after['cache_hits'], stats_before['cache_hits'] + 1)
+        self.assertEqual(stats_after['recoveries'], stats_before['recoveries'])
+
+    @override_settings(SIGNATURE_RECOVERY_WORKERS=0, SIGNATURE_CACHE_SIZE=1)
+    def test_cache_is_bounded(self):
+        recover_signer(LOGIN_MESSAGE, sign_login(self.account))
+        recover_signer('another message', sign_login(self.account, 'another message'))
+
+        self.assertEqual(get_verification_stats()['cached_signatures'], 1)
+
+    @override_settings(SIGNATURE_RECOVERY_WORKERS=0)
+    def test_malformed_signature_recovers_nothing(self):
+        self.assertIsNone(recover_signer(LOGIN_MESSAGE, '0x1234'))
+
+
+@override_settings(SIGNATURE_RECOVERY_WORKERS=0)
+class UserLoginQueryTests(TestCase):
+
+    def setUp(self):
+        reset_signature_cache()
+        reset_referral_username_block()
+        allocate_referral_usernames(1)
+        self.account = Account.create()
+        self.login_kwargs = {
+            'address': self.account.address,
+            'signature': sign_login(self.account),
+            'message': LOGIN_MESSAGE,
+        }
+
+    def test_new_user_login(self):
+        # The lookup, then the insert in its savepoint pair
+        with self.assertNumQueries(4):
+            tokens = user_login(**self.login_kwargs)
+
+        user = User.objects.get(address=self.account.address)
+        self.assertTrue(user.is_active)
+        self.assertTrue(user.referral_username.startswith('redfox-'))
+        self.assertEqual(set(tokens), {'access_token', 'refresh_token'})
+
+    def test_returning_user_login(self):
+        user_login(**self.login_kwargs)
+
+        with self.assertNumQueries(1):
+            user_login(**self.login_kwargs)
+
+        self.assertEqual(User.objects.filter(address=self.account.address).count(), 1)
+
+    def test_wrong_signer_is_rejected_without_queries(self):
+        self.login_kwargs['signature'] = sign_login(Account.create())
+
+        with self.assertNumQueries(0), self.assertRaises(ValidationError):
+            user_login(**self.login_kwargs)
+
+    async def test_async_login_creates_and_finds_the_user(self):
+        tokens = await auser_login(**self.login_kwargs)
+        await auser_login(**self.login_kwargs)
+
+        self.assertEqual(set(tokens), {'access_token', 'refresh_token'})
+        self.assertEqual(await User.objects.filter(address=self.account.address).acount(), 1)
+
+        self.login_kwargs['signature'] = sign_login(Account.create())
+        with self.assertRaises(ValidationError):
+            await auser_login(**self.login_kwargs)
+
+
+class ReferralUsernameAllocatorTests(TestCase):
+
+    def setUp(self):
+        reset_referral_username_block()
+
+    def test_names_are_unique_across_pool_rounds(self):
+        usernames = allocate_referral_usernames(len(NAME_POOL) * 2 + 7)
+
+        self.assertEqual(len(set(usernames)), len(usernames))
+        self.assertTrue(all(username[-1].isdigit() for username in usernames))
+
+    def test_bulk_allocation_reserves_one_block(self):
+        with self.assertNumQueries(4):
+            usernames = allocate_referral_usernames(500)
+
+        self.assertEqual(usernames[0], referral_username_for(0))
+        self.assertEqual(usernames[-1], referral_username_for(499))
+
+    def test_allocations_share_a_reserved_block(self):
+        allocate_referral_usernames(1)
+
+        with self.assertNumQueries(0):
+            allocate_referral_usernames(BLOCK_SIZE - 1)
+
+
+class ReferralRewardTests(TestCase):
+
+    def setUp(self):
+        self.season = Season.objects.create(season='season one')
+        self.referrer = User.objects.create(address='0xreferrer', referral_username='redfox-Referrer1')
+        self.referral = User.objects.create(address='0xreferral', referral_username='redfox-Referral1')
+
+    def standing_score(self, user):
+        return PlayerSeasonStanding.objects.get(season=self.season, player=user).score
+
+    def test_referrer_is_credited_once_when_the_referral_is_saved(self):
+        save_referral_details(self.referral.address, self.referrer.referral_username)
+        save_referral_details(self.referral.address, self.referrer.referral_username)
+
+        referrer = with_referral_counts(User.objects).get(pk=self.referrer.pk)
+        self.referral.refresh_from_db()
+        self.assertEqual(self.referral.referrer, self.referrer)
+        self.assertEqual(referrer.total_referral_count, 1)
+        self.assertEqual(referrer.total_rewarded_referral_count, 1)
+        self.assertEqual(self.standing_score(self.referrer), REFERRAL_REWARD_POINTS)
+
+    @override_settings(SCORE_WRITE_BEHIND=True)
+    def test_rewards_are_staged_with_write_behind(self):
+        save_referral_details(self.referral.address, self.referrer.referral_username)
+
+        # The signup never touched the referrer's standing row
+        self.assertFalse(PlayerSeasonStanding.objects.filter(player=self.referrer).exists())
+        self.assertEqual(flush_pending_scores(), 1)
+        self.assertEqual(self.standing_score(self.referrer), REFERRAL_REWARD_POINTS)
+
+    def test_moving_a_referral_moves_its_count(self):
+        other_referrer = User.objects.create(address='0xother', referral_username='redfox-Other1')
+        save_referral_details(self.referral.address, self.referrer.referral_username)
+        save_referral_details(self.referral.address, other_referrer.referral_username)
+
+        counts = dict(
+            (address, (total, rewarded)) for address, total, rewarded in with_referral_counts(
+                User.objects.filter(pk__in=[self.referrer.pk, other_referrer.pk])).values_list(
+                    'address', 'total_referral_count', 'total_rewarded_referral_count'))
+        # The reward stays with the referrer that was paid it
+        self.assertEqual(counts, {'0xreferrer': (0, 1), '0xother': (1, 0)})
+
+    def test_referrals_are_saved_without_points_while_the_reward_season_is_finalized(self):
+        finalize_season(self.season.pk)
+        save_referral_details(self.referral.address, self.referrer.referral_username)
+
+        self.referral.refresh_from_db()
+        self.assertEqual(self.referral.referrer, self.referrer)
+        self.assertEqual(ReferralReward.objects.get(referral=self.referral).points, 0)
+        self.assertFalse(PlayerSeasonStanding.objects.filter(player=self.referrer).exists())
+
+        # The newest open season takes the rewards once there is one
+        next_season = Season.objects.create(season='season two')
+        referral = User.objects.create(address='0xlatecomer', referral_username='redfox-Latecomer1')
+        save_referral_details(referral.address, self.referrer.referral_username)
+
+        self.assertEqual(
+            PlayerSeasonStanding.objects.get(season=next_season, player=self.referrer).score,
+            REFERRAL_REWARD_POINTS)
+
+    @override_settings(REFERRAL_COUNT_SHARDS=4)
+    def test_sharded_counts_are_folded_into_the_user(self):
+        for index in range(20):
+            referral = User.objects.create(
+                address=f'0xfan{index}', referral_username=f'redfox-Fan{index}')
+            save_referral_details(referral.address, self.referrer.referral_username)
+
+        shard_rows = self.referrer.referral_count_shards.count()
+        self.assertLessEqual(shard_rows, 4)
+        self.assertEqual(fold_all_referral_counters(batch_size=3), shard_rows)
+
+        self.referrer.refresh_from_db()
+        self.assertEqual(self.referrer.referral_count, 20)
+        self.assertEqual(self.referrer.last_rewarded_referral_count, 20)
+        self.assertFalse(ReferralCountShard.objects.exists())
+
+    def test_reconciliation_settles_legacy_referrals(self):
+        legacy_referrals = [
+            User(address=f'0xlegacy{index}', referral_username=f'redfox-Legacy{index}',
+                 referrer_username=self.referrer.referral_username)
+            for index in range(3)]
+        User.objects.bulk_create(legacy_referrals)
+        User.objects.filter(pk=self.referrer.pk).update(referral_count=5, last_rewarded_referral_count=1)
+
+        totals = reconcile_referral_rewards(batch_size=2)
+
+        self.referrer.refresh_from_db()
+        self.assertEqual(totals, {'linked': 3, 'recorded': 3, 'credited': 2, 'fixed': 1})
+        self.assertEqual(self.referrer.referrals.count(), 3)
+        self.assertEqual(self.referrer.referral_count, 3)
+        self.assertEqual(self.referrer.last_rewarded_referral_count, 3)
+        self.assertEqual(self.standing_score(self.referrer), 2 * REFERRAL_REWARD_POINTS)
+        self.assertEqual(reconcile_referral_rewards()['credited'], 0)
+
+
+class ReferralTreeTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        Season.objects.create(season='season one')
+        self.users = {
+            name: User.objects.create(address=f'0x{name}', referral_username=f'redfox-{name}1')
+            for name in ('alpha', 'bravo', 'charlie', 'delta', 'echo')}
+
+    def refer(self, referral, referrer):
+        save_referral_details(self.users[referral].address, self.users[referrer].referral_username)
+
+    def paths(self):
+        return set(ReferralPath.objects.values_list('ancestor__address', 'descendant__address', 'depth'))
+
+    def test_downline_is_counted_per_level(self):
+        self.refer('bravo', 'alpha')
+        self.refer('charlie', 'bravo')
+        self.refer('delta', 'bravo')
+
+        with self.assertNumQueries(1):
+            downline = referral_downline(self.users['alpha'])
+
+        self.assertEqual(downline['total'], 3)
+        self.assertEqual(downline['levels'], [{'depth': 1, 'referrals': 1}, {'depth': 2, 'referrals': 2}])
+        self.assertEqual(referral_downline(self.users['alpha'], max_depth=1)['total'], 1)
+        self.assertEqual(top_referrers(limit=1)[0]['ancestor__address'], '0xalpha')
+
+    def test_top_referrers_are_cached(self):
+        self.refer('bravo', 'alpha')
+        self.assertEqual(top_referrers()[0]['downline'], 1)
+
+        self.refer('charlie', 'alpha')
+        with self.assertNumQueries(0):
+            self.assertEqual(top_referrers()[0]['downline'], 1)
+        self.assertEqual(top_referrers(max_depth=1)[0]['downline'], 2)
+
+        with override_settings(TOP_REFERRERS_CACHE_TIMEOUT=0):
+            cache.clear()
+            self.assertEqual(top_referrers()[0]['downline'], 2)
+            self.refer('delta', 'alpha')
+            self.assertEqual(top_referrers()[0]['downline'], 3)
+
+    def test_moving_a_referral_moves_its_subtree(self):
+        self.refer('bravo', 'alpha')
+        self.refer('charlie', 'bravo')
+        self.refer('bravo', 'delta')
+
+        self.assertEqual(self.paths(), {
+            ('0xdelta', '0xbravo', 1), ('0xdelta', '0xcharlie', 2), ('0xbravo', '0xcharlie', 1)})
+        self.assertEqual(referral_downline(self.users['alpha'])['total'], 0)
+
+    def test_referral_loops_are_rejected(self):
+        self.refer('bravo', 'alpha')
+        self.refer('charlie', 'bravo')
+
+        with self.assertRaises(ValidationError):
+            self.refer('alpha', 'charlie')
+        with self.assertRaises(ValidationError):
+            self.refer('echo', 'echo')
+
+    def test_rebuild_matches_incremental_maintenance(self):
+        self.refer('bravo', 'alpha')
+        self.refer('charlie', 'bravo')
+        self.refer('delta', 'charlie')
+        self.refer('echo', 'alpha')
+        incremental_paths = self.paths()
+
+        self.assertEqual(rebuild_referral_closure(), len(incremental_paths))
+        self.assertEqual(self.paths(), incremental_paths)
+
+
+@override_settings(USER_SNAPSHOT_TTL=60)
+class SnapshotJWTAuthenticationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(
+            address='0xsnapshot', referral_username='redfox-Snapshot1', is_active=True)
+        access_token = RefreshToken.for_user(self.user).access_token
+        self.request = RequestFactory().post('/', HTTP_AUTHORIZATION=f'Bearer {access_token}')
+        self.authentication = SnapshotJWTAuthentication()
+
+    def test_cached_snapshot_skips_the_user_query(self):
+        self.authentication.authenticate(self.request)
+
+        with self.assertNumQueries(0):
+            user, _ = self.authentication.authenticate(self.request)
+
+        self.assertEqual(user, self.user)
+        self.assertEqual(user.created_at, self.user.created_at)
+
+    def test_saving_the_user_drops_the_snapshot(self):
+        self.authentication.authenticate(self.request)
+        update_user_task(self.user, twitter_task=1)
+
+        user, _ = self.authentication.authenticate(self.request)
+        self.assertEqual(user.twitter_task, 1)
+
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate(self.request)
+
+    def test_deactivating_users_drops_their_snapshots(self):
+        self.authentication.authenticate(self.request)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(deactivate_users(User.objects.filter(pk=self.user.pk)), 1)
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate(self.request)
+
+    def test_saving_the_user_in_another_process_drops_the_snapshot(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}):
+            check_snapshot_cache()
+            self.authentication.authenticate(self.request)
+
+            # Another worker deactivates the user: the row changes and its
+            # post_save drops the snapshot in that worker's cache
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+            worker = multiprocessing.get_context('fork').Process(
+                target=invalidate_user_snapshot, args=(self.user.pk,))
+            worker.start()
+            worker.join()
+
+            self.assertEqual(worker.exitcode, 0)
+            with self.assertRaises(AuthenticationFailed):
+                self.authentication.authenticate(self.request)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_snapshots_are_refused_a_per_process_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            check_snapshot_cache()
+
+        with override_settings(USER_SNAPSHOT_TTL=0):
+            check_snapshot_cache()
+            self.authentication.authenticate(self.request)
+            with self.assertNumQueries(1):
+                self.authentication.authenticate(self.request)
+
+
+class TokenRefreshTests(TestCase):
+
+    def setUp(self):
+        reset_revoked_filter()
+        self.user = User.objects.create(
+            address='0xrefresher', referral_username='redfox-Refresher1', is_active=True)
+        self.refresh = str(RefreshToken.for_user(self.user))
+
+    def test_refresh_tokens_can_only_be_used_once(self):
+        response = self.client.post('/users/login/refresh/', {'refresh': self.refresh})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.json()['refresh'], self.refresh)
+
+        response = self.client.post('/users/login/refresh/', {'refresh': self.refresh})
+        self.assertEqual(response.status_code, 401)
+
+        self.assertEqual(RevokedRefreshToken.objects.count(), 1)
+
+    @override_settings(REVOKED_TOKEN_SYNC_INTERVAL=60)
+    def test_unrevoked_tokens_are_cleared_by_the_filter(self):
+        self.client.post('/users/login/refresh/', {'refresh': str(RefreshToken.for_user(self.user))})
+
+        # Only the revoking insert and its savepoint: the synced filter
+        # answers the check
+        with self.assertNumQueries(3):
+            response = self.client.post('/users/login/refresh/', {'refresh': self.refresh})
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_prune_drops_expired_day_buckets(self):
+        today = timezone.now().date()
+        RevokedRefreshToken.objects.create(jti='0' * 32, expires_on=today - timedelta(days=1))
+        RevokedRefreshToken.objects.create(jti='1' * 32, expires_on=today)
+
+        self.assertEqual(prune_revoked_tokens(), 1)
+        self.assertEqual(list(RevokedRefreshToken.objects.values_list('expires_on', flat=True)), [today])
+
+
+class PoolTimingMiddlewareTests(SimpleTestCase):
+
+    async def test_async_requests_report_their_checkouts(self):
+        def check_out():
+            usage = request_pool_usage.get()
+            usage['checkouts'] += 1
+            usage['wait_seconds'] += 0.002
+
+        async def get_response(request):
+            await sync_to_async(check_out)()
+            return HttpResponse()
+
+        middleware = PoolTimingMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        response = await middleware(RequestFactory().get('/'))
+        self.assertEqual(response['Server-Timing'], 'db-pool;dur=2.00;desc="1 checkouts"')
+
+
+@override_settings(METRICS_TOKEN='scrape-me')
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        registry.reset()
+        self.user = User.objects.create(
+            address='0xmeasured', referral_username='redfox-Measured1', is_active=True)
+        self.access_token = str(RefreshToken.for_user(self.user).access_token)
+
+    def test_requests_are_reported_by_url_name(self):
+        self.client.post(
+            '/users/view-profile', {'address': self.user.address},
+            HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-me')
+        self.assertEqual(response.status_code, 200)
+        metrics = response.content.decode()
+
+        labels = 'view="users:view-profile",method="POST"'
+        self.assertIn(f'http_responses_total{{{labels},pid=', metrics)
+        self.assertRegex(metrics, rf'http_request_db_queries_count{{{labels},pid="\d+"}} 1\n')
+        serializer_seconds = re.search(
+            rf'http_request_serializer_seconds_total{{{labels},pid="\d+"}} (\S+)', metrics).group(1)
+        self.assertGreater(float(serializer_seconds), 0)
+
+    def test_scrapes_need_the_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+
+    def test_metrics_without_a_token_are_only_served_in_debug(self):
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            with override_settings(DEBUG=True):
+                self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    async def test_async_requests_are_measured(self):
+        async def get_response(request):
+            await sync_to_async(User.objects.filter(pk=self.user.pk).exists)()
+            return HttpResponse()
+
+        # Queries run on the thread sync_to_async hands them to, which
+        # connected before the middleware was created
+        await sync_to_async(instrument_connection)(connection)
+        middleware = MetricsMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        await middleware(RequestFactory().get('/'))
+
+        metrics = render_metrics()
+        self.assertRegex(metrics, r'http_request_db_queries_count{view="unmatched",method="GET",pid="\d+"} 1\n')
+        self.assertRegex(metrics, r'http_request_db_queries_sum{view="unmatched",method="GET",pid="\d+"} 1\.0\n')
@@ -0,0 +1,136 @@
+import threading
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from helpers.bloom import BloomFilter
+
+from .models import RevokedRefreshToken
+
+SYNC_BATCH_SIZE = 5000
+
+_filter = {'bloom': None, 'last_pk': 0, 'synced_at': 0.0}
+_filter_lock = threading.Lock()
+
+
+def _parse_jti(jti) -> uuid.UUID:
+    try:
+        return uuid.UUID(str(jti))
+    except ValueError:
+        raise TokenError('Token has an invalid id')
+
+
+def _revoked_filter() -> BloomFilter:
+    """
+    Return this process's Bloom filter of revoked JTIs, first adding the
+    rows revoked since the last sync by any process. Syncs happen at most
+    every REVOKED_TOKEN_SYNC_INTERVAL seconds and read only rows past the
+    last primary key seen, so between syncs lookups need no database.
+    """
+    with _filter_lock:
+        now = time.monotonic()
+        bloom = _filter['bloom']
+        if bloom is not None and now - _filter['synced_at'] < settings.REVOKED_TOKEN_SYNC_INTERVAL:
+            return bloom
+
+        if bloom is None or bloom.is_full():
+            # Pruned JTIs stay in the filter until it fills up; it is then
+            # rebuilt from the rows still in the table
+            bloom = BloomFilter(settings.REVOKED_TOKEN_FILTER_CAPACITY)
+            _filter['last_pk'] = 0
+
+        while True:
+            rows = list(RevokedRefreshToken.objects.filter(
+                pk__gt=_filter['last_pk']).order_by('pk').values_list('pk', 'jti')[:SYNC_BATCH_SIZE])
+            for _, jti in rows:
+                bloom.add(jti.hex)
+            if rows:
+                _filter['last_pk'] = rows[-1][0]
+            if len(rows) < SYNC_BATCH_SIZE:
+                break
+
+        _filter['bloom'] = bloom
+        _filter['synced_at'] = now
+        return bloom
+
+
+def reset_revoked_filter():
+    with _filter_lock:
+        _filter.update(bloom=None, last_pk=0, synced_at=0.0)
+
+
+def is_refresh_token_revoked(jti) -> bool:
+    """
+    Check a refresh token's JTI against the revoked set. Most JTIs are
+    answered by the Bloom filter alone; only possible matches are looked
+    up. Revocations by other processes show up after the next filter sync.
+    """
+    jti = _parse_jti(jti)
+    if jti.hex not in _revoked_filter():
+        return False
+
+    return RevokedRefreshToken.objects.filter(jti=jti).exists()
+
+
+def revoke_refresh_token(jti, expires_at: int) -> bool:
+    """
+    Mark a refresh token as used, bucketed by the day it expires. Returns
+    False if it had already been revoked: the unique JTI makes the insert
+    itself the check, so a token replayed on two processes at once is
+    only accepted by one of them.
+    """
+    jti = _parse_jti(jti)
+    expires_on = datetime.fromtimestamp(expires_at, tz=dt_timezone.utc).date()
+
+    try:
+        with transaction.atomic():
+            RevokedRefreshToken.objects.create(jti=jti, expires_on=expires_on)
+    except IntegrityError:
+        return False
+
+    return True
+
+
+def rotate_refresh_token(refresh) -> dict:
+    """
+    Swap a validated refresh token for a new access token, and a new
+    refresh token when ROTATE_REFRESH_TOKENS is on. With
+    BLACKLIST_AFTER_ROTATION the old one is revoked, and raises TokenError
+    if it was already used.
+    """
+    data = {'access': str(refresh.access_token)}
+    if not api_settings.ROTATE_REFRESH_TOKENS:
+        return data
+
+    if api_settings.BLACKLIST_AFTER_ROTATION:
+        jti = refresh[api_settings.JTI_CLAIM]
+        if is_refresh_token_revoked(jti) or not revoke_refresh_token(jti, refresh['exp']):
+            raise TokenError('Token is blacklisted')
+
+    refresh.set_jti()
+    refresh.set_exp()
+    refresh.set_iat()
+    data['refresh'] = str(refresh)
+
+    return data
+
+
+def prune_revoked_tokens(batch_size: int = 1000) -> int:
+    """
+    Delete up to ``batch_size`` revoked tokens from day buckets that have
+    passed; the tokens in them have expired and would be rejected anyway.
+    Returns the number of rows deleted.
+    """
+    today = timezone.now().date()
+    expired = list(RevokedRefreshToken.objects.filter(
+        expires_on__lt=today).values_list('pk', flat=True)[:batch_size])
+    if not expired:
+        return 0
+
+    return RevokedRefreshToken.objects.filter(pk__in=expired).delete()[0]
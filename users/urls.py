@@ -1,5 +1,4 @@
 from django.urls import path
-from rest_framework_simplejwt.views import TokenRefreshView
 
 from . import apis
 
@@ -9,12 +8,16 @@ app_name = 'users'
 urlpatterns = [
     path('login', apis.LoginAPI.as_view(), name='login'),
     
-    path('login/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('login/refresh/', apis.TokenRefreshAPI.as_view(), name='token_refresh'),
 
     path('save-referral', apis.SaveReferralDetails.as_view(), name='save-referral'),
 
     path('view-profile', apis.ViewProfile.as_view(), name='view-profile'),
 
+    path('referral-downline', apis.ReferralDownlineAPI.as_view(), name='referral-downline'),
+
+    path('top-referrers', apis.TopReferrersAPI.as_view(), name='top-referrers'),
+
     path('add-task', apis.AddTaskAPI.as_view(), name='add-task'),
 
 ]
@@ -1,7 +1,11 @@
 from django.contrib import admin
 
-from .models import Season, GameScore
+from .models import Season, GameScore, PendingScore, PlayerDailyAttempts, PlayerSeasonStanding, SeasonStandingSnapshot
 
 
 admin.site.register(Season)
 admin.site.register(GameScore)
+admin.site.register(PlayerSeasonStanding)
+admin.site.register(SeasonStandingSnapshot)
+admin.site.register(PlayerDailyAttempts)
+admin.site.register(PendingScore)
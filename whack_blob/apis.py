@@ -1,11 +1,17 @@
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework.views import APIView
-from rest_framework import permissions, serializers
+from rest_framework import permissions, serializers, status
 from rest_framework.response import Response
 from drf_yasg.utils import swagger_auto_schema
 
-from .models import Season, GameScore
+from .export import CSV, EXPORT_CONTENT_TYPES, EXPORT_FORMATS, export_leaderboard
+from .leaderboard_cache import get_or_render_leaderboard
+from .models import Season, GameScore, PendingScore
+from .ranking import ORDINAL, TIE_POLICIES
 from .services import (
-    update_user_score, view_player_scoreboard, view_scoreboard, verify_health, attempts_validator, calc_lives)
+    update_user_score, view_player_scoreboard, view_scoreboard, verify_health, attempts_validator, calc_lives,
+    view_top_scoreboard, view_player_neighbours, view_scoreboard_page, update_user_scores, enqueue_user_score)
 
 
 class ScoreBoardOutputSerializer(serializers.Serializer):
@@ -15,6 +21,28 @@ class ScoreBoardOutputSerializer(serializers.Serializer):
     position = serializers.IntegerField()
 
 
+class PendingScoreOutputSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PendingScore
+        fields = '__all__'
+        ref_name = 'pending score output'
+
+
+class ScoreEntryInputSerializer(serializers.Serializer):
+    season = serializers.IntegerField()
+    score = serializers.IntegerField()
+    ref_score = serializers.BooleanField(default=False)
+    address = serializers.CharField(required=False)
+
+    class Meta:
+        ref_name = 'score entry input'
+
+
+class ScoreBoardPageOutputSerializer(serializers.Serializer):
+    results = ScoreBoardOutputSerializer(many=True)
+    next_cursor = serializers.CharField(allow_null=True)
+
+
 class CreateSeasonAPI(APIView):
     """
     Create Season API
@@ -63,12 +91,18 @@ class CreateScoreAPI(APIView):
 
     @swagger_auto_schema(
         request_body=InputSerializer,
-        responses={200: OutputSerializer}
+        responses={200: OutputSerializer, 202: PendingScoreOutputSerializer}
     )
     def post(self, request):
         input_serializer = self.InputSerializer(data=request.data)
         input_serializer.is_valid(raise_exception=True)
 
+        if settings.SCORE_WRITE_BEHIND:
+            pending_score = enqueue_user_score(
+                request.user, input_serializer.validated_data)
+            output_data = PendingScoreOutputSerializer(pending_score)
+            return Response(output_data.data, status=status.HTTP_202_ACCEPTED)
+
         user_attempts = verify_health(
             request.user, input_serializer.validated_data)
 
@@ -92,6 +126,7 @@ class ViewScoreboardAPI(APIView):
 
     class InputSerializer(serializers.Serializer):
         season = serializers.IntegerField()
+        tie_policy = serializers.ChoiceField(choices=TIE_POLICIES, default=ORDINAL)
 
         class Meta:
             ref_name = 'view scoreboard input'
@@ -104,13 +139,168 @@ class ViewScoreboardAPI(APIView):
         input_serializer = self.InputSerializer(data=request.data)
         input_serializer.is_valid(raise_exception=True)
 
-        scoreboard = view_scoreboard(input_serializer.validated_data)
+        validated_data = input_serializer.validated_data
+
+        def build_scoreboard():
+            scoreboard = view_scoreboard(validated_data)
+            return ScoreBoardOutputSerializer(scoreboard, many=True).data
+
+        content = get_or_render_leaderboard(
+            validated_data['season'], f"all:{validated_data['tie_policy']}", build_scoreboard)
+
+        return HttpResponse(content, content_type='application/json')
+
+
+class ViewTopScoreboardAPI(APIView):
+    """
+    View Top Scoreboard
+
+    Endpoint for viewing the top N players of a season
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    class InputSerializer(serializers.Serializer):
+        season = serializers.IntegerField()
+        limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+        class Meta:
+            ref_name = 'view top scoreboard input'
+
+    @swagger_auto_schema(
+        request_body=InputSerializer,
+        responses={200: ScoreBoardOutputSerializer(many=True)}
+    )
+    def post(self, request):
+        input_serializer = self.InputSerializer(data=request.data)
+        input_serializer.is_valid(raise_exception=True)
+
+        validated_data = input_serializer.validated_data
+
+        def build_scoreboard():
+            scoreboard = view_top_scoreboard(validated_data)
+            return ScoreBoardOutputSerializer(scoreboard, many=True).data
+
+        content = get_or_render_leaderboard(
+            validated_data['season'], f"top:{validated_data['limit']}", build_scoreboard)
+
+        return HttpResponse(content, content_type='application/json')
+
+
+class ViewScoreboardAroundPlayerAPI(APIView):
+    """
+    View Scoreboard Around Player
+
+    Endpoint for viewing the players ranked just above and below the player
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    class InputSerializer(serializers.Serializer):
+        season = serializers.IntegerField()
+        radius = serializers.IntegerField(min_value=0, max_value=50, default=5)
+
+        class Meta:
+            ref_name = 'view scoreboard around player input'
+
+    @swagger_auto_schema(
+        request_body=InputSerializer,
+        responses={200: ScoreBoardOutputSerializer(many=True)}
+    )
+    def post(self, request):
+        input_serializer = self.InputSerializer(data=request.data)
+        input_serializer.is_valid(raise_exception=True)
+
+        scoreboard = view_player_neighbours(
+            input_serializer.validated_data, request.user)
 
         output_serializer = ScoreBoardOutputSerializer(scoreboard, many=True)
 
         return Response(output_serializer.data)
 
 
+class ViewScoreboardPageAPI(APIView):
+    """
+    View Scoreboard Page
+
+    Endpoint for paging through a season's scoreboard with a cursor
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    class InputSerializer(serializers.Serializer):
+        season = serializers.IntegerField()
+        cursor = serializers.CharField(required=False, allow_blank=True)
+        limit = serializers.IntegerField(min_value=1, max_value=200, default=50)
+
+        class Meta:
+            ref_name = 'view scoreboard page input'
+
+    @swagger_auto_schema(
+        request_body=InputSerializer,
+        responses={200: ScoreBoardPageOutputSerializer}
+    )
+    def post(self, request):
+        input_serializer = self.InputSerializer(data=request.data)
+        input_serializer.is_valid(raise_exception=True)
+
+        validated_data = input_serializer.validated_data
+
+        def build_scoreboard_page():
+            scoreboard_page = view_scoreboard_page(validated_data)
+            return ScoreBoardPageOutputSerializer(scoreboard_page).data
+
+        # Cursors come from the client, so only first pages are cached:
+        # keying on cursors would let clients fill the cache with pages
+        # and evict the ones everyone reads
+        if validated_data.get('cursor'):
+            return Response(build_scoreboard_page())
+
+        page_key = f"page:{validated_data['limit']}"
+        content = get_or_render_leaderboard(
+            validated_data['season'], page_key, build_scoreboard_page)
+
+        return HttpResponse(content, content_type='application/json')
+
+
+class ExportScoreboardAPI(APIView):
+    """
+    Export Scoreboard
+
+    Endpoint for staff to download a season's full ranked scoreboard as
+    CSV or NDJSON. The rows are streamed as they are read; pass ``start``
+    to resume after the last rank received.
+    """
+    permission_classes = (permissions.IsAdminUser,)
+
+    class InputSerializer(serializers.Serializer):
+        season = serializers.IntegerField()
+        format = serializers.ChoiceField(choices=EXPORT_FORMATS, default=CSV)
+        tie_policy = serializers.ChoiceField(choices=TIE_POLICIES, default=ORDINAL)
+        start = serializers.IntegerField(min_value=0, default=0)
+
+        class Meta:
+            ref_name = 'export scoreboard input'
+
+    @swagger_auto_schema(
+        request_body=InputSerializer,
+        responses={200: 'CSV or NDJSON rows of position, player, score and season'}
+    )
+    def post(self, request):
+        input_serializer = self.InputSerializer(data=request.data)
+        input_serializer.is_valid(raise_exception=True)
+
+        validated_data = input_serializer.validated_data
+        export_format = validated_data['format']
+        chunks = export_leaderboard(
+            validated_data['season'], export_format, validated_data['tie_policy'], validated_data['start'],
+            header=validated_data['start'] == 0)
+
+        response = StreamingHttpResponse(
+            (text for _, text in chunks), content_type=EXPORT_CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = (
+            f"attachment; filename=\"season-{validated_data['season']}-scoreboard.{export_format}\"")
+
+        return response
+
+
 class ViewPlayerScoreboardAPI(APIView):
     """
     View Player Scoreboard
@@ -133,9 +323,8 @@ class ViewPlayerScoreboardAPI(APIView):
         input_serializer = self.InputSerializer(data=request.data)
         input_serializer.is_valid(raise_exception=True)
 
-        scoreboard = view_scoreboard(input_serializer.validated_data)
-
-        player_scoreboard = view_player_scoreboard(scoreboard, request.user)
+        player_scoreboard = view_player_scoreboard(
+            input_serializer.validated_data, request.user)
 
         output_serializer = ScoreBoardOutputSerializer(player_scoreboard)
 
@@ -205,15 +394,62 @@ class AddPointsOnlyAPI(APIView):
 
     @swagger_auto_schema(
         request_body=InputSerializer,
-        responses={200: OutputSerializer}
+        responses={200: OutputSerializer, 202: PendingScoreOutputSerializer}
     )
     def post(self, request):
         input_serializer = self.InputSerializer(data=request.data)
         input_serializer.is_valid(raise_exception=True)
 
+        if settings.SCORE_WRITE_BEHIND:
+            pending_score = enqueue_user_score(
+                request.user, input_serializer.validated_data, ref_score=True)
+            output_data = PendingScoreOutputSerializer(pending_score)
+            return Response(output_data.data, status=status.HTTP_202_ACCEPTED)
+
         game_score = update_user_score(
             request.user, input_serializer.validated_data, ref_score=True)
         
         output_data = self.OutputSerializer(game_score)
 
         return Response(output_data.data)
+
+
+class AddScoresBatchAPI(APIView):
+    """
+    Add Player Scores In Bulk
+
+    Endpoint for adding several scores in one request. Staff may credit
+    other players by address.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    class InputSerializer(serializers.Serializer):
+        scores = ScoreEntryInputSerializer(many=True, min_length=1, max_length=500)
+
+        class Meta:
+            ref_name = 'add scores input'
+
+    class OutputSerializer(serializers.Serializer):
+        player = serializers.CharField(allow_null=True)
+        season = serializers.IntegerField()
+        score = serializers.IntegerField(allow_null=True)
+        status = serializers.CharField()
+        error = serializers.CharField(allow_null=True)
+
+        class Meta:
+            ref_name = 'add scores output'
+
+    @swagger_auto_schema(
+        request_body=InputSerializer,
+        responses={200: OutputSerializer(many=True)}
+    )
+    def post(self, request):
+        input_serializer = self.InputSerializer(data=request.data)
+        input_serializer.is_valid(raise_exception=True)
+
+        results = update_user_scores(
+            request.user, input_serializer.validated_data['scores'])
+
+        output_serializer = self.OutputSerializer(results, many=True)
+
+        return Response(output_serializer.data)
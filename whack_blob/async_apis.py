@@ -0,0 +1,83 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import status
+
+from helpers.async_views import AsyncAPIView
+
+from . import apis
+from .leaderboard_cache import aget_or_render_leaderboard
+from .services import (
+    attempts_validator, aview_scoreboard, averify_health, calc_lives, enqueue_user_score, update_user_score)
+
+
+class CreateScoreAPI(AsyncAPIView):
+    """
+    Add Player Score
+
+    Async endpoint for adding or updating a player's score
+    """
+
+    async def post(self, request):
+        input_serializer = apis.CreateScoreAPI.InputSerializer(data=request.data)
+        input_serializer.is_valid(raise_exception=True)
+
+        if settings.SCORE_WRITE_BEHIND:
+            pending_score = await sync_to_async(enqueue_user_score)(
+                request.user, input_serializer.validated_data)
+            output_data = apis.PendingScoreOutputSerializer(pending_score)
+            return self.respond(output_data.data, status=status.HTTP_202_ACCEPTED)
+
+        user_attempts = await averify_health(request.user, input_serializer.validated_data)
+
+        attempts_validator(user_attempts)
+
+        game_score = await sync_to_async(update_user_score)(
+            request.user, input_serializer.validated_data)
+
+        output_data = apis.CreateScoreAPI.OutputSerializer(game_score)
+
+        return self.respond(output_data.data)
+
+
+class ViewScoreboardAPI(AsyncAPIView):
+    """
+    View Scoreboard
+
+    Async endpoint for viewing overall scoreboard
+    """
+
+    async def post(self, request):
+        input_serializer = apis.ViewScoreboardAPI.InputSerializer(data=request.data)
+        input_serializer.is_valid(raise_exception=True)
+
+        validated_data = input_serializer.validated_data
+
+        async def build_scoreboard():
+            scoreboard = await aview_scoreboard(validated_data)
+            return apis.ScoreBoardOutputSerializer(scoreboard, many=True).data
+
+        content = await aget_or_render_leaderboard(
+            validated_data['season'], f"all:{validated_data['tie_policy']}", build_scoreboard)
+
+        return HttpResponse(content, content_type='application/json')
+
+
+class ViewPlayerLives(AsyncAPIView):
+    """
+    View player lives
+
+    Async endpoint for checking a player's number of attempts
+    """
+
+    async def post(self, request):
+        input_serializer = apis.ViewPlayerLives.InputSerializer(data=request.data)
+        input_serializer.is_valid(raise_exception=True)
+
+        attempts = await averify_health(request.user, input_serializer.validated_data)
+
+        player_health = calc_lives(attempts)
+
+        output_data = apis.ViewPlayerLives.OutputSerializer(player_health)
+
+        return self.respond(output_data.data)
@@ -0,0 +1,15 @@
+from django.urls import path
+
+from . import async_apis
+from .urls import app_name, urlpatterns as sync_urlpatterns
+
+async_urlpatterns = [
+    path('add-score', async_apis.CreateScoreAPI.as_view(), name='add-score'),
+    path('scoreboard', async_apis.ViewScoreboardAPI.as_view(), name='scoreboard'),
+    path('player-lives', async_apis.ViewPlayerLives.as_view(), name='player-lives'),
+]
+
+async_names = {pattern.name for pattern in async_urlpatterns}
+
+urlpatterns = async_urlpatterns + [
+    pattern for pattern in sync_urlpatterns if pattern.name not in async_names]
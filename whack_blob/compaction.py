@@ -0,0 +1,106 @@
+from datetime import timedelta
+from typing import Optional
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import GameScore
+
+# Rough on-disk size of one game score row and its index entries, used when
+# the database cannot report table statistics
+DEFAULT_ROW_BYTES = 120
+
+# The order old history is walked in: each day's rows end with its summary
+HISTORY_ORDER = ('player_id', 'season_id', 'created_at', 'pk')
+
+
+def compact_game_scores(older_than_days: int = 7, chunk_size: int = 1000, dry_run: bool = False) -> dict:
+    """
+    Roll game score history older than ``older_than_days`` into one row per
+    player, season and UTC day.
+
+    Rows hold cumulative scores, so the latest row of each day, by
+    created_at and then pk, is that day's summary, and the latest row of
+    every player is always kept. Old history is walked ``chunk_size`` rows
+    at a time, each chunk deleted in its own short transaction.
+    """
+    today_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    cutoff = today_start - timedelta(days=older_than_days)
+    row_bytes = estimate_game_score_row_bytes()
+
+    compacted_rows = 0
+    last_row = None
+    while True:
+        chunk_rows, last_row = _compact_chunk(cutoff, last_row, chunk_size, dry_run)
+        compacted_rows += chunk_rows
+        if last_row is None:
+            break
+
+    return {
+        'rows': compacted_rows,
+        'bytes': compacted_rows * row_bytes,
+        'cutoff': cutoff,
+    }
+
+
+def _compact_chunk(cutoff, after: Optional[tuple], chunk_size: int, dry_run: bool) -> tuple:
+    """
+    Compact the ``chunk_size`` rows of old history following ``after``.
+    Returns how many rows were rolled up and where the next chunk starts,
+    or None after the last chunk.
+    """
+    old_history = GameScore.objects.filter(created_at__lt=cutoff)
+    if after is not None:
+        old_history = old_history.filter(_follows(after))
+
+    with transaction.atomic():
+        # The row after the chunk shows whether the chunk's last row ends its day
+        rows = list(old_history.order_by(*HISTORY_ORDER).values_list(*HISTORY_ORDER)[:chunk_size + 1])
+        chunk = rows[:chunk_size]
+        rolled_up_pks = [
+            row[-1] for row, next_row in zip(chunk, rows[1:]) if _day_key(row) == _day_key(next_row)]
+
+        if rolled_up_pks and not dry_run:
+            GameScore.objects.filter(pk__in=rolled_up_pks).delete()
+
+    return len(rolled_up_pks), chunk[-1] if len(rows) > chunk_size else None
+
+
+def _follows(row: tuple) -> Q:
+    player_id, season_id, created_at, pk = row
+    return (
+        Q(player_id__gt=player_id)
+        | Q(player_id=player_id, season_id__gt=season_id)
+        | Q(player_id=player_id, season_id=season_id, created_at__gt=created_at)
+        | Q(player_id=player_id, season_id=season_id, created_at=created_at, pk__gt=pk))
+
+
+def _day_key(row: tuple) -> tuple:
+    # created_at is read back in UTC
+    player_id, season_id, created_at, _ = row
+    return player_id, season_id, created_at.date()
+
+
+def estimate_game_score_row_bytes() -> int:
+    table_name = GameScore._meta.db_table
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT pg_total_relation_size(oid) / GREATEST(reltuples, 1) '
+                'FROM pg_class WHERE oid = %s::regclass', [table_name])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT (data_length + index_length) / GREATEST(table_rows, 1) '
+                'FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = %s', [table_name])
+        else:
+            return DEFAULT_ROW_BYTES
+
+        row = cursor.fetchone()
+
+    if not row or not row[0]:
+        return DEFAULT_ROW_BYTES
+
+    return int(row[0])
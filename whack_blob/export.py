@@ -0,0 +1,145 @@
+import csv
+import io
+import json
+
+from django.db.models import Q
+
+from .models import PlayerSeasonStanding, SeasonStandingSnapshot
+from .ranking import COMPETITION, DENSE, ORDINAL
+from .services import get_season
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+
+EXPORT_FORMATS = (CSV, NDJSON)
+EXPORT_CONTENT_TYPES = {
+    CSV: 'text/csv; charset=utf-8',
+    NDJSON: 'application/x-ndjson; charset=utf-8',
+}
+EXPORT_FIELDS = ('position', 'player', 'score', 'season')
+
+# Standings read per query; memory use depends on this, not on the
+# number of players
+EXPORT_CHUNK_SIZE = 5000
+
+
+def _position_of(ranked_rows, tie_policy: str, score: int) -> int:
+    # Competition or dense position of a score, for the first row of a
+    # resumed export
+    better = ranked_rows.filter(score__gt=score)
+    if tie_policy == COMPETITION:
+        return better.count() + 1
+    return better.values('score').distinct().count() + 1
+
+
+def _standing_rows(standings, start: int, chunk_size: int):
+    # Keyset chunks of (score, address) on the standings index; resuming
+    # finds its place with one OFFSET lookup
+    last_score = last_player_pk = None
+    if start:
+        boundary = list(standings.values_list('score', 'player_id')[start - 1:start])
+        if not boundary:
+            return
+        last_score, last_player_pk = boundary[0]
+
+    while True:
+        chunk = standings
+        if last_player_pk is not None:
+            chunk = chunk.filter(score__lte=last_score).exclude(
+                Q(score=last_score) & Q(player_id__lte=last_player_pk))
+        rows = list(chunk.values_list('score', 'player_id', 'player__address')[:chunk_size])
+        if not rows:
+            return
+
+        yield [(score, address) for score, _, address in rows]
+        if len(rows) < chunk_size:
+            return
+        last_score, last_player_pk, _ = rows[-1]
+
+
+def _snapshot_rows(snapshot, start: int, chunk_size: int):
+    # A finalized season's snapshot is keyed by rank already
+    last_rank = start
+    while True:
+        rows = list(snapshot.filter(rank__gt=last_rank).values_list('score', 'address')[:chunk_size])
+        if not rows:
+            return
+
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        last_rank += len(rows)
+
+
+def ranked_standing_chunks(season_pk: int, tie_policy: str = ORDINAL, start: int = 0,
+                           chunk_size: int = EXPORT_CHUNK_SIZE, finalized: bool = False):
+    """
+    Yield a season's standings best first as lists of (rank, position,
+    address, score), where rank counts players from 1 whatever the tie
+    policy. Each chunk is one keyset query, on the standings index or on
+    a finalized season's snapshot, so every query costs the same however
+    deep into the leaderboard it is.
+
+    ``start`` skips the first ``start`` players, so an export that stopped
+    after rank N resumes with start=N. Ranks only stay put while the
+    scores do, so resume an export of a season that has ended.
+    """
+    if finalized:
+        ranked_rows = SeasonStandingSnapshot.objects.filter(season__pk=season_pk).order_by('rank')
+        chunks = _snapshot_rows(ranked_rows, start, chunk_size)
+    else:
+        ranked_rows = PlayerSeasonStanding.objects.filter(season__pk=season_pk).order_by('-score', 'player_id')
+        chunks = _standing_rows(ranked_rows, start, chunk_size)
+
+    rank = start
+    position = 0
+    last_score = None
+    for rows in chunks:
+        ranked = []
+        for score, address in rows:
+            rank += 1
+            if tie_policy == ORDINAL:
+                position = rank
+            elif last_score is None and start:
+                position = _position_of(ranked_rows, tie_policy, score)
+            elif score != last_score:
+                position = position + 1 if tie_policy == DENSE else rank
+            last_score = score
+            ranked.append((rank, position, address, score))
+
+        yield ranked
+
+
+def _render_csv(rows: list, season_name: str) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows((position, address, score, season_name) for _, position, address, score in rows)
+    return buffer.getvalue()
+
+
+def _render_ndjson(rows: list, season_name: str) -> str:
+    return ''.join(
+        json.dumps(dict(zip(EXPORT_FIELDS, (position, address, score, season_name)))) + '\n'
+        for _, position, address, score in rows)
+
+
+def export_leaderboard(season_pk: int, export_format: str = CSV, tie_policy: str = ORDINAL, start: int = 0,
+                       header: bool = True, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    Render a season's ranked standings as CSV or NDJSON, one chunk of
+    text per query. Yields (rank, text) pairs, rank being the last one in
+    the text, so callers can report how far they got.
+
+    The season is looked up before the first chunk, so a missing season
+    raises ValidationError right away rather than mid-stream.
+    """
+    season = get_season(season_pk)
+    finalized = season.finalized_at is not None
+    render = _render_csv if export_format == CSV else _render_ndjson
+
+    def chunks():
+        if export_format == CSV and header:
+            yield start, ','.join(EXPORT_FIELDS) + '\r\n'
+        for rows in ranked_standing_chunks(season_pk, tie_policy, start, chunk_size, finalized):
+            yield rows[-1][0], render(rows, season.season)
+
+    return chunks()
@@ -0,0 +1,91 @@
+import time
+from typing import Callable
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+
+
+def _page_cache_key(season_pk: int, page_key: str) -> str:
+    return f'leaderboard:{season_pk}:page:{page_key}'
+
+
+def _written_at_cache_key(season_pk: int) -> str:
+    return f'leaderboard:{season_pk}:written-at'
+
+
+def _rebuild_lock_cache_key(season_pk: int, page_key: str) -> str:
+    return f'leaderboard:{season_pk}:rebuilding:{page_key}'
+
+
+def get_or_render_leaderboard(season_pk: int, page_key: str, build_data: Callable) -> bytes:
+    """
+    Return the rendered JSON for one season page, rebuilding it only when
+    a score was written after it was rendered.
+
+    A page rendered less than LEADERBOARD_CACHE_COALESCE_WINDOW seconds ago
+    is served even if writes arrived since, and only one worker rebuilds a
+    stale page while the others keep serving the previous bytes, so a burst
+    of writes costs a single rebuild.
+
+    Invalidation goes through the cache, so it only reaches other workers
+    when CACHE_BACKEND is shared between them. ``page_key`` must come from
+    a bounded set: every distinct key is another cached page.
+    """
+    page_cache_key = _page_cache_key(season_pk, page_key)
+    written_at_cache_key = _written_at_cache_key(season_pk)
+    cached = cache.get_many([page_cache_key, written_at_cache_key])
+    cached_page = cached.get(page_cache_key)
+    now = time.time()
+
+    content = _servable_content(cached_page, cached.get(written_at_cache_key, 0), now)
+    if content is not None:
+        return content
+    if cached_page is not None and not cache.add(
+            _rebuild_lock_cache_key(season_pk, page_key), now, settings.LEADERBOARD_CACHE_COALESCE_WINDOW):
+        return cached_page[1]
+
+    content = JSONRenderer().render(build_data())
+    cache.set(page_cache_key, (now, content), settings.LEADERBOARD_CACHE_TIMEOUT)
+
+    return content
+
+
+async def aget_or_render_leaderboard(season_pk: int, page_key: str, build_data: Callable) -> bytes:
+    """
+    get_or_render_leaderboard for async views; ``build_data`` is a
+    coroutine function.
+    """
+    page_cache_key = _page_cache_key(season_pk, page_key)
+    written_at_cache_key = _written_at_cache_key(season_pk)
+    cached = await cache.aget_many([page_cache_key, written_at_cache_key])
+    cached_page = cached.get(page_cache_key)
+    now = time.time()
+
+    content = _servable_content(cached_page, cached.get(written_at_cache_key, 0), now)
+    if content is not None:
+        return content
+    if cached_page is not None and not await cache.aadd(
+            _rebuild_lock_cache_key(season_pk, page_key), now, settings.LEADERBOARD_CACHE_COALESCE_WINDOW):
+        return cached_page[1]
+
+    content = JSONRenderer().render(await build_data())
+    await cache.aset(page_cache_key, (now, content), settings.LEADERBOARD_CACHE_TIMEOUT)
+
+    return content
+
+
+def _servable_content(cached_page, written_at: float, now: float):
+    # The cached bytes if they need no rebuild: nothing was written since
+    # they were rendered, or they are inside the coalesce window
+    if cached_page is None:
+        return None
+    rendered_at, content = cached_page
+    if rendered_at >= written_at or now - rendered_at < settings.LEADERBOARD_CACHE_COALESCE_WINDOW:
+        return content
+
+    return None
+
+
+def invalidate_leaderboard(season_pk: int):
+    cache.set(_written_at_cache_key(season_pk), time.time(), settings.LEADERBOARD_CACHE_TIMEOUT)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from whack_blob.services import backfill_player_standings
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-season standings table from existing game score history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--season', type=int, help='Only backfill this season')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        backfilled = backfill_player_standings(
+            season_pk=options['season'], batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Backfilled {backfilled} player standings'))
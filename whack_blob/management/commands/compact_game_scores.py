@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from whack_blob.compaction import compact_game_scores
+
+
+class Command(BaseCommand):
+    help = 'Roll old game score history into one row per player, season and day'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=7)
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows per transaction')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        result = compact_game_scores(
+            older_than_days=options['older_than_days'],
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'])
+
+        action = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(
+            f"{action} {result['rows']} game score rows created before {result['cutoff']:%Y-%m-%d} "
+            f"(~{result['bytes']} bytes)"))
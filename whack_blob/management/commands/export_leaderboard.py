@@ -0,0 +1,52 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from whack_blob.export import CSV, EXPORT_CHUNK_SIZE, EXPORT_FORMATS, export_leaderboard
+from whack_blob.ranking import ORDINAL, TIE_POLICIES
+
+
+class Command(BaseCommand):
+    help = "Stream a season's ranked standings to a CSV or NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--season', type=int, required=True)
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default=CSV)
+        parser.add_argument('--tie-policy', choices=TIE_POLICIES, default=ORDINAL)
+        parser.add_argument('--output', help='File to write; defaults to standard output')
+        parser.add_argument(
+            '--start', type=int, default=0,
+            help='Skip this many players, to resume an export that stopped after that rank. '
+                 'The output file is appended to')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        start = options['start']
+        if start < 0:
+            raise CommandError('--start cannot be negative')
+
+        try:
+            chunks = export_leaderboard(
+                options['season'], options['format'], options['tie_policy'], start,
+                header=start == 0, chunk_size=options['chunk_size'])
+        except ValidationError as error:
+            raise CommandError(error.detail[0])
+
+        # Progress goes to stderr when the rows go to stdout
+        output_path = options['output']
+        log = self.stdout if output_path else self.stderr
+        output = open(output_path, 'a' if start else 'w', newline='') if output_path else sys.stdout
+
+        rank = start
+        try:
+            for rank, text in chunks:
+                output.write(text)
+                output.flush()
+                if rank > start:
+                    log.write(f'Exported through rank {rank}', style_func=self.style.NOTICE)
+        finally:
+            if output_path:
+                output.close()
+
+        log.write(f'Exported {rank - start} players', style_func=self.style.SUCCESS)
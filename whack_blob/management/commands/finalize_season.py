@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from whack_blob.services import finalize_season
+
+
+class Command(BaseCommand):
+    help = "Snapshot a finished season's final ranking and close it to new scores"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--season', type=int, required=True)
+
+    def handle(self, *args, **options):
+        try:
+            ranked = finalize_season(options['season'])
+        except ValidationError as e:
+            raise CommandError(e.detail[0])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Finalized season {options['season']} with {ranked} ranked players"))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from whack_blob.services import flush_pending_scores
+
+
+class Command(BaseCommand):
+    help = 'Apply staged score submissions to the standings in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', action='store_true', help='Keep flushing until interrupted')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when idle')
+
+    def handle(self, *args, **options):
+        while True:
+            flushed = flush_pending_scores(batch_size=options['batch_size'])
+            while flushed:
+                self.stdout.write(f'Flushed {flushed} pending scores')
+                flushed = flush_pending_scores(batch_size=options['batch_size'])
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
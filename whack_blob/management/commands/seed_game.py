@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from whack_blob.seeding import seed_game
+
+
+class Command(BaseCommand):
+    help = 'Generate players, game history, standings and referrals for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--games', type=int, default=2000000, help='Roughly how many game scores to create')
+        parser.add_argument('--days', type=int, default=30, help='Days of history')
+        parser.add_argument('--season', type=int, help='Seed into this season instead of a new one')
+        parser.add_argument('--seed', type=int, default=0, help='The same seed generates the same data')
+        parser.add_argument('--referral-rate', type=float, default=0.3, help='Share of players with a referrer')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--no-copy', action='store_true', help='Use INSERTs instead of COPY on PostgreSQL')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            result = seed_game(
+                users=options['users'],
+                games=options['games'],
+                days=options['days'],
+                season_pk=options['season'],
+                seed=options['seed'],
+                referral_rate=options['referral_rate'],
+                batch_size=options['batch_size'],
+                use_copy=False if options['no_copy'] else None)
+        except ValidationError as e:
+            raise CommandError(e.detail[0])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded season {result['season']} with {result['users']} players, {result['games']} games, "
+            f"{result['referrals']} referrals and {result['referral_paths']} referral paths "
+            f"in {time.monotonic() - started:.1f}s"))
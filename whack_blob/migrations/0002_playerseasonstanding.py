@@ -0,0 +1,35 @@
+# Generated by Django 4.2 on 2026-10-18 16:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('whack_blob', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerSeasonStanding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+                ('score', models.IntegerField(default=0)),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='season_standings', to=settings.AUTH_USER_MODEL)),
+                ('season', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='whack_blob.season')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='playerseasonstanding',
+            index=models.Index(fields=['season', '-score', 'player'], name='standing_season_score_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='playerseasonstanding',
+            constraint=models.UniqueConstraint(fields=('season', 'player'), name='unique_season_player_standing'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2 on 2026-10-18 16:16
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def seed_todays_attempts(apps, schema_editor):
+    GameScore = apps.get_model('whack_blob', 'GameScore')
+    PlayerDailyAttempts = apps.get_model('whack_blob', 'PlayerDailyAttempts')
+
+    day_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    todays_attempts = GameScore.objects.filter(created_at__gte=day_start).order_by().values(
+        'player', 'season').annotate(attempts=Count('id'))
+
+    PlayerDailyAttempts.objects.bulk_create([
+        PlayerDailyAttempts(
+            player_id=row['player'],
+            season_id=row['season'],
+            day=day_start.date(),
+            attempts=row['attempts'])
+        for row in todays_attempts
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('whack_blob', '0002_playerseasonstanding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerDailyAttempts',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+                ('day', models.DateField()),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_attempts', to=settings.AUTH_USER_MODEL)),
+                ('season', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_attempts', to='whack_blob.season')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='playerdailyattempts',
+            constraint=models.UniqueConstraint(fields=('player', 'season', 'day'), name='unique_player_season_day_attempts'),
+        ),
+        migrations.RunPython(seed_todays_attempts, migrations.RunPython.noop),
+    ]
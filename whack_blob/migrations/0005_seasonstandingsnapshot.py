@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-18 16:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whack_blob', '0004_pendingscore'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='season',
+            name='finalized_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='SeasonStandingSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveIntegerField()),
+                ('address', models.CharField(max_length=150)),
+                ('score', models.IntegerField()),
+                ('season', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='standing_snapshot', to='whack_blob.season')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='seasonstandingsnapshot',
+            constraint=models.UniqueConstraint(fields=('season', 'rank'), name='unique_season_snapshot_rank'),
+        ),
+        migrations.AddConstraint(
+            model_name='seasonstandingsnapshot',
+            constraint=models.UniqueConstraint(fields=('season', 'address'), name='unique_season_snapshot_address'),
+        ),
+    ]
@@ -5,6 +5,9 @@ from helpers.models import BaseModel
 
 class Season(models.Model):
     season = models.CharField(max_length=100)
+    # Set by finalize_season; the season takes no more scores and its
+    # leaderboard is read from SeasonStandingSnapshot
+    finalized_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return self.season
@@ -19,3 +22,76 @@ class GameScore(BaseModel):
 
     def __str__(self):
         return f'{self.player.address} - {self.score}'
+
+
+class PlayerSeasonStanding(BaseModel):
+    season = models.ForeignKey(
+        Season, related_name='standings', on_delete=models.CASCADE)
+    player = models.ForeignKey(
+        User, related_name='season_standings', on_delete=models.CASCADE)
+    score = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['season', 'player'], name='unique_season_player_standing'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['season', '-score', 'player'], name='standing_season_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.season_id} - {self.player_id} - {self.score}'
+
+
+class SeasonStandingSnapshot(models.Model):
+    # Written once when the season is finalized and never changed, so it
+    # keeps only what the leaderboard shows. The unique constraints double
+    # as the rank and address lookups
+    season = models.ForeignKey(
+        Season, related_name='standing_snapshot', on_delete=models.CASCADE, db_index=False)
+    rank = models.PositiveIntegerField()
+    address = models.CharField(max_length=150)
+    score = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['season', 'rank'], name='unique_season_snapshot_rank'),
+            models.UniqueConstraint(
+                fields=['season', 'address'], name='unique_season_snapshot_address'),
+        ]
+
+    def __str__(self):
+        return f'{self.season_id} - #{self.rank} {self.address} - {self.score}'
+
+
+class PlayerDailyAttempts(BaseModel):
+    season = models.ForeignKey(
+        Season, related_name='daily_attempts', on_delete=models.CASCADE)
+    player = models.ForeignKey(
+        User, related_name='daily_attempts', on_delete=models.CASCADE)
+    day = models.DateField()
+    attempts = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['player', 'season', 'day'], name='unique_player_season_day_attempts'),
+        ]
+
+    def __str__(self):
+        return f'{self.player_id} - {self.day} - {self.attempts}'
+
+
+class PendingScore(BaseModel):
+    season = models.ForeignKey(
+        Season, related_name='pending_scores', on_delete=models.CASCADE)
+    player = models.ForeignKey(
+        User, related_name='pending_scores', on_delete=models.CASCADE)
+    score = models.IntegerField(default=0)
+    ref_score = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f'{self.player_id} - {self.score} (pending)'
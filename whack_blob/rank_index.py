@@ -0,0 +1,190 @@
+import logging
+import threading
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from helpers.skiplist import IndexableSkipList
+
+from .models import PlayerSeasonStanding, Season
+
+logger = logging.getLogger(__name__)
+
+
+class SeasonRankIndex:
+    """
+    In-process order-statistics index over one season's standings.
+
+    Players are ordered by score descending, then player id, which is the
+    same order view_scoreboard uses, so positions agree with the full
+    scoreboard.
+    """
+
+    def __init__(self, season_pk: int, season_name: str):
+        self.season_pk = season_pk
+        self.season_name = season_name
+        self.built_at = time.monotonic()
+        self._entries = IndexableSkipList()
+        self._players = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(player_id: int, score: int) -> tuple:
+        return (-score, player_id)
+
+    def update(self, player_id: int, address: str, score: int):
+        with self._lock:
+            current = self._players.get(player_id)
+            if current is not None:
+                self._entries.remove(self._key(player_id, current[0]))
+            self._entries.insert(self._key(player_id, score))
+            self._players[player_id] = (score, address)
+
+    def lookup(self, player_id: int) -> dict:
+        with self._lock:
+            current = self._players.get(player_id)
+            if current is None:
+                return None
+            score, address = current
+            position = self._entries.rank(self._key(player_id, score)) + 1
+
+        return self._entry(position, address, score)
+
+    def load_player(self, player_id: int, address: str) -> Optional[dict]:
+        """
+        Rank a player the index does not have, usually one whose first
+        score another worker wrote after the index was built: read their
+        standing, count the players ahead of them in the database, and add
+        them to the index. Returns None if they have no standing.
+        """
+        standings = PlayerSeasonStanding.objects.filter(season__pk=self.season_pk)
+        score = standings.filter(player_id=player_id).values_list('score', flat=True).first()
+        if score is None:
+            return None
+
+        ahead = standings.filter(Q(score__gt=score) | Q(score=score, player_id__lt=player_id)).count()
+        self.update(player_id, address, score)
+
+        return self._entry(ahead + 1, address, score)
+
+    def neighbours(self, player_id: int, radius: int) -> list:
+        with self._lock:
+            current = self._players.get(player_id)
+            if current is None:
+                return []
+            rank = self._entries.rank(self._key(player_id, current[0]))
+            start = max(rank - radius, 0)
+            keys = self._entries.slice(start, rank + radius + 1)
+            rows = [(-score, self._players[key_player_id][1]) for score, key_player_id in keys]
+
+        return [
+            self._entry(start + offset + 1, address, score)
+            for offset, (score, address) in enumerate(rows)
+        ]
+
+    def _entry(self, position: int, address: str, score: int) -> dict:
+        return {
+            'player': address,
+            'score': score,
+            'season': self.season_name,
+            'position': position,
+        }
+
+    def is_stale(self) -> bool:
+        return time.monotonic() - self.built_at > settings.RANK_INDEX_MAX_AGE
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+# One lock per season for its first build, so building one season does not
+# hold up reads of the others
+_build_locks = {}
+# Seasons being rebuilt in the background, with the scores recorded since
+# the rebuild started
+_rebuilds = {}
+
+
+def build_season_rank_index(season_pk: int) -> SeasonRankIndex:
+    season = Season.objects.get(pk=season_pk)
+    rank_index = SeasonRankIndex(season.pk, season.season)
+    standings = PlayerSeasonStanding.objects.filter(
+        season__pk=season_pk).values_list('player_id', 'player__address', 'score')
+    for player_id, address, score in standings.iterator(chunk_size=5000):
+        rank_index.update(player_id, address, score)
+
+    return rank_index
+
+
+def get_season_rank_index(season_pk: int) -> SeasonRankIndex:
+    """
+    Return the season's index, building it from the database on first use.
+
+    Other workers' writes are not visible to this process, so an index
+    older than RANK_INDEX_MAX_AGE seconds is rebuilt as well. That happens
+    on a background thread; requests keep reading the old index until the
+    new one replaces it.
+    """
+    rank_index = _indexes.get(season_pk)
+    if rank_index is not None:
+        if rank_index.is_stale():
+            _start_rebuild(season_pk)
+        return rank_index
+
+    with _indexes_lock:
+        build_lock = _build_locks.setdefault(season_pk, threading.Lock())
+
+    with build_lock:
+        rank_index = _indexes.get(season_pk)
+        if rank_index is None:
+            rank_index = build_season_rank_index(season_pk)
+            with _indexes_lock:
+                _indexes[season_pk] = rank_index
+
+    return rank_index
+
+
+def _start_rebuild(season_pk: int):
+    with _indexes_lock:
+        if season_pk in _rebuilds:
+            return
+        _rebuilds[season_pk] = []
+
+    threading.Thread(
+        target=_rebuild, args=(season_pk,), name=f'rank-index-{season_pk}', daemon=True).start()
+
+
+def _rebuild(season_pk: int):
+    try:
+        rank_index = build_season_rank_index(season_pk)
+    except Exception:
+        # The old index stays; the next request past RANK_INDEX_MAX_AGE tries again
+        logger.exception('Could not rebuild the rank index for season %s', season_pk)
+        rank_index = None
+    finally:
+        connection.close()
+
+    with _indexes_lock:
+        recorded = _rebuilds.pop(season_pk)
+        if rank_index is not None:
+            for player_id, address, score in recorded:
+                rank_index.update(player_id, address, score)
+            _indexes[season_pk] = rank_index
+
+
+def record_player_score(season_pk: int, player_id: int, address: str, score: int):
+    with _indexes_lock:
+        rank_index = _indexes.get(season_pk)
+        recorded = _rebuilds.get(season_pk)
+        if recorded is not None:
+            recorded.append((player_id, address, score))
+
+    if rank_index is not None:
+        rank_index.update(player_id, address, score)
+
+
+def clear_rank_indexes():
+    with _indexes_lock:
+        _indexes.clear()
@@ -0,0 +1,117 @@
+from django.db import connection
+from django.db.models import F, Window
+from django.db.models.functions import DenseRank, Rank, RowNumber
+
+from users.models import User
+
+from .models import GameScore, PlayerSeasonStanding, SeasonStandingSnapshot
+
+ORDINAL = 'ordinal'
+COMPETITION = 'competition'
+DENSE = 'dense'
+
+TIE_POLICIES = (ORDINAL, COMPETITION, DENSE)
+
+_RANK_FUNCTIONS = {
+    ORDINAL: RowNumber,
+    COMPETITION: Rank,
+    DENSE: DenseRank,
+}
+
+_RANK_SQL = {
+    ORDINAL: 'ROW_NUMBER()',
+    COMPETITION: 'RANK()',
+    DENSE: 'DENSE_RANK()',
+}
+
+
+def rank_season_standings(season_pk: int, tie_policy: str = ORDINAL):
+    """
+    Rank a season's standings in the database with a window function.
+
+    ordinal numbers tied players 1, 2, 3 (ties broken by player id),
+    competition gives them 1, 1, 3 and dense gives them 1, 1, 2.
+    """
+    order_by = [F('score').desc()]
+    if tie_policy == ORDINAL:
+        order_by.append(F('player_id').asc())
+
+    return PlayerSeasonStanding.objects.filter(season__pk=season_pk).annotate(
+        position=Window(expression=_RANK_FUNCTIONS[tie_policy](), order_by=order_by),
+        address=F('player__address'),
+    ).order_by('position', 'player_id').values_list('address', 'score', 'position')
+
+
+def rank_season_snapshot(season_pk: int, tie_policy: str = ORDINAL):
+    """
+    Rank a finalized season from its snapshot. The snapshot stores ordinal
+    ranks, so the other policies are worked out while reading in rank
+    order instead of with a window function.
+
+    Yields (address, score, position) tuples.
+    """
+    snapshot = _snapshot_ranks(season_pk).iterator(chunk_size=5000)
+
+    return _positions_from_ranks(snapshot, tie_policy)
+
+
+async def arank_season_snapshot(season_pk: int, tie_policy: str = ORDINAL) -> list:
+    snapshot = [row async for row in _snapshot_ranks(season_pk)]
+
+    return list(_positions_from_ranks(snapshot, tie_policy))
+
+
+def _snapshot_ranks(season_pk: int):
+    return SeasonStandingSnapshot.objects.filter(
+        season__pk=season_pk).order_by('rank').values_list('address', 'score', 'rank')
+
+
+def _positions_from_ranks(snapshot, tie_policy: str):
+    position = 0
+    last_score = None
+    for address, score, rank in snapshot:
+        if tie_policy == ORDINAL:
+            position = rank
+        elif score != last_score:
+            position = position + 1 if tie_policy == DENSE else rank
+        last_score = score
+        yield address, score, position
+
+
+def rank_season_history(season_pk: int, tie_policy: str = ORDINAL, chunk_size: int = 2000):
+    """
+    Rank a season straight from the game score history in one query: the
+    latest row per player is picked with ROW_NUMBER() and then ranked.
+
+    Yields (player id, address, score, position) tuples.
+    """
+    quote_name = connection.ops.quote_name
+    game_score_table = quote_name(GameScore._meta.db_table)
+    user_table = quote_name(User._meta.db_table)
+    tie_breaker = ', latest_scores.player_id' if tie_policy == ORDINAL else ''
+
+    sql = f"""
+        WITH latest_scores AS (
+            SELECT player_id, score, ROW_NUMBER() OVER (
+                PARTITION BY player_id ORDER BY created_at DESC, id DESC
+            ) AS recency
+            FROM {game_score_table}
+            WHERE season_id = %s
+        )
+        SELECT latest_scores.player_id, players.address, latest_scores.score,
+            {_RANK_SQL[tie_policy]} OVER (
+                ORDER BY latest_scores.score DESC{tie_breaker}
+            ) AS player_position
+        FROM latest_scores
+        INNER JOIN {user_table} players ON players.id = latest_scores.player_id
+        WHERE latest_scores.recency = 1
+        ORDER BY player_position, latest_scores.player_id
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [season_pk])
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield from rows
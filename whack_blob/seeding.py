@@ -0,0 +1,298 @@
+import csv
+import hashlib
+import io
+import random
+from array import array
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import DateTimeField, Max
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from users.models import ReferralReward, User
+from users.referral_names import allocate_referral_usernames
+from users.referral_tree import rebuild_referral_closure
+from users.services import REFERRAL_REWARD_POINTS
+
+from .leaderboard_cache import invalidate_leaderboard
+from .models import GameScore, PlayerDailyAttempts, PlayerSeasonStanding, Season
+from .services import MAX_DAILY_ATTEMPTS
+
+# Players' activity follows a Lomax (Pareto II) distribution with this
+# shape: most play a few games, a few play every day they can
+ACTIVITY_SHAPE = 1.3
+
+# Points per game are log-normal, so a few games score far above the rest
+GAME_POINTS_MU = 3.5
+GAME_POINTS_SIGMA = 1.0
+
+
+def seed_address(seed: int, index: int) -> str:
+    return '0x' + hashlib.blake2b(f'{seed}:{index}'.encode(), digest_size=20).hexdigest()
+
+
+class _RowWriter:
+    """
+    Buffer rows for one model and write them in multi-row INSERTs, or with
+    COPY on PostgreSQL. Rows are written as given, so created_at keeps
+    the generated history instead of the time of the insert; the fields
+    not in ``attnames`` get their defaults.
+    """
+
+    def __init__(self, model, attnames: list, batch_size: int, use_copy: bool):
+        self.connection = connections[DEFAULT_DB_ALIAS]
+        fields = {field.attname: field for field in model._meta.concrete_fields}
+        defaulted = [
+            field for field in model._meta.concrete_fields
+            if field.attname not in attnames and not field.primary_key]
+        self.defaults = tuple(field.get_default() for field in defaulted)
+        self.fields = [fields[attname] for attname in attnames] + defaulted
+        ops = self.connection.ops
+        self.table = ops.quote_name(model._meta.db_table)
+        self.columns = ', '.join(ops.quote_name(field.column) for field in self.fields)
+        # The drivers take everything else as is; datetimes may need making
+        # naive for the database's time zone
+        self.datetime_fields = [
+            (position, field) for position, field in enumerate(self.fields) if isinstance(field, DateTimeField)]
+        self.use_copy = use_copy
+        self.batch_size = batch_size if use_copy else min(
+            batch_size, ops.bulk_batch_size(self.fields, [None] * batch_size))
+        self.rows = []
+        self.written = 0
+
+    def add(self, *values):
+        self.rows.append(values + self.defaults)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+
+        with self.connection.cursor() as cursor:
+            if self.use_copy:
+                # CSV leaves both None and '' empty, so NULLs are spelt \N
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(
+                    ['\\N' if value is None else value for value in row] for row in self.rows)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f"COPY {self.table} ({self.columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+            else:
+                placeholders = '(' + ', '.join(['%s'] * len(self.fields)) + ')'
+                params = []
+                for row in self.rows:
+                    row = list(row)
+                    for position, field in self.datetime_fields:
+                        row[position] = field.get_db_prep_save(row[position], self.connection)
+                    params.extend(row)
+                cursor.execute(
+                    f'INSERT INTO {self.table} ({self.columns}) VALUES '
+                    + ', '.join([placeholders] * len(self.rows)), params)
+
+        self.written += len(self.rows)
+        self.rows = []
+
+
+def _plan_referrals(users: int, referral_rate: float, seed: int) -> tuple:
+    """
+    Pick each player's referrer among the players who joined before them,
+    by preferential attachment: every referral a player brings in makes
+    them likelier to bring the next, which gives a few big referrers and
+    long chains through their downlines.
+    """
+    rng = random.Random(f'{seed}:referrals')
+    referrer_of = array('l', [-1]) * users
+    referral_counts = array('l', [0]) * users
+    candidates = []
+
+    for index in range(users):
+        if candidates and rng.random() < referral_rate:
+            referrer = candidates[rng.randrange(len(candidates))]
+            referrer_of[index] = referrer
+            referral_counts[referrer] += 1
+            candidates.append(referrer)
+        candidates.append(index)
+
+    return referrer_of, referral_counts
+
+
+def _plan_joins(users: int, window_seconds: float, seed: int) -> array:
+    """
+    Pick when each player joined, as seconds into the window, more of them
+    recent than early. The times rise with the player index, so every
+    referrer joined before the players they referred.
+    """
+    rng = random.Random(f'{seed}:joins')
+    return array('d', sorted(window_seconds * rng.random() ** 0.5 for _ in range(users)))
+
+
+def _plan_activity(join_days: array, games: int, days: int, seed: int) -> array:
+    """
+    Pick how many games each player played: Lomax-distributed activity
+    times the days they have been around, capped at MAX_DAILY_ATTEMPTS a
+    day. The activity is scaled so the capped counts add up to about
+    ``games``.
+    """
+    rng = random.Random(f'{seed}:activity')
+    weights = [
+        (rng.paretovariate(ACTIVITY_SHAPE) - 1) * (days - join_day) for join_day in join_days]
+    caps = [(days - join_day) * MAX_DAILY_ATTEMPTS for join_day in join_days]
+
+    def total_games(scale: float) -> int:
+        return sum(min(round(weight * scale), cap) for weight, cap in zip(weights, caps))
+
+    target = min(games, sum(caps))
+    low, high = 0.0, 1.0
+    while total_games(high) < target and high < 2 ** 64:
+        low, high = high, high * 2
+    for _ in range(30):
+        middle = (low + high) / 2
+        low, high = (middle, high) if total_games(middle) < games else (low, middle)
+
+    return array('l', (min(round(weight * high), cap) for weight, cap in zip(weights, caps)))
+
+
+def seed_game(
+        users: int, games: int, days: int = 30, season_pk: int = None, seed: int = 0,
+        referral_rate: float = 0.3, batch_size: int = 10000, use_copy: bool = None) -> dict:
+    """
+    Generate ``users`` active players and about ``games`` game scores for
+    them over the last ``days`` days, with the same rows for the same
+    ``seed``.
+
+    Players join over the window and play at most MAX_DAILY_ATTEMPTS
+    games a day. Referrals are recorded as linked and rewarded, with
+    ledger rows, and each reward is credited to the referrer when the
+    referral joins, as a history row like the live path writes. Game
+    history is cumulative per player, the standings and daily attempts
+    match it, and the referral closure is rebuilt.
+
+    Addresses, referrals, games and scores depend on the seed alone.
+    Player ids and referral usernames come from the database's sequences,
+    so they only repeat between runs on an empty database.
+    """
+    connection = connections[DEFAULT_DB_ALIAS]
+    if use_copy is None:
+        use_copy = connection.vendor == 'postgresql'
+    if use_copy and connection.vendor != 'postgresql':
+        raise ValidationError('COPY is only available on PostgreSQL')
+    if User.objects.filter(address=seed_address(seed, 0)).exists():
+        raise ValidationError(f'Players for seed {seed} already exist')
+
+    if season_pk is None:
+        season = Season.objects.create(season=f'seeded season {seed}')
+    else:
+        season = Season.objects.get(pk=season_pk)
+
+    rng = random.Random(seed)
+    first_pk = (User.objects.aggregate(last_pk=Max('pk'))['last_pk'] or 0) + 1
+    now = timezone.now()
+    window_start = now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days - 1)
+    join_offsets = _plan_joins(users, (now - window_start).total_seconds(), seed)
+    join_days = array('l', (int(offset // 86400) for offset in join_offsets))
+    referrer_of, referral_counts = _plan_referrals(users, referral_rate, seed)
+    game_counts = _plan_activity(join_days, games, days, seed)
+
+    # When each referrer is rewarded: as each of their referrals joins
+    reward_offsets = defaultdict(list)
+    for index, referrer in enumerate(referrer_of):
+        if referrer >= 0:
+            reward_offsets[referrer].append(join_offsets[index])
+
+    def random_time(start, day: int):
+        # A moment between ``start`` and the end of the day, or now for today
+        day_end = min(window_start + timedelta(days=day + 1), now)
+        return start + (day_end - start) * rng.random()
+
+    user_writer = _RowWriter(User, [
+        'id', 'password', 'created_at', 'modified_at', 'address', 'referral_username', 'referrer_username',
+        'referrer_id', 'referral_count', 'last_rewarded_referral_count', 'is_active',
+    ], batch_size, use_copy)
+    game_writer = _RowWriter(
+        GameScore, ['created_at', 'modified_at', 'season_id', 'player_id', 'score'], batch_size, use_copy)
+    attempts_writer = _RowWriter(
+        PlayerDailyAttempts, ['created_at', 'modified_at', 'season_id', 'player_id', 'day', 'attempts'],
+        batch_size, use_copy)
+    standing_writer = _RowWriter(
+        PlayerSeasonStanding, ['created_at', 'modified_at', 'season_id', 'player_id', 'score'],
+        batch_size, use_copy)
+    reward_writer = _RowWriter(
+        ReferralReward, ['created_at', 'modified_at', 'referral_id', 'referrer_id', 'points'],
+        batch_size, use_copy)
+
+    usernames = []
+    for chunk_start in range(0, users, batch_size):
+        chunk_end = min(chunk_start + batch_size, users)
+        usernames.extend(allocate_referral_usernames(chunk_end - chunk_start))
+        players = []
+
+        for index in range(chunk_start, chunk_end):
+            join_day = join_days[index]
+            joined_at = window_start + timedelta(seconds=join_offsets[index])
+            referrer = referrer_of[index]
+            user_writer.add(
+                first_pk + index, '', joined_at, joined_at, seed_address(seed, index), usernames[index],
+                usernames[referrer] if referrer >= 0 else None,
+                first_pk + referrer if referrer >= 0 else None,
+                referral_counts[index], referral_counts[index], True)
+            players.append((index, join_day, joined_at))
+        user_writer.flush()
+
+        for index, join_day, joined_at in players:
+            player_pk = first_pk + index
+            game_count = game_counts[index]
+            slots = rng.sample(range((days - join_day) * MAX_DAILY_ATTEMPTS), game_count)
+
+            attempts = {}
+            for slot in sorted(slots):
+                day = join_day + slot // MAX_DAILY_ATTEMPTS
+                attempts[day] = attempts.get(day, 0) + 1
+
+            # Games and referral rewards, as (time, points)
+            credits = []
+            for day, day_attempts in attempts.items():
+                day_start = max(window_start + timedelta(days=day), joined_at)
+                played = sorted(random_time(day_start, day) for _ in range(day_attempts))
+                credits.extend(
+                    (played_at, int(rng.lognormvariate(GAME_POINTS_MU, GAME_POINTS_SIGMA)) + 1)
+                    for played_at in played)
+                attempts_writer.add(
+                    day_start, played[-1], season.pk, player_pk, played[-1].date(), day_attempts)
+            credits.extend(
+                (window_start + timedelta(seconds=offset), REFERRAL_REWARD_POINTS)
+                for offset in reward_offsets.pop(index, ()))
+            credits.sort()
+
+            score = 0
+            for credited_at, points in credits:
+                score += points
+                game_writer.add(credited_at, credited_at, season.pk, player_pk, score)
+            if credits:
+                standing_writer.add(joined_at, credits[-1][0], season.pk, player_pk, score)
+            if referrer_of[index] >= 0:
+                reward_writer.add(
+                    joined_at, joined_at, player_pk, first_pk + referrer_of[index], REFERRAL_REWARD_POINTS)
+
+    for writer in (game_writer, attempts_writer, standing_writer, reward_writer):
+        writer.flush()
+
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [User]):
+            cursor.execute(sql)
+
+    referral_paths = rebuild_referral_closure()
+    invalidate_leaderboard(season.pk)
+
+    return {
+        'season': season.pk,
+        'users': user_writer.written,
+        'games': sum(game_counts),
+        'daily_attempts': attempts_writer.written,
+        'standings': standing_writer.written,
+        'referrals': reward_writer.written,
+        'referral_paths': referral_paths,
+    }
@@ -1,21 +1,49 @@
-from datetime import date
+import base64
+import binascii
+import logging
+from collections import defaultdict
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
 from users.models import User
-from .models import GameScore, Season
+from .models import (
+    GameScore, PendingScore, PlayerDailyAttempts, PlayerSeasonStanding, Season, SeasonStandingSnapshot)
+from .leaderboard_cache import invalidate_leaderboard
+from .rank_index import get_season_rank_index, record_player_score
+from .ranking import (
+    ORDINAL, arank_season_snapshot, rank_season_history, rank_season_snapshot, rank_season_standings)
 from rest_framework.exceptions import ValidationError
 
+logger = logging.getLogger(__name__)
+
+SEASON_CACHE_TIMEOUT = 300
+MAX_DAILY_ATTEMPTS = 3
+
 
 def verify_health(user: User, validated_data: dict) -> int:
-    game_season_pk = validated_data.get('season')
-    today = date.today()
-    players_today_games = GameScore.objects.filter(
-        season__pk=game_season_pk,
-        player__pk=user.id,
-        created_at__year=today.year,
-        created_at__month=today.month,
-        created_at__day=today.day)
+    today = timezone.now().date()
+    num_attempts = attempts_today(user, validated_data, today).first() or 0
+
+    return attempts_used(user, today, num_attempts)
+
+
+async def averify_health(user: User, validated_data: dict) -> int:
+    today = timezone.now().date()
+    num_attempts = await attempts_today(user, validated_data, today).afirst() or 0
+
+    return attempts_used(user, today, num_attempts)
+
+
+def attempts_today(user: User, validated_data: dict, today):
+    return PlayerDailyAttempts.objects.filter(
+        player_id=user.id,
+        season_id=validated_data.get('season'),
+        day=today).values_list('attempts', flat=True)
 
+
+def attempts_used(user: User, today, num_attempts: int) -> int:
     user_created_datetime = user.created_at
-    num_attempts = players_today_games.count()
 
     if today == user_created_datetime.date():
         return num_attempts - 1
@@ -24,104 +52,662 @@ def verify_health(user: User, validated_data: dict) -> int:
         return num_attempts
 
 
+def record_daily_attempt(user: User, season_pk: int):
+    today = timezone.now().date()
+    todays_attempts = PlayerDailyAttempts.objects.filter(
+        player_id=user.id, season_id=season_pk, day=today)
+
+    if todays_attempts.update(attempts=F('attempts') + 1):
+        return
+
+    try:
+        with transaction.atomic():
+            PlayerDailyAttempts.objects.create(
+                player=user, season_id=season_pk, day=today, attempts=1)
+    except IntegrityError:
+        todays_attempts.update(attempts=F('attempts') + 1)
+
+
 def attempts_validator(user_attempts: int):
-    if user_attempts == 3:
+    if user_attempts >= MAX_DAILY_ATTEMPTS:
         raise ValidationError(
             "You don't have any lives left"
         )
 
 
 def calc_lives(attempts: int) -> dict:
-    lives_left = 3 - attempts
+    lives_left = MAX_DAILY_ATTEMPTS - attempts
 
     player_health = {'current_attempts': attempts, 'lives_left': lives_left}
 
     return player_health
 
 
+@transaction.atomic
 def update_user_score(user: User, validated_data: dict, ref_score: bool = False) -> GameScore:
-    user_pk = user.id
     game_season_pk = validated_data.get('season')
     try:
         additional_score = int(validated_data.get('score'))
     except TypeError:
         raise ValidationError('Invalid value provided for score')
 
+    game_season = get_season(game_season_pk)
+    check_season_open(game_season)
+
+    score = increment_player_standing(user, game_season, additional_score)
+    if score is None:
+        # The player's first score this season: start the standing from
+        # any existing history, then apply the increment to it
+        lock_player_standing(user, game_season)
+        score = increment_player_standing(user, game_season, additional_score)
+        if score is None:
+            raise ValidationError('Season is finalized')
+    new_game = GameScore.objects.create(
+        player=user, season=game_season, score=score)
+
+    if not ref_score:
+        record_daily_attempt(user, game_season.pk)
+
+    standing = PlayerSeasonStanding(player=user, season=game_season, score=score)
+    transaction.on_commit(lambda: publish_player_score(user, standing))
+
+    return new_game
+
+
+def increment_player_standing(user: User, season: Season, additional_score: int):
+    """
+    Add to the player's standing in a single UPDATE and return the new
+    score, or None when the player has no standing yet or the season has
+    been finalized.
+
+    The UPDATE row-locks the standing until the transaction ends, so
+    concurrent writes for the player apply one after another. Its season
+    check takes a share lock on the season row, which waits for
+    finalize_season's lock, so no write lands after the snapshot.
+    """
+    quote_name = connection.ops.quote_name
+    standing_table = quote_name(PlayerSeasonStanding._meta.db_table)
+    season_table = quote_name(Season._meta.db_table)
+    modified_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    lock = ' FOR KEY SHARE' if connection.vendor == 'postgresql' else ''
+
+    if connection.vendor == 'mysql':
+        # No UPDATE ... RETURNING; LAST_INSERT_ID(expr) hands the new
+        # score back as the cursor's lastrowid instead (InnoDB share-locks
+        # the rows a subquery in an UPDATE reads)
+        new_score = 'LAST_INSERT_ID(score + %s)'
+        returning = ''
+    else:
+        new_score = 'score + %s'
+        returning = ' RETURNING score'
+
+    sql = f"""
+        UPDATE {standing_table} SET score = {new_score}, modified_at = %s
+        WHERE player_id = %s AND season_id = %s AND EXISTS (
+            SELECT 1 FROM {season_table} WHERE id = %s AND finalized_at IS NULL{lock}
+        ){returning}
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [additional_score, modified_at, user.id, season.pk, season.pk])
+        if connection.vendor == 'mysql':
+            # LAST_INSERT_ID() is unsigned
+            return _signed_bigint(cursor.lastrowid) if cursor.rowcount else None
+        row = cursor.fetchone()
+
+    return row[0] if row else None
+
+
+def _signed_bigint(value: int) -> int:
+    return value - 2 ** 64 if value >= 2 ** 63 else value
+
+
+def lock_player_standing(user: User, season: Season) -> PlayerSeasonStanding:
+    """
+    Fetch the player's standing row with a row lock, so concurrent score
+    writes for the same player and season are applied one after another.
+    """
+    player_standings = PlayerSeasonStanding.objects.select_for_update().filter(
+        player_id=user.id, season_id=season.pk)
+    try:
+        return player_standings.get()
+    except PlayerSeasonStanding.DoesNotExist:
+        pass
+
+    latest_score = GameScore.objects.filter(
+        player_id=user.id, season_id=season.pk).order_by(
+            '-created_at', '-pk').values_list('score', flat=True).first()
+    try:
+        with transaction.atomic():
+            return PlayerSeasonStanding.objects.create(
+                player=user, season=season, score=latest_score or 0)
+    except IntegrityError:
+        return player_standings.get()
+
+
+def update_user_scores(user: User, entries: list) -> list:
+    """
+    Apply a batch of score submissions and return one result per entry.
+
+    Entries may name another player's address when submitted by staff.
+    Lives are checked for the whole batch against the daily counters, and
+    accepted entries are written with bulk inserts and updates while the
+    affected standing and daily attempt rows are locked.
+    """
+    results = [
+        {'player': None, 'season': entry['season'], 'score': None, 'status': 'ok', 'error': None}
+        for entry in entries
+    ]
+
+    addresses = {entry['address'] for entry in entries if entry.get('address')}
+    players_by_address = User.objects.in_bulk(addresses, field_name='address') if addresses else {}
+    seasons = Season.objects.in_bulk({entry['season'] for entry in entries})
+
+    accepted_entries = []
+    for result, entry in zip(results, entries):
+        player = user
+        address = entry.get('address')
+        if address and address != user.address:
+            if not user.is_staff:
+                result.update(status='rejected', error='Only staff can add scores for other players')
+                continue
+            player = players_by_address.get(address)
+            if player is None:
+                result.update(status='rejected', error='Player not found')
+                continue
+        if entry['season'] not in seasons:
+            result.update(status='rejected', error='Season not found')
+            continue
+        if seasons[entry['season']].finalized_at is not None:
+            result.update(status='rejected', error='Season is finalized')
+            continue
+        accepted_entries.append((result, entry, player, seasons[entry['season']]))
+
+    if not accepted_entries:
+        return results
+
+    with transaction.atomic():
+        standings = lock_player_standings(
+            {(player, season) for _, _, player, season in accepted_entries})
+        daily_attempts = lock_daily_attempts(
+            {(player, season) for _, entry, player, season in accepted_entries
+             if not entry.get('ref_score')})
+
+        today = timezone.now().date()
+        game_scores = []
+        for result, entry, player, season in accepted_entries:
+            if not entry.get('ref_score'):
+                attempts = daily_attempts[(player.id, season.pk)]
+                used_attempts = attempts.attempts
+                if today == player.created_at.date():
+                    used_attempts -= 1
+                if used_attempts >= MAX_DAILY_ATTEMPTS:
+                    result.update(status='rejected', error="You don't have any lives left")
+                    continue
+                attempts.attempts += 1
+
+            standing = standings[(player.id, season.pk)]
+            standing.score += entry['score']
+            game_scores.append(GameScore(player=player, season=season, score=standing.score))
+            result.update(player=player.address, score=standing.score)
+
+        GameScore.objects.bulk_create(game_scores)
+        recheck_seasons_open({season.pk for _, _, _, season in accepted_entries})
+        save_player_standings(standings.values())
+        save_daily_attempts(daily_attempts.values())
+
+    return results
+
+
+def lock_player_standings(player_seasons: set) -> dict:
+    """
+    Lock the standing rows of exactly these (player, season) pairs, in
+    primary key order, creating the ones that do not exist yet.
+    """
+    pairs = Q()
+    for player, season in player_seasons:
+        pairs |= Q(player_id=player.id, season_id=season.pk)
+    standings = {
+        (standing.player_id, standing.season_id): standing
+        for standing in PlayerSeasonStanding.objects.select_for_update().filter(pairs).order_by('pk')
+    } if player_seasons else {}
+
+    player_standings = {}
+    for player, season in sorted(player_seasons, key=lambda pair: (pair[0].id, pair[1].pk)):
+        standing = standings.get((player.id, season.pk))
+        if standing is None:
+            standing = lock_player_standing(player, season)
+        standing.player = player
+        player_standings[(player.id, season.pk)] = standing
+
+    return player_standings
+
+
+def save_player_standings(standings):
+    standings = list(standings)
+    modified_at = timezone.now()
+    for standing in standings:
+        standing.modified_at = modified_at
+
+    PlayerSeasonStanding.objects.bulk_update(standings, ['score', 'modified_at'])
+
+    def publish_player_scores():
+        for standing in standings:
+            publish_player_score(standing.player, standing)
+
+    transaction.on_commit(publish_player_scores)
+
+
+def lock_daily_attempts(player_seasons: set) -> dict:
+    """
+    Lock today's attempt counters for these (player, season) pairs,
+    creating the missing ones at zero first. take_daily_attempt and
+    record_daily_attempt increment the same rows, so they wait for the
+    batch instead of being overwritten by it.
+    """
+    today = timezone.now().date()
+    PlayerDailyAttempts.objects.bulk_create([
+        PlayerDailyAttempts(player=player, season=season, day=today, attempts=0)
+        for player, season in player_seasons
+    ], ignore_conflicts=True)
+
+    pairs = Q()
+    for player, season in player_seasons:
+        pairs |= Q(player_id=player.id, season_id=season.pk)
+
+    return {
+        (attempts.player_id, attempts.season_id): attempts
+        for attempts in PlayerDailyAttempts.objects.select_for_update().filter(
+            pairs, day=today).order_by('pk')
+    } if player_seasons else {}
+
+
+def save_daily_attempts(daily_attempts):
+    daily_attempts = list(daily_attempts)
+    modified_at = timezone.now()
+    for attempts in daily_attempts:
+        attempts.modified_at = modified_at
+
+    PlayerDailyAttempts.objects.bulk_update(daily_attempts, ['attempts', 'modified_at'])
+
+
+@transaction.atomic
+def enqueue_user_score(user: User, validated_data: dict, ref_score: bool = False) -> PendingScore:
+    """
+    Stage a score submission for flush_pending_scores instead of applying it.
+
+    The daily attempt is still taken here, with a conditional increment,
+    so lives stay exact while the score itself is pending.
+    """
     try:
-        game_season = Season.objects.get(pk=game_season_pk)
+        additional_score = int(validated_data.get('score'))
+    except TypeError:
+        raise ValidationError('Invalid value provided for score')
+
+    game_season = get_season(validated_data.get('season'))
+    check_season_open(game_season)
+
+    if not ref_score:
+        take_daily_attempt(user, game_season)
+
+    pending_score = PendingScore.objects.create(
+        player=user, season=game_season, score=additional_score, ref_score=ref_score)
+    recheck_seasons_open({game_season.pk})
+
+    return pending_score
+
+
+def take_daily_attempt(user: User, season: Season):
+    today = timezone.now().date()
+    max_attempts = MAX_DAILY_ATTEMPTS
+    if today == user.created_at.date():
+        max_attempts += 1
+
+    todays_attempts = PlayerDailyAttempts.objects.filter(
+        player_id=user.id, season_id=season.pk, day=today)
+
+    if todays_attempts.filter(attempts__lt=max_attempts).update(attempts=F('attempts') + 1):
+        return
+
+    try:
+        with transaction.atomic():
+            PlayerDailyAttempts.objects.create(
+                player=user, season=season, day=today, attempts=1)
+    except IntegrityError:
+        if not todays_attempts.filter(attempts__lt=max_attempts).update(attempts=F('attempts') + 1):
+            raise ValidationError("You don't have any lives left")
+
+
+def flush_pending_scores(batch_size: int = 1000) -> int:
+    """
+    Apply up to ``batch_size`` staged submissions, merged into one history
+    row per player and season. Returns the number of submissions applied.
+    """
+    with transaction.atomic():
+        # Only the pending rows are locked; locking the joined seasons and
+        # players too would queue behind every live score write
+        pending_scores = list(PendingScore.objects.select_for_update(
+            skip_locked=True, of=('self',)).select_related('player', 'season').order_by('pk')[:batch_size])
+        if not pending_scores:
+            return 0
+
+        deltas = defaultdict(int)
+        dropped = 0
+        for pending_score in pending_scores:
+            if pending_score.season.finalized_at is not None:
+                dropped += 1
+                continue
+            deltas[(pending_score.player, pending_score.season)] += pending_score.score
+        if dropped:
+            logger.warning('Dropped %d pending scores for finalized seasons', dropped)
+
+        standings = lock_player_standings(set(deltas))
+        game_scores = []
+        for (player, season), delta in deltas.items():
+            standing = standings[(player.id, season.pk)]
+            standing.score += delta
+            game_scores.append(GameScore(player=player, season=season, score=standing.score))
+
+        GameScore.objects.bulk_create(game_scores)
+        recheck_seasons_open({season.pk for _, season in deltas})
+        save_player_standings(standings.values())
+        PendingScore.objects.filter(
+            pk__in=[pending_score.pk for pending_score in pending_scores]).delete()
+
+    return len(pending_scores)
+
+
+def publish_player_score(user: User, standing: PlayerSeasonStanding):
+    record_player_score(standing.season_id, user.id, user.address, standing.score)
+    invalidate_leaderboard(standing.season_id)
+
+
+def backfill_player_standings(season_pk: int = None, batch_size: int = 1000) -> int:
+    seasons = Season.objects.order_by('pk')
+    if season_pk is not None:
+        seasons = seasons.filter(pk=season_pk)
+
+    unique_fields = None
+    if connection.features.supports_update_conflicts_with_target:
+        unique_fields = ['season', 'player']
+
+    backfilled = 0
+    for season in seasons:
+        standings = []
+        for player_pk, _, score, _ in rank_season_history(season.pk, chunk_size=batch_size):
+            standings.append(PlayerSeasonStanding(
+                season=season, player_id=player_pk, score=score))
+            if len(standings) == batch_size:
+                backfilled += _upsert_standings(standings, unique_fields)
+                standings = []
+
+        if standings:
+            backfilled += _upsert_standings(standings, unique_fields)
+
+    return backfilled
+
+
+def _upsert_standings(standings: list, unique_fields: list) -> int:
+    PlayerSeasonStanding.objects.bulk_create(
+        standings,
+        update_conflicts=True,
+        unique_fields=unique_fields,
+        update_fields=['score', 'modified_at'])
+
+    return len(standings)
+
+
+@transaction.atomic
+def finalize_season(season_pk: int) -> int:
+    """
+    Write a season's final ranking to SeasonStandingSnapshot in one
+    INSERT ... SELECT and close the season to further scores. Returns the
+    number of players ranked.
+
+    The season row stays locked until the snapshot is committed. Every
+    score write inserts a row referencing the season, which waits for
+    that lock, so a write either lands before the snapshot or is rejected
+    by recheck_seasons_open after it.
+    """
+    try:
+        season = Season.objects.select_for_update().get(pk=season_pk)
     except Season.DoesNotExist:
         raise ValidationError('Season not found')
+    if season.finalized_at is not None:
+        raise ValidationError('Season is already finalized')
+
+    # Staged scores would be dropped once the season is closed
+    pending_scores = PendingScore.objects.filter(season_id=season.pk).count()
+    if pending_scores:
+        raise ValidationError(
+            f'Season has {pending_scores} pending scores, flush them before finalizing')
 
-    latest_game_score = 0
+    season.finalized_at = timezone.now()
+    season.save(update_fields=['finalized_at'])
+    ranked = _snapshot_standings(season.pk)
 
-    try:
-        latest_game = GameScore.objects.filter(
-            player__pk=user_pk, season__pk=game_season.pk).latest('created_at')
-        latest_game_score = latest_game.score
-    except GameScore.DoesNotExist:
-        if ref_score:
-            latest_game = GameScore.objects.create(
-                player=user, season=game_season, score=additional_score)
+    def forget_season():
+        cache.delete(_season_cache_key(season.pk))
+        invalidate_leaderboard(season.pk)
 
-    if not ref_score:
-        updated_score = additional_score + latest_game_score
-        new_game = GameScore.objects.create(
-            player=user, season=game_season, score=updated_score)
-        return new_game
+    transaction.on_commit(forget_season)
+
+    return ranked
 
-    if ref_score:
-        latest_game.score += additional_score
-        latest_game.save(update_fields=['score'])
-        return latest_game
+
+def _snapshot_standings(season_pk: int) -> int:
+    quote_name = connection.ops.quote_name
+    snapshot_table = quote_name(SeasonStandingSnapshot._meta.db_table)
+    standing_table = quote_name(PlayerSeasonStanding._meta.db_table)
+    user_table = quote_name(User._meta.db_table)
+    # RANK is a reserved word in MySQL 8
+    rank_column = quote_name('rank')
+
+    sql = f"""
+        INSERT INTO {snapshot_table} (season_id, {rank_column}, address, score)
+        SELECT standings.season_id, ROW_NUMBER() OVER (
+            ORDER BY standings.score DESC, standings.player_id
+        ), players.address, standings.score
+        FROM {standing_table} standings
+        INNER JOIN {user_table} players ON players.id = standings.player_id
+        WHERE standings.season_id = %s
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [season_pk])
+        return cursor.rowcount
 
 
 def view_scoreboard(data: dict) -> list:
     game_season_pk = data.get('season')
-    season_players = GameScore.objects.filter(
-        season__pk=1).order_by().values_list('player', flat=True).distinct()
-    scoreboard = get_scoreboard_list(season_players, game_season_pk)
-    sorted_scoreboard = sort_scoreboard_list(scoreboard)
-    season_name = get_season_name(game_season_pk)
-    scoreboard_with_positions = assign_positions(
-        sorted_scoreboard, season_name)
+    tie_policy = data.get('tie_policy', ORDINAL)
+    season = get_season(game_season_pk)
+    if season.finalized_at is not None:
+        ranked_standings = rank_season_snapshot(season.pk, tie_policy)
+    else:
+        ranked_standings = rank_season_standings(game_season_pk, tie_policy)
 
-    return scoreboard_with_positions
+    return scoreboard_entries(ranked_standings, season.season)
 
 
-def get_scoreboard_list(season_players: list, season_pk: int) -> list:
-    scoreboard = []
+async def aview_scoreboard(data: dict) -> list:
+    game_season_pk = data.get('season')
+    tie_policy = data.get('tie_policy', ORDINAL)
+    season = await aget_season(game_season_pk)
+    if season.finalized_at is not None:
+        ranked_standings = await arank_season_snapshot(season.pk, tie_policy)
+    else:
+        ranked_standings = [row async for row in rank_season_standings(game_season_pk, tie_policy)]
 
-    for player in season_players:
-        latest_game = GameScore.objects.filter(
-            season__pk=season_pk, player__pk=player).latest('created_at')
-        scoreboard.append(latest_game)
+    return scoreboard_entries(ranked_standings, season.season)
 
-    return scoreboard
 
+def scoreboard_entries(ranked_standings, season_name: str) -> list:
+    return [
+        {'player': address, 'score': score, 'season': season_name, 'position': position}
+        for address, score, position in ranked_standings
+    ]
 
-def sort_scoreboard_list(scoreboard: list) -> list:
-    sorted_scoreboard = sorted(
-        scoreboard, key=lambda game: game.score, reverse=True)
 
-    return sorted_scoreboard
+def view_player_scoreboard(data: dict, user: User) -> dict:
+    game_season_pk = data.get('season')
+    season = get_season(game_season_pk)
+    if season.finalized_at is not None:
+        return snapshot_player_scoreboard(season, user)
 
+    try:
+        rank_index = get_season_rank_index(game_season_pk)
+    except Season.DoesNotExist:
+        raise ValidationError('Season not found')
 
-def view_player_scoreboard(scoreboard_with_positions: list, user: User) -> dict:
-    user_address = user.address
-    user_address_lower = user_address.lower()
-    found = False
-    for game_score in scoreboard_with_positions:
-        scoreboard_address = game_score.get('player')
-        scoreboard_address_lower = scoreboard_address.lower()
-        if scoreboard_address_lower == user_address_lower:
-            found = True
-            return game_score
-    if not found:
+    player_scoreboard = rank_index.lookup(user.id) or rank_index.load_player(user.id, user.address)
+    if player_scoreboard is None:
         raise ValidationError('user not found')
 
+    return player_scoreboard
+
+
+def view_player_neighbours(data: dict, user: User) -> list:
+    game_season_pk = data.get('season')
+    season = get_season(game_season_pk)
+    if season.finalized_at is not None:
+        return snapshot_player_neighbours(season, user, data.get('radius'))
 
-def assign_positions(scoreboard: list, season_name: str) -> list:
-    counter = 0
+    try:
+        rank_index = get_season_rank_index(game_season_pk)
+    except Season.DoesNotExist:
+        raise ValidationError('Season not found')
+
+    neighbours = rank_index.neighbours(user.id, data.get('radius'))
+    if not neighbours and rank_index.load_player(user.id, user.address):
+        neighbours = rank_index.neighbours(user.id, data.get('radius'))
+    if not neighbours:
+        raise ValidationError('user not found')
+
+    return neighbours
+
+
+def snapshot_entries(season: Season, snapshot) -> list:
+    return [
+        {'player': address, 'score': score, 'season': season.season, 'position': rank}
+        for rank, address, score in snapshot.values_list('rank', 'address', 'score')
+    ]
+
+
+def snapshot_player_rank(season: Season, user: User) -> int:
+    rank = SeasonStandingSnapshot.objects.filter(
+        season_id=season.pk, address=user.address).values_list('rank', flat=True).first()
+    if rank is None:
+        raise ValidationError('user not found')
+
+    return rank
+
+
+def snapshot_player_scoreboard(season: Season, user: User) -> dict:
+    snapshot = SeasonStandingSnapshot.objects.filter(season_id=season.pk, address=user.address)
+    player_scoreboard = snapshot_entries(season, snapshot)
+    if not player_scoreboard:
+        raise ValidationError('user not found')
+
+    return player_scoreboard[0]
+
+
+def snapshot_player_neighbours(season: Season, user: User, radius: int) -> list:
+    rank = snapshot_player_rank(season, user)
+    snapshot = SeasonStandingSnapshot.objects.filter(
+        season_id=season.pk, rank__range=(rank - radius, rank + radius)).order_by('rank')
+
+    return snapshot_entries(season, snapshot)
+
+
+def season_standings(season_pk: int):
+    return PlayerSeasonStanding.objects.filter(
+        season__pk=season_pk).select_related('player').only(
+            'score', 'player__address').order_by('-score', 'player_id')
+
+
+def view_top_scoreboard(data: dict) -> list:
+    game_season_pk = data.get('season')
+    season = get_season(game_season_pk)
+    if season.finalized_at is not None:
+        snapshot = SeasonStandingSnapshot.objects.filter(
+            season_id=season.pk, rank__lte=data.get('limit')).order_by('rank')
+        return snapshot_entries(season, snapshot)
+
+    season_name = season.season
+    standings = season_standings(game_season_pk)[:data.get('limit')]
+
+    return assign_positions(standings, season_name)
+
+
+def view_scoreboard_page(data: dict) -> dict:
+    game_season_pk = data.get('season')
+    limit = data.get('limit')
+    cursor = data.get('cursor')
+    season = get_season(game_season_pk)
+    if season.finalized_at is not None:
+        return snapshot_scoreboard_page(season, limit, cursor)
+
+    standings = season_standings(game_season_pk)
+    last_position = 0
+    if cursor:
+        score, player_pk = decode_scoreboard_cursor(cursor, keys=2)
+        at_or_ahead = Q(score__gt=score) | Q(score=score, player_id__lte=player_pk)
+        # Counted rather than carried in the cursor, which clients can edit
+        last_position = standings.filter(at_or_ahead).count()
+        standings = standings.exclude(at_or_ahead)
+
+    page = list(standings[:limit + 1])
+    has_next = len(page) > limit
+    page = page[:limit]
+
+    next_cursor = None
+    if has_next:
+        next_cursor = encode_scoreboard_cursor(page[-1].score, page[-1].player_id)
+
+    return {
+        'results': assign_positions(page, season.season, start_position=last_position + 1),
+        'next_cursor': next_cursor,
+    }
+
+
+def snapshot_scoreboard_page(season: Season, limit: int, cursor: str) -> dict:
+    snapshot = SeasonStandingSnapshot.objects.filter(season_id=season.pk).order_by('rank')
+    if cursor:
+        last_rank, = decode_scoreboard_cursor(cursor, keys=1)
+        snapshot = snapshot.filter(rank__gt=last_rank)
+
+    page = snapshot_entries(season, snapshot[:limit + 1])
+    has_next = len(page) > limit
+    page = page[:limit]
+
+    return {
+        'results': page,
+        'next_cursor': encode_scoreboard_cursor(page[-1]['position']) if has_next else None,
+    }
+
+
+def encode_scoreboard_cursor(*keys: int) -> str:
+    raw_cursor = ':'.join(str(key) for key in keys).encode()
+
+    return base64.urlsafe_b64encode(raw_cursor).decode()
+
+
+def decode_scoreboard_cursor(cursor: str, keys: int) -> tuple:
+    # A cursor from before the season was finalized has the wrong keys
+    try:
+        raw_cursor = base64.urlsafe_b64decode(cursor.encode()).decode()
+        values = tuple(int(value) for value in raw_cursor.split(':'))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValidationError('Invalid cursor')
+    if len(values) != keys:
+        raise ValidationError('Invalid cursor')
+
+    return values
+
+
+def assign_positions(scoreboard: list, season_name: str, start_position: int = 1) -> list:
+    counter = start_position - 1
     player_scoreboard_list = []
     for game_score in scoreboard:
         player_scoreboard = {}
@@ -135,8 +721,58 @@ def assign_positions(scoreboard: list, season_name: str) -> list:
     return player_scoreboard_list
 
 
+def _season_cache_key(season_id: int) -> str:
+    return f'season:{season_id}'
+
+
+def get_season(season_id: int) -> Season:
+    cache_key = _season_cache_key(season_id)
+    season = cache.get(cache_key)
+    if season is not None:
+        return season
+
+    try:
+        season = Season.objects.get(pk=season_id)
+    except Season.DoesNotExist:
+        raise ValidationError('Season not found')
+    cache.set(cache_key, season, SEASON_CACHE_TIMEOUT)
+
+    return season
+
+
+async def aget_season(season_id: int) -> Season:
+    cache_key = _season_cache_key(season_id)
+    season = await cache.aget(cache_key)
+    if season is not None:
+        return season
+
+    try:
+        season = await Season.objects.aget(pk=season_id)
+    except Season.DoesNotExist:
+        raise ValidationError('Season not found')
+    await cache.aset(cache_key, season, SEASON_CACHE_TIMEOUT)
+
+    return season
+
+
 def get_season_name(season_id: int) -> str:
-    season = Season.objects.get(pk=season_id)
+    season = get_season(season_id)
     season_name = season.season
 
     return season_name
+
+
+def check_season_open(season: Season):
+    if season.finalized_at is not None:
+        raise ValidationError('Season is finalized')
+
+
+def recheck_seasons_open(season_pks: set):
+    """
+    Reject a score write whose season was finalized while it ran. Call it
+    after inserting the rows that reference the seasons: those inserts wait
+    for finalize_season's lock on the season row, so a finalization that
+    got there first is visible here.
+    """
+    if Season.objects.filter(pk__in=season_pks, finalized_at__isnull=False).exists():
+        raise ValidationError('Season is finalized')
@@ -1,3 +1,597 @@
-from django.test import TestCase
+import base64
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from datetime import timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users.models import ReferralReward, User
+from users.services import REFERRAL_REWARD_POINTS
+
+from .compaction import DEFAULT_ROW_BYTES, compact_game_scores
+from .export import NDJSON, export_leaderboard
+from .leaderboard_cache import (
+    _page_cache_key, _rebuild_lock_cache_key, get_or_render_leaderboard, invalidate_leaderboard)
+from .models import GameScore, PendingScore, PlayerDailyAttempts, PlayerSeasonStanding, Season, SeasonStandingSnapshot
+from .rank_index import clear_rank_indexes, get_season_rank_index
+from .ranking import COMPETITION, DENSE, ORDINAL, rank_season_standings
+from .seeding import seed_game
+from .services import (
+    MAX_DAILY_ATTEMPTS, enqueue_user_score, finalize_season, flush_pending_scores, update_user_score,
+    update_user_scores, view_player_neighbours, view_player_scoreboard, view_scoreboard, view_top_scoreboard)
+
+
+class UpdateUserScoreTests(TestCase):
+
+    def setUp(self):
+        self.season = Season.objects.create(season='season one')
+        self.player = User.objects.create(
+            address='0xplayer', referral_username='redfox-player')
+
+    def test_scores_accumulate_into_history_and_standing(self):
+        update_user_score(self.player, {'season': self.season.pk, 'score': 10})
+        game_score = update_user_score(
+            self.player, {'season': self.season.pk, 'score': 5}, ref_score=True)
+
+        standing = PlayerSeasonStanding.objects.get(season=self.season, player=self.player)
+        self.assertEqual(game_score.score, 15)
+        self.assertEqual(standing.score, 15)
+        self.assertEqual(GameScore.objects.filter(player=self.player).count(), 2)
+
+    def test_standing_starts_from_existing_history(self):
+        GameScore.objects.create(season=self.season, player=self.player, score=40)
+
+        game_score = update_user_score(self.player, {'season': self.season.pk, 'score': 2})
+
+        self.assertEqual(game_score.score, 42)
+
+    def test_later_scores_take_one_update_and_one_insert(self):
+        update_user_score(self.player, {'season': self.season.pk, 'score': 10}, ref_score=True)
+
+        # The UPDATE ... RETURNING and the history INSERT, inside the
+        # savepoint pair the test transaction adds
+        with self.assertNumQueries(4):
+            game_score = update_user_score(
+                self.player, {'season': self.season.pk, 'score': 5}, ref_score=True)
+
+        self.assertEqual(game_score.score, 15)
+        self.assertEqual(
+            PlayerSeasonStanding.objects.get(season=self.season, player=self.player).score, 15)
+
+    def test_unknown_season_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            update_user_score(self.player, {'season': self.season.pk + 1, 'score': 2})
+
+    @override_settings(TIME_ZONE='America/New_York')
+    def test_attempts_either_side_of_utc_midnight_land_on_different_days(self):
+        midnight = datetime(2024, 3, 2, tzinfo=dt_timezone.utc)
+        for played_at in (midnight - timedelta(minutes=1), midnight + timedelta(minutes=1)):
+            with mock.patch('django.utils.timezone.now', return_value=played_at):
+                update_user_score(self.player, {'season': self.season.pk, 'score': 1})
+
+        self.assertEqual(
+            list(PlayerDailyAttempts.objects.filter(player=self.player).order_by('day').values_list('day', 'attempts')),
+            [(date(2024, 3, 1), 1), (date(2024, 3, 2), 1)])
+
+
+class UpdateUserScoresTests(TestCase):
+
+    def setUp(self):
+        self.season = Season.objects.create(season='season one')
+        self.player = User.objects.create(
+            address='0xplayer', referral_username='redfox-player')
+        User.objects.filter(pk=self.player.pk).update(created_at='2023-01-01T00:00:00Z')
+        self.player.refresh_from_db()
+
+    def test_lives_are_checked_across_the_whole_batch(self):
+        entries = [{'season': self.season.pk, 'score': 10}] * (MAX_DAILY_ATTEMPTS + 1)
+        entries.append({'season': self.season.pk, 'score': 1, 'ref_score': True})
+
+        results = update_user_scores(self.player, entries)
+
+        self.assertEqual(
+            [result['status'] for result in results],
+            ['ok'] * MAX_DAILY_ATTEMPTS + ['rejected', 'ok'])
+        self.assertEqual(results[-1]['score'], MAX_DAILY_ATTEMPTS * 10 + 1)
+        self.assertEqual(
+            PlayerDailyAttempts.objects.get(player=self.player).attempts, MAX_DAILY_ATTEMPTS)
+        self.assertEqual(
+            PlayerSeasonStanding.objects.get(player=self.player).score, MAX_DAILY_ATTEMPTS * 10 + 1)
+
+    def test_batches_count_attempts_taken_by_staged_submissions(self):
+        for _ in range(MAX_DAILY_ATTEMPTS - 1):
+            enqueue_user_score(self.player, {'season': self.season.pk, 'score': 10})
+
+        results = update_user_scores(self.player, [{'season': self.season.pk, 'score': 10}] * 2)
+
+        self.assertEqual([result['status'] for result in results], ['ok', 'rejected'])
+        self.assertEqual(
+            PlayerDailyAttempts.objects.get(player=self.player).attempts, MAX_DAILY_ATTEMPTS)
+        with self.assertRaises(ValidationError):
+            enqueue_user_score(self.player, {'season': self.season.pk, 'score': 10})
+
+    def test_invalid_entries_are_rejected_individually(self):
+        results = update_user_scores(self.player, [
+            {'season': self.season.pk + 1, 'score': 10},
+            {'season': self.season.pk, 'score': 10, 'address': '0xsomeone-else'},
+            {'season': self.season.pk, 'score': 10},
+        ])
+
+        self.assertEqual(
+            [result['error'] for result in results],
+            ['Season not found', 'Only staff can add scores for other players', None])
+        self.assertEqual(GameScore.objects.count(), 1)
+
+
+class FlushPendingScoresTests(TestCase):
+
+    def setUp(self):
+        self.season = Season.objects.create(season='season one')
+        self.players = [
+            User.objects.create(address=f'0xflushed{index}', referral_username=f'redfox-Flushed{index}')
+            for index in range(2)]
+        User.objects.filter(pk__in=[player.pk for player in self.players]).update(
+            created_at='2023-01-01T00:00:00Z')
+        for player in self.players:
+            player.refresh_from_db()
+
+    def test_staged_scores_are_merged_per_player(self):
+        for score in (10, 20, 30):
+            enqueue_user_score(self.players[0], {'season': self.season.pk, 'score': score})
+        enqueue_user_score(self.players[1], {'season': self.season.pk, 'score': 5}, ref_score=True)
+        closed_season = Season.objects.create(season='closed season', finalized_at=timezone.now())
+        PendingScore.objects.create(player=self.players[1], season=closed_season, score=100)
+
+        self.assertEqual(flush_pending_scores(), 5)
+
+        self.assertFalse(PendingScore.objects.exists())
+        self.assertEqual(
+            list(GameScore.objects.order_by('player_id').values_list('player__address', 'score')),
+            [('0xflushed0', 60), ('0xflushed1', 5)])
+        self.assertEqual(
+            dict(PlayerSeasonStanding.objects.values_list('player__address', 'score')),
+            {'0xflushed0': 60, '0xflushed1': 5})
+        self.assertFalse(GameScore.objects.filter(season=closed_season).exists())
+        # Lives were taken when the scores were staged, once per game
+        self.assertEqual(PlayerDailyAttempts.objects.get(player=self.players[0]).attempts, 3)
+        self.assertFalse(PlayerDailyAttempts.objects.filter(player=self.players[1]).exists())
+        self.assertEqual(flush_pending_scores(), 0)
+
+
+@override_settings(ROOT_URLCONF='game.async_urls')
+class AsyncViewTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.season = Season.objects.create(season='async season')
+        self.player = User.objects.create(address='0xasync', referral_username='redfox-Async1', is_active=True)
+        User.objects.filter(pk=self.player.pk).update(created_at='2023-01-01T00:00:00Z')
+        PlayerSeasonStanding.objects.create(season=self.season, player=self.player, score=70)
+        PlayerDailyAttempts.objects.create(
+            season=self.season, player=self.player, day=timezone.now().date(), attempts=2)
+        self.headers = {'Authorization': f'Bearer {RefreshToken.for_user(self.player).access_token}'}
+
+    async def test_lives_and_scoreboard_are_read_in_the_event_loop(self):
+        response = await self.async_client.post(
+            '/whack-a-blob/player-lives', {'season': self.season.pk}, headers=self.headers)
+        self.assertEqual(response.json(), {'current_attempts': 2, 'lives_left': MAX_DAILY_ATTEMPTS - 2})
+
+        response = await self.async_client.post(
+            '/whack-a-blob/scoreboard', {'season': self.season.pk}, headers=self.headers)
+        self.assertEqual(
+            response.json(), [{'player': '0xasync', 'score': 70, 'season': 'async season', 'position': 1}])
+
+
+class ConcurrentScoreSubmissionTests(TransactionTestCase):
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_parallel_submissions_for_one_wallet_are_not_lost(self):
+        season = Season.objects.create(season='stress season')
+        player = User.objects.create(
+            address='0xstress', referral_username='redfox-stress')
+        submissions = 50
+
+        def submit(_):
+            try:
+                update_user_score(player, {'season': season.pk, 'score': 5}, ref_score=True)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            list(executor.map(submit, range(submissions)))
+
+        standing = PlayerSeasonStanding.objects.get(season=season, player=player)
+        latest_game = GameScore.objects.filter(season=season, player=player).order_by('-pk').first()
+        self.assertEqual(standing.score, submissions * 5)
+        self.assertEqual(latest_game.score, submissions * 5)
+        self.assertEqual(GameScore.objects.filter(season=season, player=player).count(), submissions)
+
+
+class RankSeasonStandingsTests(TestCase):
+
+    def setUp(self):
+        self.season = Season.objects.create(season='tied season')
+        # Tied players are created out of address order, so ordinal ties
+        # visibly break by player id
+        for address, score in [('0xrank-e', 50), ('0xrank-d', 40), ('0xrank-c', 40), ('0xrank-b', 40),
+                               ('0xrank-a', 30)]:
+            player = User.objects.create(address=address, referral_username=f'redfox-{address}')
+            PlayerSeasonStanding.objects.create(season=self.season, player=player, score=score)
+
+    def test_each_tie_policy_ranks_live_standings(self):
+        addresses = ['0xrank-e', '0xrank-d', '0xrank-c', '0xrank-b', '0xrank-a']
+        for tie_policy, positions in [
+            (ORDINAL, [1, 2, 3, 4, 5]),
+            (COMPETITION, [1, 2, 2, 2, 5]),
+            (DENSE, [1, 2, 2, 2, 3]),
+        ]:
+            with self.subTest(tie_policy=tie_policy):
+                self.assertEqual(
+                    list(rank_season_standings(self.season.pk, tie_policy)),
+                    list(zip(addresses, [50, 40, 40, 40, 30], positions)))
+
+
+class SeedGameTests(TestCase):
+
+    def seeded_scores(self, season_pk: int) -> dict:
+        return dict(PlayerSeasonStanding.objects.filter(
+            season_id=season_pk).values_list('player__address', 'score'))
+
+    def test_history_standings_and_attempts_agree(self):
+        result = seed_game(users=60, games=400, days=5, seed=3, batch_size=25)
+
+        self.assertEqual(result['users'], 60)
+        self.assertAlmostEqual(result['games'], 400, delta=20)
+        for player_pk, score in PlayerSeasonStanding.objects.filter(
+                season_id=result['season']).values_list('player_id', 'score'):
+            history = GameScore.objects.filter(player_id=player_pk).order_by('created_at', 'pk')
+            self.assertEqual(history.last().score, score)
+        attempts = PlayerDailyAttempts.objects.filter(season_id=result['season'])
+        self.assertLessEqual(max(attempts.values_list('attempts', flat=True)), MAX_DAILY_ATTEMPTS)
+        self.assertEqual(sum(attempts.values_list('attempts', flat=True)), result['games'])
+
+    def test_referral_rewards_are_credited_to_referrers(self):
+        result = seed_game(users=60, games=100, days=5, seed=5, referral_rate=0.5)
+
+        rewards = ReferralReward.objects.values_list('referrer_id', 'referral__created_at')
+        self.assertEqual(len(rewards), result['referrals'])
+        self.assertEqual(GameScore.objects.count(), result['games'] + result['referrals'])
+        for referrer_pk, joined_at in rewards:
+            credit = GameScore.objects.get(player_id=referrer_pk, created_at=joined_at)
+            previous = GameScore.objects.filter(
+                player_id=referrer_pk, created_at__lt=joined_at).order_by('created_at', 'pk').last()
+            self.assertEqual(credit.score - (previous.score if previous else 0), REFERRAL_REWARD_POINTS)
+        referrers = {referrer_pk for referrer_pk, _ in rewards}
+        self.assertEqual(PlayerSeasonStanding.objects.filter(player_id__in=referrers).count(), len(referrers))
+
+    def test_same_seed_generates_the_same_games(self):
+        first = seed_game(users=30, games=200, days=4, seed=11)
+        scores = self.seeded_scores(first['season'])
+        User.objects.filter(address__in=scores).delete()
+
+        second = seed_game(users=30, games=200, days=4, seed=11)
+
+        self.assertEqual(self.seeded_scores(second['season']), scores)
+
+
+class CompactGameScoresTests(TestCase):
+
+    def setUp(self):
+        self.season = Season.objects.create(season='compacted season')
+        self.players = [
+            User.objects.create(address=f'0xcompact{index}', referral_username=f'redfox-Compact{index}')
+            for index in range(2)]
+        noon = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        history = [
+            (self.players[0], 10, noon - timedelta(days=10, hours=2)),
+            (self.players[0], 20, noon - timedelta(days=10, hours=1)),
+            (self.players[0], 30, noon - timedelta(days=10)),
+            (self.players[0], 40, noon - timedelta(days=9, hours=1)),
+            (self.players[0], 50, noon - timedelta(days=9)),
+            (self.players[0], 60, timezone.now()),
+            (self.players[1], 5, noon - timedelta(days=12, hours=1)),
+            (self.players[1], 15, noon - timedelta(days=12)),
+        ]
+        for player, score, created_at in history:
+            game_score = GameScore.objects.create(season=self.season, player=player, score=score)
+            GameScore.objects.filter(pk=game_score.pk).update(created_at=created_at)
+
+    def history(self, player) -> list:
+        return list(GameScore.objects.filter(player=player).order_by('created_at').values_list('score', flat=True))
+
+    def test_old_history_keeps_the_last_row_of_each_day(self):
+        self.assertEqual(compact_game_scores(chunk_size=1, dry_run=True)['rows'], 4)
+        self.assertEqual(GameScore.objects.count(), 8)
+
+        result = compact_game_scores(chunk_size=1)
+
+        self.assertEqual(result['rows'], 4)
+        self.assertEqual(result['bytes'], 4 * DEFAULT_ROW_BYTES)
+        self.assertEqual(self.history(self.players[0]), [30, 50, 60])
+        self.assertEqual(self.history(self.players[1]), [15])
+        self.assertEqual(compact_game_scores()['rows'], 0)
+
+    def test_each_day_keeps_its_latest_row_by_time_not_pk(self):
+        noon = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        late = GameScore.objects.create(season=self.season, player=self.players[1], score=30)
+        early = GameScore.objects.create(season=self.season, player=self.players[1], score=25)
+        GameScore.objects.filter(pk=late.pk).update(created_at=noon - timedelta(days=11))
+        GameScore.objects.filter(pk=early.pk).update(created_at=noon - timedelta(days=11, hours=1))
+
+        self.assertEqual(compact_game_scores(chunk_size=2)['rows'], 5)
+        self.assertEqual(self.history(self.players[1]), [15, 30])
+
+
+class ExportLeaderboardTests(TestCase):
+
+    def setUp(self):
+        # Season names are cached by pk, which earlier tests reuse
+        cache.clear()
+        self.season = Season.objects.create(season='export season')
+        for index, score in enumerate([50, 40, 40, 40, 30, 20, 20, 10]):
+            player = User.objects.create(
+                address=f'0xexport{index}', referral_username=f'redfox-Export{index}', is_active=True)
+            PlayerSeasonStanding.objects.create(season=self.season, player=player, score=score)
+
+    def exported(self, **kwargs) -> str:
+        return ''.join(text for _, text in export_leaderboard(self.season.pk, chunk_size=3, **kwargs))
+
+    def test_positions_follow_the_tie_policy(self):
+        rows = [line.split(',') for line in self.exported(tie_policy=COMPETITION).splitlines()]
+        self.assertEqual(rows[0], ['position', 'player', 'score', 'season'])
+        self.assertEqual([int(row[0]) for row in rows[1:]], [1, 2, 2, 2, 5, 6, 6, 8])
+
+        positions = [
+            json.loads(line)['position'] for line in self.exported(export_format=NDJSON, tie_policy=DENSE).splitlines()]
+        self.assertEqual(positions, [1, 2, 2, 2, 3, 4, 4, 5])
+
+    def test_resuming_picks_up_after_the_given_rank(self):
+        for tie_policy in (COMPETITION, DENSE):
+            full = self.exported(export_format=NDJSON, tie_policy=tie_policy).splitlines()
+            for start in range(1, 9):
+                resumed = self.exported(export_format=NDJSON, tie_policy=tie_policy, start=start).splitlines()
+                self.assertEqual(resumed, full[start:])
+
+    def test_export_is_for_staff_only(self):
+        player = User.objects.get(address='0xexport0')
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(player).access_token}'}
+        data = {'season': self.season.pk, 'start': 5}
+
+        response = self.client.post('/whack-a-blob/scoreboard/export', data, **headers)
+        self.assertEqual(response.status_code, 403)
+
+        player.is_staff = True
+        player.save(update_fields=['is_staff'])
+        response = self.client.post('/whack-a-blob/scoreboard/export', data, **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            b''.join(response.streaming_content).decode().splitlines(),
+            ['6,0xexport5,20,export season', '7,0xexport6,20,export season', '8,0xexport7,10,export season'])
+
+
+class SeasonRankIndexTests(TransactionTestCase):
+
+    def setUp(self):
+        clear_rank_indexes()
+        self.season = Season.objects.create(season='indexed season')
+        self.players = []
+        for index, score in enumerate([30, 50, 20]):
+            player = User.objects.create(
+                address=f'0xindexed{index}', referral_username=f'redfox-Indexed{index}', is_active=True)
+            PlayerSeasonStanding.objects.create(season=self.season, player=player, score=score)
+            self.players.append(player)
+
+    def other_worker_scores(self, address: str, score: int) -> User:
+        # Written without going through this process's index
+        player = User.objects.create(address=address, referral_username=f'redfox-{address}', is_active=True)
+        PlayerSeasonStanding.objects.create(season=self.season, player=player, score=score)
+        return player
+
+    def test_players_missing_from_the_index_are_ranked_from_the_database(self):
+        get_season_rank_index(self.season.pk)
+        newcomer = self.other_worker_scores('0xnewcomer', 40)
+
+        self.assertEqual(
+            view_player_scoreboard({'season': self.season.pk}, newcomer),
+            {'player': '0xnewcomer', 'score': 40, 'season': 'indexed season', 'position': 2})
+        neighbours = view_player_neighbours({'season': self.season.pk, 'radius': 1}, newcomer)
+        self.assertEqual([entry['player'] for entry in neighbours], ['0xindexed1', '0xnewcomer', '0xindexed0'])
+
+    def test_stale_indexes_are_served_while_they_are_rebuilt(self):
+        stale_index = get_season_rank_index(self.season.pk)
+        self.other_worker_scores('0xleader', 90)
+
+        with override_settings(RANK_INDEX_MAX_AGE=0):
+            self.assertIs(get_season_rank_index(self.season.pk), stale_index)
+        for thread in threading.enumerate():
+            if thread.name == f'rank-index-{self.season.pk}':
+                thread.join()
+
+        rank_index = get_season_rank_index(self.season.pk)
+        self.assertIsNot(rank_index, stale_index)
+        self.assertEqual(rank_index.lookup(self.players[1].pk)['position'], 2)
+
+
+class ScoreboardPageTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.season = Season.objects.create(season='paged season')
+        for index, score in enumerate([30, 20, 10]):
+            player = User.objects.create(
+                address=f'0xpaged{index}', referral_username=f'redfox-Paged{index}', is_active=True)
+            PlayerSeasonStanding.objects.create(season=self.season, player=player, score=score)
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(player).access_token}'}
+
+    def page(self, cursor: str = ''):
+        return self.client.post(
+            '/whack-a-blob/scoreboard/page', {'season': self.season.pk, 'limit': 1, 'cursor': cursor},
+            **self.headers)
+
+    def test_cursor_pages_are_read_fresh(self):
+        cursor = self.page().json()['next_cursor']
+        self.assertEqual(self.page(cursor).json()['results'][0]['score'], 20)
+
+        PlayerSeasonStanding.objects.filter(player__address='0xpaged1').update(score=25)
+        self.assertEqual(self.page(cursor).json()['results'][0]['score'], 25)
+        self.assertEqual(self.page('not a cursor').status_code, 400)
+
+    def test_positions_are_counted_not_read_from_the_cursor(self):
+        first = self.page().json()
+        second = self.page(first['next_cursor']).json()
+        self.assertEqual(second['results'][0]['position'], 2)
+
+        score, player_pk = base64.urlsafe_b64decode(second['next_cursor']).decode().split(':')
+        forged = base64.urlsafe_b64encode(f'{score}:{player_pk}:1000'.encode()).decode()
+        self.assertEqual(self.page(forged).status_code, 400)
+
+        PlayerSeasonStanding.objects.filter(player__address='0xpaged0').update(score=5)
+        self.assertEqual(self.page(second['next_cursor']).json()['results'][0]['position'], 2)
+
+    def test_finalized_seasons_are_paged_from_the_snapshot(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            finalize_season(self.season.pk)
+        PlayerSeasonStanding.objects.filter(season=self.season).update(score=0)
+
+        first = self.page().json()
+        second = self.page(first['next_cursor']).json()
+        third = self.page(second['next_cursor']).json()
+
+        self.assertEqual(
+            [(entry['position'], entry['score']) for page in (first, second, third) for entry in page['results']],
+            [(1, 30), (2, 20), (3, 10)])
+        self.assertIsNone(third['next_cursor'])
+
+
+class LeaderboardCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.season = Season.objects.create(season='cached season')
+        self.player = User.objects.create(
+            address='0xcached', referral_username='redfox-Cached1', is_active=True)
+        self.submit(10)
+        self.builds = 0
+
+    def submit(self, score: int):
+        with self.captureOnCommitCallbacks(execute=True):
+            update_user_score(self.player, {'season': self.season.pk, 'score': score})
+
+    def build_page(self) -> list:
+        self.builds += 1
+        return view_top_scoreboard({'season': self.season.pk, 'limit': 10})
+
+    def cached_score(self) -> int:
+        content = get_or_render_leaderboard(self.season.pk, 'top:10', self.build_page)
+        return json.loads(content)[0]['score']
+
+    @override_settings(LEADERBOARD_CACHE_COALESCE_WINDOW=0)
+    def test_a_score_write_invalidates_the_cached_page(self):
+        self.assertEqual(self.cached_score(), 10)
+        self.assertEqual(self.cached_score(), 10)
+        self.assertEqual(self.builds, 1)
+
+        self.submit(5)
+
+        self.assertEqual(self.cached_score(), 15)
+        self.assertEqual(self.builds, 2)
+
+    @override_settings(LEADERBOARD_CACHE_COALESCE_WINDOW=60)
+    def test_writes_inside_the_coalesce_window_are_not_rebuilt(self):
+        self.assertEqual(self.cached_score(), 10)
+
+        self.submit(5)
+
+        self.assertEqual(self.cached_score(), 10)
+        self.assertEqual(self.builds, 1)
+
+    @override_settings(LEADERBOARD_CACHE_COALESCE_WINDOW=60)
+    def test_only_the_lock_holder_rebuilds_a_stale_page(self):
+        rendered_at = time.time() - 120
+        cache.set(_page_cache_key(self.season.pk, 'top:10'), (rendered_at, b'[{"score": 1}]'))
+        invalidate_leaderboard(self.season.pk)
+
+        # Another worker is rebuilding: the stale bytes are served meanwhile
+        self.assertTrue(cache.add(_rebuild_lock_cache_key(self.season.pk, 'top:10'), rendered_at))
+        self.assertEqual(self.cached_score(), 1)
+        self.assertEqual(self.builds, 0)
+
+        cache.delete(_rebuild_lock_cache_key(self.season.pk, 'top:10'))
+        self.assertEqual(self.cached_score(), 10)
+        self.assertEqual(self.builds, 1)
+
+
+class FinalizeSeasonTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.season = Season.objects.create(season='finished season')
+        self.players = []
+        for index, score in enumerate([30, 50, 30, 10]):
+            player = User.objects.create(
+                address=f'0xfinal{index}', referral_username=f'redfox-Final{index}', is_active=True)
+            PlayerSeasonStanding.objects.create(season=self.season, player=player, score=score)
+            self.players.append(player)
+
+    def finalize(self) -> int:
+        with self.captureOnCommitCallbacks(execute=True):
+            return finalize_season(self.season.pk)
+
+    def test_final_ranking_is_read_from_the_snapshot(self):
+        live_scoreboard = view_scoreboard({'season': self.season.pk, 'tie_policy': COMPETITION})
+
+        self.assertEqual(self.finalize(), 4)
+        self.assertEqual(
+            list(SeasonStandingSnapshot.objects.order_by('rank').values_list('rank', 'address', 'score')),
+            [(1, '0xfinal1', 50), (2, '0xfinal0', 30), (3, '0xfinal2', 30), (4, '0xfinal3', 10)])
+
+        # Standings are no longer read for the season
+        PlayerSeasonStanding.objects.filter(season=self.season).update(score=0)
+        self.assertEqual(view_scoreboard({'season': self.season.pk, 'tie_policy': COMPETITION}), live_scoreboard)
+        self.assertEqual(
+            view_player_scoreboard({'season': self.season.pk}, self.players[2]),
+            {'player': '0xfinal2', 'score': 30, 'season': 'finished season', 'position': 3})
+        neighbours = view_player_neighbours({'season': self.season.pk, 'radius': 1}, self.players[3])
+        self.assertEqual([entry['position'] for entry in neighbours], [3, 4])
+
+        exported = ''.join(text for _, text in export_leaderboard(self.season.pk, start=1, chunk_size=2))
+        self.assertEqual(exported.splitlines()[1:], [
+            '2,0xfinal0,30,finished season', '3,0xfinal2,30,finished season', '4,0xfinal3,10,finished season'])
+
+    def test_finalized_seasons_take_no_more_scores(self):
+        self.finalize()
+
+        with self.assertRaisesMessage(ValidationError, 'Season is finalized'):
+            update_user_score(self.players[0], {'season': self.season.pk, 'score': 5})
+        results = update_user_scores(self.players[0], [{'season': self.season.pk, 'score': 5}])
+        self.assertEqual(results[0]['error'], 'Season is finalized')
+        self.assertFalse(GameScore.objects.filter(season=self.season).exists())
+
+        with self.assertRaisesMessage(ValidationError, 'already finalized'):
+            finalize_season(self.season.pk)
+
+    def test_writes_with_a_stale_season_are_rejected_by_the_update(self):
+        self.finalize()
+        # Another worker may still have the season cached as open
+        cache.set(f'season:{self.season.pk}', self.season)
+
+        with self.assertRaisesMessage(ValidationError, 'Season is finalized'):
+            update_user_score(self.players[0], {'season': self.season.pk, 'score': 5}, ref_score=True)
+        self.assertEqual(PlayerSeasonStanding.objects.get(season=self.season, player=self.players[0]).score, 30)
+        self.assertFalse(GameScore.objects.filter(season=self.season).exists())
+
+    def test_pending_scores_must_be_flushed_first(self):
+        PendingScore.objects.create(season=self.season, player=self.players[0], score=5)
+
+        with self.assertRaisesMessage(ValidationError, 'pending scores'):
+            finalize_season(self.season.pk)
+        self.assertIsNone(Season.objects.get(pk=self.season.pk).finalized_at)
@@ -7,7 +7,12 @@ app_name = 'whack_blob'
 urlpatterns = [
     path('create-season', apis.CreateSeasonAPI.as_view(), name='create-season'),
     path('add-score', apis.CreateScoreAPI.as_view(), name='add-score'),
+    path('add-scores', apis.AddScoresBatchAPI.as_view(), name='add-scores'),
     path('scoreboard', apis.ViewScoreboardAPI.as_view(), name='scoreboard'),
+    path('scoreboard/top', apis.ViewTopScoreboardAPI.as_view(), name='scoreboard-top'),
+    path('scoreboard/around-me', apis.ViewScoreboardAroundPlayerAPI.as_view(), name='scoreboard-around-me'),
+    path('scoreboard/page', apis.ViewScoreboardPageAPI.as_view(), name='scoreboard-page'),
+    path('scoreboard/export', apis.ExportScoreboardAPI.as_view(), name='scoreboard-export'),
     path('player-scoreboard', apis.ViewPlayerScoreboardAPI.as_view(), name='player-scoreboard'),
     path('player-lives', apis.ViewPlayerLives.as_view(), name='player-lives'),
     path('add-points-alone', apis.AddPointsOnlyAPI.as_view(), name='add-points_only'),